@@ -4,8 +4,13 @@ from __future__ import absolute_import, division, unicode_literals
 from sys import listitem
 from urllib import urlencode
 
-from xbmc import getCondVisibility, sleep
-from xbmcgui import Window
+from xbmc import getCondVisibility
+
+from resources.lib import transfer, loghandler
+
+###############################################################################
+
+loghandler.config()
 
 ###############################################################################
 
@@ -29,7 +34,6 @@ def main():
     Grabs kodi_id and kodi_type and sends a request to our main python instance
     that context menu needs to be displayed
     """
-    window = Window(10000)
     kodi_id = listitem.getVideoInfoTag().getDbId()
     if kodi_id == -1:
         # There is no getDbId() method for getMusicInfoTag
@@ -40,10 +44,7 @@ def main():
         'kodi_id': kodi_id,
         'kodi_type': kodi_type
     }
-    while window.getProperty('plexkodiconnect.command'):
-        sleep(20)
-    window.setProperty('plexkodiconnect.command',
-                       'CONTEXT_menu?%s' % urlencode(args))
+    transfer.plex_command('CONTEXT_menu?%s' % urlencode(args))
 
 
 if __name__ == "__main__":
@@ -203,5 +203,8 @@ if __name__ == '__main__':
         LOG.error('The current Kodi version is incompatible')
         LOG.error('Error: %s', err)
     else:
-        Main()
+        try:
+            Main()
+        finally:
+            utils.shutdown_pool()
     LOG.info('%s stopped' % v.ADDON_ID)
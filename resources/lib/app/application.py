@@ -3,7 +3,7 @@
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
 import Queue
-from threading import Lock, RLock
+from threading import Lock, RLock, Event
 
 import xbmc
 
@@ -36,6 +36,11 @@ class App(object):
             # Necessary to temporarily hold back librarysync/websocket listener when doing
             # a full sync
             self.lock_playlists = Lock()
+            # Set by kodimonitor if Kodi told us that a playqueue changed
+            self.playqueue_changed = Event()
+            # Set by kodimonitor if the state of a Kodi player changed, e.g.
+            # playback was paused or the volume changed
+            self.player_changed = Event()
 
             # Plex Companion Queue()
             self.companion_queue = Queue.Queue(maxsize=100)
@@ -63,6 +63,11 @@ class Sync(object):
         self.backgroundsync_saftymargin = None
         # How many threads to download Plex metadata on sync?
         self.sync_thread_number = None
+        # How many seconds may a sync hold its write transaction, blocking
+        # Kodi from writing to its databases, before committing?
+        self.commit_interval = None
+        # Shall we profile full syncs, see profiler.py?
+        self.profiler = None
 
         # Shall Kodi show dialogs for syncing/caching images? (e.g. images left
         # to sync)
@@ -119,5 +124,7 @@ class Sync(object):
         self.background_sync_disabled = utils.settings('enableBackgroundSync') == 'false'
         self.backgroundsync_saftymargin = int(utils.settings('backgroundsync_saftyMargin'))
         self.sync_thread_number = int(utils.settings('syncThreadNumber'))
+        self.commit_interval = int(utils.settings('syncCommitInterval'))
+        self.profiler = utils.settings('syncProfiler') == 'true'
 
         self.image_sync_notifications = utils.settings('imageSyncNotifications') == 'true'
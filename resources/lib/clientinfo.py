@@ -34,9 +34,9 @@ def getXArgsDeviceInfo(options=None, include_token=True):
         "Content-Type": "application/x-www-form-urlencoded",
         # "Access-Control-Allow-Origin": "*",
         'Accept-Language': xbmc.getLanguage(xbmc.ISO_639_1),
-        'X-Plex-Device': v.DEVICE,
+        'X-Plex-Device': v.device(),
         'X-Plex-Model': v.MODEL,
-        'X-Plex-Device-Name': v.DEVICENAME,
+        'X-Plex-Device-Name': v.device_name(),
         'X-Plex-Platform': v.PLATFORM,
         'X-Plex-Platform-Version': v.PLATFORM_VERSION,
         'X-Plex-Product': v.ADDON_NAME,
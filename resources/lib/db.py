@@ -3,7 +3,7 @@
 import sqlite3
 from functools import wraps
 
-from . import variables as v, app
+from . import variables as v, app, profiler
 
 DB_WRITE_ATTEMPTS = 100
 
@@ -80,7 +80,13 @@ def connect(media_type=None, wal_mode=True):
         db_path = v.DB_TEXTURE_PATH
     else:
         db_path = v.DB_VIDEO_PATH
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    if profiler.PROFILER.enabled:
+        conn = sqlite3.connect(db_path,
+                               timeout=30.0,
+                               factory=profiler.Connection)
+        conn.media_type = media_type or 'video'
+    else:
+        conn = sqlite3.connect(db_path, timeout=30.0)
     attempts = DB_WRITE_ATTEMPTS
     while True:
         try:
@@ -6,6 +6,7 @@ import requests
 import requests.exceptions as exceptions
 
 from . import utils, clientinfo, app
+from .profiler import PROFILER
 
 ###############################################################################
 
@@ -263,7 +264,8 @@ class DownloadUtils():
                     return r
                 try:
                     # xml response
-                    r = utils.defused_etree.fromstring(r.content)
+                    with PROFILER.measure('xml_parse'):
+                        r = utils.defused_etree.fromstring(r.content)
                     return r
                 except Exception:
                     r.encoding = 'utf-8'
@@ -14,17 +14,22 @@ from xbmcgui import ListItem
 
 from . import utils
 from . import path_ops
-from .downloadutils import DownloadUtils as DU
-from .plex_api import API, mass_api
-from . import plex_functions as PF
+from . import listing_cache
+from . import transfer
 from . import variables as v
-# Be careful - your using app in another Python instance!
-from . import app, widgets
-from .library_sync.nodes import NODE_TYPES
+# Every plugin call starts a new Python instance. Hence modules that are
+# expensive to import (e.g. requests via downloadutils) are only imported by
+# the functions that need them. Be careful - you're using app in another Python
+# instance!
 
 
 LOG = getLogger('PLEX.entrypoint')
 
+# The PKC service fetches the PMS metadata for the first items of a listing
+# ahead of playback
+PREFETCH_TYPES = (v.PLEX_TYPE_MOVIE, v.PLEX_TYPE_EPISODE)
+PREFETCH_ITEMS = 10
+
 
 def guess_video_or_audio():
     """
@@ -175,6 +180,7 @@ def show_section(section_index):
     is used directly
     """
     LOG.debug('Do section listing for section index %s', section_index)
+    from .library_sync.nodes import NODE_TYPES
     xbmcplugin.setContent(int(sys.argv[1]), v.CONTENT_TYPE_FILE)
     # Get nodes from the window props
     node = 'Plex.nodes.%s' % section_index
@@ -188,12 +194,17 @@ def show_section(section_index):
     xbmcplugin.endOfDirectory(int(sys.argv[1]))
 
 
-def show_listing(xml, plex_type=None, section_id=None, synched=True, key=None):
+def show_listing(xml, plex_type=None, section_id=None, synched=True, key=None,
+                 listing=None):
     """
     Pass synched=False if the items have not been synched to the Kodi DB
 
     Kodi content type will be set using the very first item returned by the PMS
+
+    Pass a listing_cache.Listing() as listing in order to cache the result
     """
+    from .plex_api import API, mass_api
+    from . import widgets
     try:
         xml[0]
     except IndexError:
@@ -248,14 +259,47 @@ def show_listing(xml, plex_type=None, section_id=None, synched=True, key=None):
     if xml.get('viewGroup') == 'secondary':
         # Need to chain keys for navigation
         widgets.KEY = key
+    plex_ids = [entry.get('ratingKey') for entry in xml
+                if entry.get('type') in PREFETCH_TYPES][:PREFETCH_ITEMS]
     # Process all items to show
     all_items = mass_api(xml)
-    all_items = utils.process_method_on_list(widgets.generate_item, all_items)
-    all_items = utils.process_method_on_list(widgets.prepare_listitem,
-                                             all_items)
+    if listing and listing.enabled:
+        all_items = utils.process_methods_on_list(
+            (widgets.generate_item, widgets.prepare_listitem), all_items)
+        if all_items:
+            # Cache before widgets.create_listitem alters the items
+            listing.save(content_type, all_items)
+        all_items = utils.process_method_on_list(widgets.create_listitem,
+                                                 all_items)
+    else:
+        all_items = utils.process_methods_on_list(
+            (widgets.generate_item,
+             widgets.prepare_listitem,
+             widgets.create_listitem),
+            all_items)
+    _add_listitems(all_items)
+    if plex_ids and listing_cache.generation():
+        # Only if the PKC service is running
+        transfer.plex_command('PREFETCH-%s' % ','.join(plex_ids))
+
+
+def show_cached_listing(listing):
+    """
+    Displays a listing_cache.Listing() that has been successfully loaded
+    """
+    from . import widgets
+    LOG.debug('show_cached_listing: content type %s', listing.content_type)
+    xbmcplugin.setContent(int(sys.argv[1]), listing.content_type)
+    _add_listitems(utils.process_method_on_list(widgets.create_listitem,
+                                                listing.items))
+
+
+def _add_listitems(all_items):
+    """
+    Adds the Kodi listitems created by widgets.create_listitem and finishes
+    the directory listing
+    """
     # fill that listing...
-    all_items = utils.process_method_on_list(widgets.create_listitem,
-                                             all_items)
     xbmcplugin.addDirectoryItems(int(sys.argv[1]), all_items, len(all_items))
     # end directory listing
     xbmcplugin.addSortMethod(int(sys.argv[1]), xbmcplugin.SORT_METHOD_UNSORTED)
@@ -286,6 +330,8 @@ def get_video_files(plex_id, params):
         return xbmcplugin.endOfDirectory(int(sys.argv[1]))
     if not _wait_for_auth():
         return xbmcplugin.endOfDirectory(int(sys.argv[1]), False)
+    from . import app
+    from . import plex_functions as PF
     app.init(entrypoint=True)
     item = PF.GetPlexMetadata(plex_id)
     try:
@@ -348,6 +394,8 @@ def extra_fanart(plex_id, plex_path):
     if not path_ops.exists(fanart_dir):
         # Download the images to the cache directory
         path_ops.makedirs(fanart_dir)
+        from . import app, plex_functions as PF
+        from .plex_api import API
         app.init(entrypoint=True)
         xml = PF.GetPlexMetadata(plex_id)
         if xml is None:
@@ -388,8 +436,14 @@ def playlists(content_type):
     content_type: 'audio', 'video'
     """
     LOG.debug('Listing Plex playlists for content type %s', content_type)
+    listing = listing_cache.Listing('playlists', content_type,
+                                    guess_video_or_audio())
+    if listing.load():
+        return show_cached_listing(listing)
     if not _wait_for_auth():
         return xbmcplugin.endOfDirectory(int(sys.argv[1]), False)
+    from . import app
+    from .plex_api import API
     app.init(entrypoint=True)
     from .playlists.pms import all_playlists
     xml = all_playlists()
@@ -402,7 +456,7 @@ def playlists(content_type):
             api = API(entry)
             if not api.playlist_type() == content_type:
                 xml.remove(entry)
-    show_listing(xml)
+    show_listing(xml, listing=listing)
 
 
 def hub(content_type):
@@ -413,8 +467,14 @@ def hub(content_type):
     """
     content_type = content_type or guess_video_or_audio()
     LOG.debug('Showing Plex Hub entries for %s', content_type)
+    listing = listing_cache.Listing('hub', content_type)
+    if listing.load():
+        return show_cached_listing(listing)
     if not _wait_for_auth():
         return xbmcplugin.endOfDirectory(int(sys.argv[1]), False)
+    from . import app
+    from . import plex_functions as PF
+    from .plex_api import API
     app.init(entrypoint=True)
     xml = PF.get_plex_hub()
     try:
@@ -441,13 +501,16 @@ def hub(content_type):
             append = True
         if not append:
             xml.remove(entry)
-    show_listing(xml)
+    show_listing(xml, listing=listing)
 
 
 def watchlater():
     """
     Listing for plex.tv Watch Later section (if signed in to plex.tv)
     """
+    listing = listing_cache.Listing('watchlater')
+    if listing.load():
+        return show_cached_listing(listing)
     if not _wait_for_auth():
         return xbmcplugin.endOfDirectory(int(sys.argv[1]), False)
     if utils.window('plex_token') == '':
@@ -457,6 +520,8 @@ def watchlater():
         LOG.error('No watch later - restricted user')
         return xbmcplugin.endOfDirectory(int(sys.argv[1]), False)
 
+    from . import app
+    from .downloadutils import DownloadUtils as DU
     app.init(entrypoint=True)
     xml = DU().downloadUrl('https://plex.tv/pms/playlists/queue/all',
                            authenticate=False,
@@ -464,7 +529,7 @@ def watchlater():
     if xml in (None, 401):
         LOG.error('Could not download watch later list from plex.tv')
         return xbmcplugin.endOfDirectory(int(sys.argv[1]), False)
-    show_listing(xml)
+    show_listing(xml, listing=listing)
 
 
 def browse_plex(key=None, plex_type=None, section_id=None, synched=True,
@@ -478,9 +543,21 @@ def browse_plex(key=None, plex_type=None, section_id=None, synched=True,
     LOG.debug('Browsing to key %s, section %s, plex_type: %s, synched: %s, '
               'prompt "%s", args %s', key, section_id, plex_type, synched,
               prompt, args)
+    if prompt:
+        # Never cache user input, e.g. searches
+        listing = None
+    else:
+        listing = listing_cache.Listing('browseplex', key, plex_type,
+                                        section_id, synched, args,
+                                        guess_video_or_audio())
+        if listing.load():
+            return show_cached_listing(listing)
     if not _wait_for_auth():
         xbmcplugin.endOfDirectory(int(sys.argv[1]), False)
         return
+    from . import app
+    from .downloadutils import DownloadUtils as DU
+    from .plex_api import API
     app.init(entrypoint=True)
     args = args or {}
     if prompt:
@@ -513,7 +590,7 @@ def browse_plex(key=None, plex_type=None, section_id=None, synched=True,
                                                       api.tag_label())
                 answ.append(entry)
         xml = answ
-    show_listing(xml, plex_type, section_id, synched, key)
+    show_listing(xml, plex_type, section_id, synched, key, listing)
 
 
 def extras(plex_id):
@@ -522,6 +599,9 @@ def extras(plex_id):
     """
     if not _wait_for_auth():
         return xbmcplugin.endOfDirectory(int(sys.argv[1]), False)
+    from . import app
+    from . import plex_functions as PF
+    from .plex_api import API
     app.init(entrypoint=True)
     xml = PF.GetPlexMetadata(plex_id)
     try:
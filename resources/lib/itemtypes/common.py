@@ -3,13 +3,25 @@
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
 from ntpath import dirname
+import time
 
 from ..plex_db import PlexDB, PLEXDB_LOCK
 from ..kodi_db import KodiVideoDB, KODIDB_LOCK
-from .. import db, timing, app
+from .. import db, timing, app, plex_functions as PF
+from ..profiler import PROFILER
 
 LOG = getLogger('PLEX.itemtypes.common')
 
+# Metadata xmls of parent items missing in the Plex DB, e.g. the show of an
+# episode, downloaded in advance by GetMetadataTask: {plex_id: xml}
+PARENT_XMLS = {}
+# Commit once a transaction changed this many rows, even if
+# app.SYNC.commit_interval has not yet passed
+COMMIT_MAX_CHANGES = 20000
+# Seconds we release the DB locks on every commit so that other threads
+# waiting for them, e.g. the writer of another library section, get a turn
+LOCK_HANDOVER = 0.005
+
 # Note: always use same order of URL arguments, NOT urlencode:
 #   plex_id=<plex_id>&plex_type=<plex_type>&mode=play
 
@@ -30,6 +42,48 @@ def process_path(playurl):
     return path, toplevelpath
 
 
+class CommitStats(object):
+    """
+    Timing metrics of the commits of all ItemBase writers, e.g. in order to
+    tune the setting syncCommitInterval
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.commits = 0
+        self.changes = 0
+        # Seconds we held the write transaction, blocking Kodi
+        self.window = 0.0
+        self.max_window = 0.0
+        # Seconds the commits themselves took
+        self.duration = 0.0
+        self.max_duration = 0.0
+
+    def add(self, changes, window, duration):
+        self.commits += 1
+        self.changes += changes
+        self.window += window
+        self.max_window = max(self.max_window, window)
+        self.duration += duration
+        self.max_duration = max(self.max_duration, duration)
+
+    def __unicode__(self):
+        if not self.commits:
+            return 'no commits'
+        return ('%s commits of %s changed rows, transactions held on average '
+                '%.2fs (max %.2fs), commits took on average %.3fs (max %.3fs)'
+                % (self.commits, self.changes,
+                   self.window / self.commits, self.max_window,
+                   self.duration / self.commits, self.max_duration))
+
+    def __str__(self):
+        return unicode(self).encode('utf-8')
+
+
+COMMIT_STATS = CommitStats()
+
+
 class ItemBase(object):
     """
     Items to be called with "with Items() as xxx:" to ensure that __enter__
@@ -49,14 +103,19 @@ class ItemBase(object):
         self.kodicursor = kodidb.cursor if kodidb else None
         self.artconn = kodidb.artconn if kodidb else None
         self.artcursor = kodidb.artcursor if kodidb else None
+        # Resume points queued by update_userdata, see set_resume
+        self.resume_points = []
+        # Start and total_changes of our connections for the current
+        # transaction, see commit_due
+        self.window_start = time.time()
+        self.changes_at_commit = self._total_changes()
 
     def __enter__(self):
         """
         Open DB connections and cursors
         """
         if self.lock:
-            PLEXDB_LOCK.acquire()
-            KODIDB_LOCK.acquire()
+            self._acquire_locks()
         self.plexconn = db.connect('plex')
         self.plexcursor = self.plexconn.cursor()
         self.kodiconn = db.connect('video')
@@ -78,10 +137,7 @@ class ItemBase(object):
             if exc_type:
                 # re-raise any exception
                 return False
-            self.plexconn.commit()
-            self.kodiconn.commit()
-            if self.artconn:
-                self.artconn.commit()
+            self._commit()
             return self
         finally:
             self.plexconn.close()
@@ -89,18 +145,105 @@ class ItemBase(object):
             if self.artconn:
                 self.artconn.close()
             if self.lock:
-                PLEXDB_LOCK.release()
-                KODIDB_LOCK.release()
+                self._release_locks()
+
+    @staticmethod
+    def _acquire_locks():
+        with PROFILER.measure('lock_wait.plexdb'):
+            PLEXDB_LOCK.acquire()
+        with PROFILER.measure('lock_wait.kodidb'):
+            KODIDB_LOCK.acquire()
+
+    @staticmethod
+    def _release_locks():
+        PLEXDB_LOCK.release()
+        KODIDB_LOCK.release()
+
+    def _total_changes(self):
+        return sum(conn.total_changes for conn in
+                   (self.plexconn, self.kodiconn, self.artconn) if conn)
 
-    def commit(self):
+    def _commit(self):
+        self.flush_resume_points()
+        changes = self._total_changes() - self.changes_at_commit
+        start = time.time()
         self.plexconn.commit()
-        self.plexconn.execute('BEGIN')
         self.kodiconn.commit()
-        self.kodiconn.execute('BEGIN')
         if self.artconn:
             self.artconn.commit()
+        now = time.time()
+        PROFILER.add('commit', now - start)
+        if changes:
+            COMMIT_STATS.add(changes, now - self.window_start, now - start)
+        self.window_start = now
+        self.changes_at_commit = self._total_changes()
+        return changes, now - start
+
+    def commit(self, wait=LOCK_HANDOVER):
+        """
+        Commits, then waits for wait seconds without holding the DB locks so
+        that other threads waiting for them get a turn
+        """
+        window = time.time() - self.window_start
+        changes, duration = self._commit()
+        if changes:
+            LOG.debug('Committed %s changed rows after %.2fs, commit took '
+                      '%.3fs', changes, window, duration)
+        if self.lock:
+            self._release_locks()
+        time.sleep(wait)
+        if self.lock:
+            self._acquire_locks()
+        self.plexconn.execute('BEGIN')
+        self.kodiconn.execute('BEGIN')
+        if self.artconn:
             self.artconn.execute('BEGIN')
 
+    def wait(self, seconds):
+        """
+        Waits for seconds without holding the DB locks, e.g. while waiting for
+        the PMS. Only commits if the transaction actually changed something;
+        our transactions always write what they read, so an empty one does
+        not hold on to an outdated snapshot of the DBs
+        """
+        if (self.resume_points or
+                self._total_changes() > self.changes_at_commit):
+            self.commit(wait=seconds)
+            return
+        if self.lock:
+            self._release_locks()
+        time.sleep(seconds)
+        if self.lock:
+            self._acquire_locks()
+
+    def commit_due(self):
+        """
+        Group commit: returns True once we've been blocking Kodi from writing
+        to its databases - and other PKC threads from using the DB locks - for
+        app.SYNC.commit_interval seconds or changed too many rows. Call
+        commit() then
+        """
+        return (time.time() - self.window_start >= app.SYNC.commit_interval or
+                self._total_changes() - self.changes_at_commit >= COMMIT_MAX_CHANGES)
+
+    def set_resume(self, file_id, resume_seconds, total_seconds, playcount,
+                   dateplayed):
+        """
+        Queues a resume point for file_id. They're written to the Kodi DB in
+        one go on the next commit, which is a lot faster than calling
+        kodidb.set_resume for thousands of items
+        """
+        self.resume_points.append((file_id, resume_seconds, total_seconds,
+                                   playcount, dateplayed))
+
+    def flush_resume_points(self):
+        """
+        Writes all resume points queued by set_resume to the Kodi DB
+        """
+        if self.resume_points:
+            self.kodidb.set_resumes(self.resume_points)
+            self.resume_points = []
+
     def set_fanart(self, artworks, kodi_id, kodi_type):
         """
         Writes artworks [dict containing only set artworks] to the Kodi art DB
@@ -137,6 +280,19 @@ class ItemBase(object):
                                    view_count,
                                    timing.plex_date_to_kodi(lastViewedAt))
 
+    @staticmethod
+    def parent_xml(plex_id):
+        """
+        Returns the PMS metadata xml for a parent item that is missing in the
+        Plex DB. Uses the xml GetMetadataTask downloaded in advance so that we
+        don't stall on the PMS while holding the DB locks
+        """
+        xml = PARENT_XMLS.pop(plex_id, None)
+        if xml is None:
+            LOG.debug('Parent %s was not prefetched, downloading it', plex_id)
+            xml = PF.GetPlexMetadata(plex_id)
+        return xml
+
     @staticmethod
     def sync_this_item(section_id):
         """
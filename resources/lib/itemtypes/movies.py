@@ -276,11 +276,11 @@ class Movie(ItemBase):
             LOG.info('Item not yet synced: %s', xml_element.attrib)
             return False
         # Write to Kodi DB
-        self.kodidb.set_resume(db_item['kodi_fileid'],
-                               api.resume_point(),
-                               api.runtime(),
-                               api.viewcount(),
-                               api.lastplayed())
+        self.set_resume(db_item['kodi_fileid'],
+                        api.resume_point(),
+                        api.runtime(),
+                        api.viewcount(),
+                        api.lastplayed())
         self.kodidb.update_userrating(db_item['kodi_id'],
                                       db_item['kodi_type'],
                                       api.userrating())
@@ -5,8 +5,8 @@ from logging import getLogger
 
 from .common import ItemBase
 from ..plex_api import API
-from ..plex_db import PlexDB, PLEXDB_LOCK
-from ..kodi_db import KodiMusicDB, KODIDB_LOCK
+from ..plex_db import PlexDB
+from ..kodi_db import KodiMusicDB
 from .. import plex_functions as PF, db, timing, app, variables as v
 
 LOG = getLogger('PLEX.music')
@@ -18,8 +18,7 @@ class MusicMixin(object):
         Overwrite to use the Kodi music DB instead of the video DB
         """
         if self.lock:
-            PLEXDB_LOCK.acquire()
-            KODIDB_LOCK.acquire()
+            self._acquire_locks()
         self.plexconn = db.connect('plex')
         self.plexcursor = self.plexconn.cursor()
         self.kodiconn = db.connect('music')
@@ -238,7 +237,7 @@ class Album(MusicMixin, ItemBase):
         artist = self.plexdb.artist(parent_id)
         if not artist:
             LOG.info('Artist %s does not yet exist in DB', parent_id)
-            artist_xml = PF.GetPlexMetadata(parent_id)
+            artist_xml = self.parent_xml(parent_id)
             try:
                 artist_xml[0].attrib
             except (TypeError, IndexError, AttributeError):
@@ -369,14 +368,16 @@ class Album(MusicMixin, ItemBase):
             context = Song(self.last_sync,
                            plexdb=self.plexdb,
                            kodidb=self.kodidb)
-            for song in children:
-                context.add_update(song,
-                                   section_name=section_name,
-                                   section_id=section_id,
-                                   album_xml=xml,
-                                   genres=api.genres(),
-                                   genre=genre,
-                                   compilation=compilation)
+            genres = api.genres()
+            with self.kodidb.batch():
+                for song in children:
+                    context.add_update(song,
+                                       section_name=section_name,
+                                       section_id=section_id,
+                                       album_xml=xml,
+                                       genres=genres,
+                                       genre=genre,
+                                       compilation=compilation)
 
 
 class Song(MusicMixin, ItemBase):
@@ -404,7 +405,7 @@ class Song(MusicMixin, ItemBase):
         if not artist:
             LOG.warn('Grandparent artist %s not found in DB, adding it',
                      artist_id)
-            artist_xml = PF.GetPlexMetadata(artist_id)
+            artist_xml = self.parent_xml(artist_id)
             try:
                 artist_xml[0].attrib
             except (TypeError, IndexError, AttributeError):
@@ -460,7 +461,7 @@ class Song(MusicMixin, ItemBase):
             album = self.plexdb.album(album_id)
             if not album:
                 LOG.warn('Parent album %s not found in DB, adding it', album_id)
-                album_xml = PF.GetPlexMetadata(album_id)
+                album_xml = self.parent_xml(album_id)
                 try:
                     album_xml[0].attrib
                 except (TypeError, IndexError, AttributeError):
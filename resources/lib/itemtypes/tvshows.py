@@ -5,7 +5,7 @@ from logging import getLogger
 
 from .common import ItemBase, process_path
 from ..plex_api import API
-from .. import plex_functions as PF, app, variables as v
+from .. import app, variables as v
 
 LOG = getLogger('PLEX.tvshows')
 
@@ -27,17 +27,17 @@ class TvShowMixin(object):
                                       db_item['kodi_type'],
                                       api.userrating())
         if plex_type == v.PLEX_TYPE_EPISODE:
-            self.kodidb.set_resume(db_item['kodi_fileid'],
-                                   api.resume_point(),
-                                   api.runtime(),
-                                   api.viewcount(),
-                                   api.lastplayed())
+            self.set_resume(db_item['kodi_fileid'],
+                            api.resume_point(),
+                            api.runtime(),
+                            api.viewcount(),
+                            api.lastplayed())
             if db_item['kodi_fileid_2']:
-                self.kodidb.set_resume(db_item['kodi_fileid_2'],
-                                       api.resume_point(),
-                                       api.runtime(),
-                                       api.viewcount(),
-                                       api.lastplayed())
+                self.set_resume(db_item['kodi_fileid_2'],
+                                api.resume_point(),
+                                api.runtime(),
+                                api.viewcount(),
+                                api.lastplayed())
         return True
 
     def remove(self, plex_id, plex_type=None):
@@ -318,7 +318,7 @@ class Season(TvShowMixin, ItemBase):
         show = self.plexdb.show(show_id)
         if not show:
             LOG.warn('Parent TV show %s not found in DB, adding it', show_id)
-            show_xml = PF.GetPlexMetadata(show_id)
+            show_xml = self.parent_xml(show_id)
             try:
                 show_xml[0].attrib
             except (TypeError, IndexError, AttributeError):
@@ -396,7 +396,7 @@ class Episode(TvShowMixin, ItemBase):
         show = self.plexdb.show(api.show_id())
         if not show:
             LOG.warn('Grandparent TV show %s not found in DB, adding it', api.show_id())
-            show_xml = PF.GetPlexMetadata(api.show_id())
+            show_xml = self.parent_xml(api.show_id())
             try:
                 show_xml[0].attrib
             except (TypeError, IndexError, AttributeError):
@@ -417,7 +417,7 @@ class Episode(TvShowMixin, ItemBase):
         season = self.plexdb.season(api.season_id())
         if not season and api.season_id():
             LOG.warn('Parent season %s not found in DB, adding it', api.season_id())
-            season_xml = PF.GetPlexMetadata(api.season_id())
+            season_xml = self.parent_xml(api.season_id())
             try:
                 season_xml[0].attrib
             except (TypeError, IndexError, AttributeError):
@@ -13,16 +13,12 @@ from .. import path_ops, utils, variables as v
 LOG = getLogger('PLEX.kodi_db')
 
 
-def kodiid_from_filename(path, kodi_type=None, db_type=None):
+def _split_path(path):
     """
-    Returns kodi_id if we have an item in the Kodi video or audio database with
-    said path. Feed with either koditype, e.v. 'movie', 'song' or the DB
-    you want to poll ('video' or 'music')
-    Returns None, <kodi_type> if not possible
+    Splits the full path into the tuple (filename, path) the way Kodi stores
+    them. path will end in either '/' or '\\'
     """
-    kodi_id = None
     path = utils.try_decode(path)
-    # Make sure path ends in either '/' or '\'
     # We CANNOT use path_ops.path.join as this can result in \ where we need /
     try:
         filename = path.rsplit('/', 1)[1]
@@ -30,6 +26,18 @@ def kodiid_from_filename(path, kodi_type=None, db_type=None):
     except IndexError:
         filename = path.rsplit('\\', 1)[1]
         path = path.rsplit('\\', 1)[0] + '\\'
+    return filename, path
+
+
+def kodiid_from_filename(path, kodi_type=None, db_type=None):
+    """
+    Returns kodi_id if we have an item in the Kodi video or audio database with
+    said path. Feed with either koditype, e.v. 'movie', 'song' or the DB
+    you want to poll ('video' or 'music')
+    Returns None, <kodi_type> if not possible
+    """
+    kodi_id = None
+    filename, path = _split_path(path)
     if kodi_type == v.KODI_TYPE_SONG or db_type == 'music':
         with KodiMusicDB(lock=False) as kodidb:
             try:
@@ -49,6 +57,27 @@ def kodiid_from_filename(path, kodi_type=None, db_type=None):
     return kodi_id, kodi_type
 
 
+def kodiids_from_filenames(paths, db_type=None):
+    """
+    Batched version of kodiid_from_filename for a list of paths. Resolves all
+    of them using one single Kodi DB connection and a handful of queries.
+    Returns a list of tuples (kodi_id, kodi_type) in the same order as paths;
+    (None, None) for every path that could not be found
+    """
+    items = [_split_path(path) for path in paths]
+    if db_type == 'music':
+        with KodiMusicDB(lock=False) as kodidb:
+            found = kodidb.song_ids_from_filenames(items)
+        found = {k: (kodi_id, v.KODI_TYPE_SONG)
+                 for k, kodi_id in found.iteritems()}
+    else:
+        with KodiVideoDB(lock=False) as kodidb:
+            found = kodidb.video_ids_from_filenames(items)
+    LOG.debug('Found %s of %s paths in the Kodi %s db',
+              len(found), len(items), db_type or 'video')
+    return [found.get(item, (None, None)) for item in items]
+
+
 def setup_kodi_default_entries():
     """
     Makes sure that we retain the Kodi standard databases. E.g. that there
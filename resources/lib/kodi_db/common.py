@@ -4,10 +4,21 @@ from __future__ import absolute_import, division, unicode_literals
 from threading import Lock
 
 from .. import db, path_ops
+from ..profiler import PROFILER
 
 KODIDB_LOCK = Lock()
 # Names of tables we generally leave untouched and e.g. don't wipe
 UNTOUCHED_TABLES = ('version', 'versiontagscan')
+# SQLite refuses statements with more than 999 host parameters
+SQL_CHUNK_SIZE = 500
+
+
+def chunks(items):
+    """
+    Yields slices of the list items that fit into a single SQL statement
+    """
+    for i in range(0, len(items), SQL_CHUNK_SIZE):
+        yield items[i:i + SQL_CHUNK_SIZE]
 
 
 class KodiDBBase(object):
@@ -31,7 +42,8 @@ class KodiDBBase(object):
 
     def __enter__(self):
         if self.lock:
-            KODIDB_LOCK.acquire()
+            with PROFILER.measure('lock_wait.kodidb'):
+                KODIDB_LOCK.acquire()
         self.kodiconn = db.connect(self.db_kind, self.wal_mode)
         self.cursor = self.kodiconn.cursor()
         self.artconn = db.connect('texture', self.wal_mode) if self._texture_db \
@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
+from collections import OrderedDict
+from contextlib import contextmanager
 
 from . import common
 from .. import db, variables as v, app, timing
@@ -12,6 +14,46 @@ LOG = getLogger('PLEX.kodi_db.music')
 class KodiMusicDB(common.KodiDBBase):
     db_kind = 'music'
 
+    def __init__(self, *args, **kwargs):
+        super(KodiMusicDB, self).__init__(*args, **kwargs)
+        # {strGenre: idGenre} for all genres, loaded on first use
+        self._genres = None
+        # {(strArtist, strMusicBrainzArtistID): idArtist}
+        self._artists = {}
+        # {query: [args]} of writes queued within batch()
+        self._batch = None
+        self._last_song_id = 0
+
+    @contextmanager
+    def batch(self):
+        """
+        Use with the songs of an album. Within the block, songs and their
+        links to artists, albums and genres are queued and then written with
+        one executemany() per statement once the block is left
+        """
+        self._batch = OrderedDict()
+        try:
+            yield self
+            self._flush_batch()
+        finally:
+            self._batch = None
+            self._last_song_id = 0
+
+    @db.catch_operationalerrors
+    def _flush_batch(self):
+        for query, rows in self._batch.iteritems():
+            self.cursor.executemany(query, rows)
+        self._batch.clear()
+
+    def _write(self, query, args):
+        """
+        Executes query right away or queues it if we're within batch()
+        """
+        if self._batch is None:
+            self.cursor.execute(query, args)
+        else:
+            self._batch.setdefault(query, []).append(args)
+
     @db.catch_operationalerrors
     def add_path(self, path):
         """
@@ -93,6 +135,34 @@ class KodiMusicDB(common.KodiDBBase):
             return
         return song_ids[0][0]
 
+    def song_ids_from_filenames(self, items):
+        """
+        Batched version of song_id_from_filename. Pass a list of tuples
+        (filename, path). Returns a dict {(filename, path): song_id} for all
+        items that could be resolved unambiguously
+        """
+        candidates = {}
+        filenames = list(set(x[0] for x in items))
+        for chunk in common.chunks(filenames):
+            self.cursor.execute('''
+                SELECT song.idSong, song.strFileName, path.strPath
+                FROM song
+                INNER JOIN path ON path.idPath = song.idPath
+                WHERE song.strFileName IN (%s)
+            ''' % ','.join('?' * len(chunk)), chunk)
+            for song_id, filename, path in self.cursor:
+                candidates.setdefault((filename, path), []).append(song_id)
+        result = {}
+        for item in items:
+            song_ids = candidates.get(item)
+            if not song_ids:
+                continue
+            if len(song_ids) != 1:
+                LOG.info('Found wrong number of songs %s, skipping', song_ids)
+                continue
+            result[item] = song_ids[0]
+        return result
+
     @db.catch_operationalerrors
     def delete_song_from_song_artist(self, song_id):
         """
@@ -158,6 +228,8 @@ class KodiMusicDB(common.KodiDBBase):
         """
         self.cursor.execute('DELETE FROM genre WHERE idGenre = ?',
                             (genre_id, ))
+        # Genres are few, simply reload all of them on the next occasion
+        self._genres = None
 
     @db.catch_operationalerrors
     def delete_album_from_album_genre(self, album_id):
@@ -366,62 +438,67 @@ class KodiMusicDB(common.KodiDBBase):
             VALUES (?, ?, ?)
         ''', (artist_id, albumname, year))
 
+    def genre_id(self, genre):
+        """
+        Returns the idGenre for the genre name [unicode]. Creates the genre if
+        it does not exist yet
+        """
+        if self._genres is None:
+            self.cursor.execute('SELECT strGenre, idGenre FROM genre')
+            self._genres = dict(self.cursor.fetchall())
+        try:
+            return self._genres[genre]
+        except KeyError:
+            self.cursor.execute('INSERT INTO genre(strGenre) VALUES (?)',
+                                (genre, ))
+            self._genres[genre] = self.cursor.lastrowid
+            return self._genres[genre]
+
     @db.catch_operationalerrors
     def add_music_genres(self, kodiid, genres, mediatype):
         """
-        Adds a list of genres (list of unicode) for a certain Kodi item
+        Adds a list of genres (list of unicode) for a certain Kodi item. Only
+        the links that actually changed are written
         """
         if mediatype == "album":
-            # Delete current genres for clean slate
-            self.cursor.execute('DELETE FROM album_genre WHERE idAlbum = ?',
-                                (kodiid, ))
-            for genre in genres:
-                self.cursor.execute('SELECT idGenre FROM genre WHERE strGenre = ?',
-                                    (genre, ))
-                try:
-                    genreid = self.cursor.fetchone()[0]
-                except TypeError:
-                    # Create the genre
-                    self.cursor.execute('SELECT COALESCE(MAX(idGenre),0) FROM genre')
-                    genreid = self.cursor.fetchone()[0] + 1
-                    self.cursor.execute('INSERT INTO genre(idGenre, strGenre) VALUES(?, ?)',
-                                        (genreid, genre))
-                self.cursor.execute('''
+            table, column = 'album_genre', 'idAlbum'
+        elif mediatype == "song":
+            table, column = 'song_genre', 'idSong'
+        else:
+            return
+        self.cursor.execute('SELECT idGenre FROM %s WHERE %s = ?'
+                            % (table, column), (kodiid, ))
+        current = set(x[0] for x in self.cursor.fetchall())
+        wanted = set(self.genre_id(genre) for genre in genres)
+        for genre_id in current - wanted:
+            self.cursor.execute('DELETE FROM %s WHERE idGenre = ? AND %s = ?'
+                                % (table, column), (genre_id, kodiid))
+        for genre_id in wanted - current:
+            if mediatype == "album":
+                self._write('''
                     INSERT OR REPLACE INTO album_genre(
                         idGenre,
                         idAlbum)
                     VALUES (?, ?)
-                ''', (genreid, kodiid))
-        elif mediatype == "song":
-            # Delete current genres for clean slate
-            self.cursor.execute('DELETE FROM song_genre WHERE idSong = ?',
-                                (kodiid, ))
-            for genre in genres:
-                self.cursor.execute('SELECT idGenre FROM genre WHERE strGenre = ?',
-                                    (genre, ))
-                try:
-                    genreid = self.cursor.fetchone()[0]
-                except TypeError:
-                    # Create the genre
-                    self.cursor.execute('SELECT COALESCE(MAX(idGenre),0) FROM genre')
-                    genreid = self.cursor.fetchone()[0] + 1
-                    self.cursor.execute('INSERT INTO genre(idGenre, strGenre) values(?, ?)',
-                                        (genreid, genre))
-                self.cursor.execute('''
+                ''', (genre_id, kodiid))
+            else:
+                self._write('''
                     INSERT OR REPLACE INTO song_genre(
                         idGenre,
                         idSong,
                         iOrder)
                     VALUES (?, ?, ?)
-                ''', (genreid, kodiid, 0))
+                ''', (genre_id, kodiid, 0))
 
     def add_song_id(self):
         self.cursor.execute('SELECT COALESCE(MAX(idSong),0) FROM song')
-        return self.cursor.fetchone()[0] + 1
+        # Songs queued within batch() are not in the song table yet
+        return max(self.cursor.fetchone()[0], self._last_song_id) + 1
 
     @db.catch_operationalerrors
     def add_song(self, *args):
-        self.cursor.execute('''
+        self._last_song_id = args[0]
+        self._write('''
             INSERT INTO song(
                 idSong,
                 idAlbum,
@@ -446,7 +523,8 @@ class KodiMusicDB(common.KodiDBBase):
 
     @db.catch_operationalerrors
     def add_song_17(self, *args):
-        self.cursor.execute('''
+        self._last_song_id = args[0]
+        self._write('''
             INSERT INTO song(
                 idSong,
                 idAlbum,
@@ -533,6 +611,10 @@ class KodiMusicDB(common.KodiDBBase):
         """
         Adds a single artist's name to the db
         """
+        try:
+            return self._artists[(name, musicbrainz)]
+        except KeyError:
+            pass
         self.cursor.execute('''
             SELECT idArtist, strArtist
             FROM artist
@@ -563,6 +645,7 @@ class KodiMusicDB(common.KodiDBBase):
             if artistname != name:
                 self.cursor.execute('UPDATE artist SET strArtist = ? WHERE idArtist = ?',
                                     (name, artistid,))
+        self._artists[(name, musicbrainz)] = artistid
         return artistid
 
     @db.catch_operationalerrors
@@ -599,6 +682,12 @@ class KodiMusicDB(common.KodiDBBase):
     @db.catch_operationalerrors
     def add_song_artist(self, artist_id, song_id, artist_name):
         self.cursor.execute('''
+            SELECT idArtist, strArtist FROM song_artist
+            WHERE idSong = ? AND idRole = 1
+        ''', (song_id, ))
+        if self.cursor.fetchall() == [(artist_id, artist_name)]:
+            return
+        self._write('''
             INSERT OR REPLACE INTO song_artist(
                 idArtist,
                 idSong,
@@ -614,7 +703,7 @@ class KodiMusicDB(common.KodiDBBase):
         """
         Kodi 17 only
         """
-        self.cursor.execute('''
+        self._write('''
             INSERT OR REPLACE INTO albuminfosong(
                 idAlbumInfoSong,
                 idAlbumInfo,
@@ -660,6 +749,9 @@ class KodiMusicDB(common.KodiDBBase):
 
     @db.catch_operationalerrors
     def remove_artist(self, kodi_id):
+        self._artists = dict((key, artist_id)
+                             for key, artist_id in self._artists.iteritems()
+                             if artist_id != kodi_id)
         self.cursor.execute('DELETE FROM album_artist WHERE idArtist = ?',
                             (kodi_id, ))
         self.cursor.execute('DELETE FROM artist WHERE idArtist = ?',
@@ -183,18 +183,29 @@ class KodiVideoDB(common.KodiDBBase):
             file_id = self.add_file(filename, path_id, date_added)
         return file_id
 
-    def obsolete_file_ids(self):
+    def obsolete_file_ids(self, min_file_id=0):
         """
         Returns a generator for idFile of all Kodi file ids that do not have a
         dateAdded set (dateAdded NULL) and the filename start with
         'plugin://plugin.video.plexkodiconnect'
         These entries should be deleted as they're created falsely by Kodi.
+
+        Pass min_file_id to only look at files with a higher idFile, which
+        avoids scanning the entire files table
         """
         return (x[0] for x in self.cursor.execute('''
             SELECT idFile FROM files
-            WHERE dateAdded IS NULL
+            WHERE idFile > ?
+            AND dateAdded IS NULL
             AND strFilename LIKE \'plugin://plugin.video.plexkodiconnect%\'
-            '''))
+            ''', (min_file_id, )))
+
+    def max_file_id(self):
+        """
+        Returns the highest idFile in use or 0
+        """
+        self.cursor.execute('SELECT COALESCE(MAX(idFile), 0) FROM files')
+        return self.cursor.fetchone()[0]
 
     def show_id_from_path(self, path):
         """
@@ -213,6 +224,19 @@ class KodiVideoDB(common.KodiDBBase):
         except TypeError:
             pass
 
+    @db.catch_operationalerrors
+    def remove_files(self, file_ids):
+        """
+        Removes all file_ids and their entries in the associated tables like
+        remove_file(file_id, remove_orphans=False), but in one go
+        """
+        for chunk in common.chunks(list(file_ids)):
+            params = ','.join('?' * len(chunk))
+            for table in ('files', 'bookmark', 'settings', 'streamdetails',
+                          'stacktimes'):
+                self.cursor.execute('DELETE FROM %s WHERE idFile IN (%s)'
+                                    % (table, params), chunk)
+
     @db.catch_operationalerrors
     def remove_file(self, file_id, remove_orphans=True):
         """
@@ -611,6 +635,52 @@ class KodiVideoDB(common.KodiDBBase):
                 return
         return movie_id, typus
 
+    def video_ids_from_filenames(self, items):
+        """
+        Batched version of video_id_from_filename. Pass a list of tuples
+        (filename, path). Returns a dict {(filename, path): (itemId, type)}
+        for all items that could be resolved unambiguously
+        """
+        candidates = {}
+        filenames = list(set(x[0] for x in items))
+        for chunk in common.chunks(filenames):
+            self.cursor.execute('''
+                SELECT files.idFile,
+                       files.strFilename,
+                       path.strPath,
+                       movie.idMovie,
+                       episode.idEpisode
+                FROM files
+                INNER JOIN path ON path.idPath = files.idPath
+                LEFT JOIN movie ON movie.idFile = files.idFile
+                LEFT JOIN episode ON episode.idFile = files.idFile
+                WHERE files.strFilename IN (%s)
+                ORDER BY files.idFile
+            ''' % ','.join('?' * len(chunk)), chunk)
+            for file_id, filename, path_str, movie_id, episode_id in self.cursor:
+                # For whatever reason, double might have become triple
+                path_str = path_str.replace('///', '//').replace('\\\\\\', '\\\\')
+                files = candidates.setdefault((filename, path_str), [])
+                if not files or files[-1][0] != file_id:
+                    files.append((file_id, movie_id, episode_id))
+        result = {}
+        for item in items:
+            files = candidates.get(item)
+            if not files:
+                continue
+            # Kodi seems to make ONE temporary entry; we only want the earlier,
+            # permanent one
+            if len(files) > 2:
+                LOG.warn('We found too many items with matching filenames and '
+                         ' paths for %s, skipping', item)
+                continue
+            _, movie_id, episode_id = files[0]
+            if movie_id is not None:
+                result[item] = (movie_id, v.KODI_TYPE_MOVIE)
+            elif episode_id is not None:
+                result[item] = (episode_id, v.KODI_TYPE_EPISODE)
+        return result
+
     def get_resume(self, file_id):
         """
         Returns the first resume point in seconds (int) if found, else None for
@@ -634,43 +704,96 @@ class KodiVideoDB(common.KodiDBBase):
         except TypeError:
             pass
 
-    @db.catch_operationalerrors
     def set_resume(self, file_id, resume_seconds, total_seconds, playcount,
                    dateplayed):
         """
         Adds a resume marker for a video library item. Will even set 2,
         considering add-on path widget hacks.
         """
-        # Delete existing resume point
-        self.cursor.execute('DELETE FROM bookmark WHERE idFile = ?', (file_id,))
-        # Set watched count
-        # Be careful to set playCount to None, NOT the int zero!
-        self.cursor.execute('UPDATE files SET playCount = ?, lastPlayed = ? WHERE idFile = ?',
-                            (playcount or None, dateplayed, file_id))
-        # Set the resume bookmark
-        if resume_seconds:
+        self.set_resumes(((file_id, resume_seconds, total_seconds, playcount,
+                           dateplayed), ))
+
+    @db.catch_operationalerrors
+    def set_resumes(self, resume_points):
+        """
+        Batched version of set_resume. Pass an iterable of tuples
+            (file_id, resume_seconds, total_seconds, playcount, dateplayed)
+
+        Only rows that actually change are written. Existing resume bookmarks
+        are updated in place, new ones get their idBookmark from SQLite
+        """
+        # Later entries for the same file win, just like consecutive calls
+        # to set_resume
+        resume_points = dict((x[0], x) for x in resume_points)
+        file_ids = list(resume_points)
+        files, bookmarks = {}, {}
+        for chunk in common.chunks(file_ids):
+            params = ','.join('?' * len(chunk))
             self.cursor.execute(
-                'SELECT COALESCE(MAX(idBookmark), 0) FROM bookmark')
-            bookmark_id = self.cursor.fetchone()[0] + 1
+                'SELECT idFile, playCount, lastPlayed FROM files WHERE idFile IN (%s)' % params,
+                chunk)
+            for file_id, playcount, dateplayed in self.cursor:
+                files[file_id] = (playcount, dateplayed)
             self.cursor.execute('''
-            INSERT INTO bookmark(
-                idBookmark,
-                idFile,
-                timeInSeconds,
-                totalTimeInSeconds,
-                thumbNailImage,
-                player,
-                playerState,
-                type)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (bookmark_id,
-                  file_id,
-                  resume_seconds,
-                  total_seconds,
-                  '',
-                  'VideoPlayer',
-                  '',
-                  1))
+                SELECT idFile, idBookmark, timeInSeconds, totalTimeInSeconds,
+                    type
+                FROM bookmark
+                WHERE idFile IN (%s)
+            ''' % params, chunk)
+            for row in self.cursor:
+                bookmarks.setdefault(row[0], []).append(row[1:])
+        update_files, update_bookmarks, delete_bookmarks, add_bookmarks = \
+            [], [], [], []
+        for file_id, resume_seconds, total_seconds, playcount, dateplayed in \
+                resume_points.itervalues():
+            # Be careful to set playCount to None, NOT the int zero!
+            playcount = playcount or None
+            if files.get(file_id) != (playcount, dateplayed):
+                update_files.append((playcount, dateplayed, file_id))
+            existing = bookmarks.get(file_id, [])
+            if resume_seconds:
+                if len(existing) == 1 and existing[0][3] == 1:
+                    bookmark_id, old_resume, old_total, _ = existing[0]
+                    if (old_resume, old_total) != (resume_seconds,
+                                                   total_seconds):
+                        update_bookmarks.append((resume_seconds,
+                                                 total_seconds,
+                                                 bookmark_id))
+                    continue
+                add_bookmarks.append((file_id,
+                                      resume_seconds,
+                                      total_seconds,
+                                      '',
+                                      'VideoPlayer',
+                                      '',
+                                      1))
+            if existing:
+                delete_bookmarks.append((file_id, ))
+        if update_files:
+            self.cursor.executemany(
+                'UPDATE files SET playCount = ?, lastPlayed = ? WHERE idFile = ?',
+                update_files)
+        if update_bookmarks:
+            self.cursor.executemany('''
+                UPDATE bookmark
+                SET timeInSeconds = ?, totalTimeInSeconds = ?
+                WHERE idBookmark = ?
+            ''', update_bookmarks)
+        if delete_bookmarks:
+            self.cursor.executemany('DELETE FROM bookmark WHERE idFile = ?',
+                                    delete_bookmarks)
+        if add_bookmarks:
+            self.cursor.executemany('''
+                INSERT INTO bookmark(
+                    idFile,
+                    timeInSeconds,
+                    totalTimeInSeconds,
+                    thumbNailImage,
+                    player,
+                    playerState,
+                    type)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', add_bookmarks)
 
     @db.catch_operationalerrors
     def create_tag(self, name):
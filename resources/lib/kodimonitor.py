@@ -18,10 +18,19 @@ from . import kodi_db
 from .downloadutils import DownloadUtils as DU
 from . import utils, timing, plex_functions as PF
 from . import json_rpc as js, playqueue as PQ, playlist_func as PL
-from . import backgroundthread, app, variables as v
+from . import backgroundthread, listing_cache, app, variables as v
 
 LOG = getLogger('PLEX.kodimonitor')
 
+# Highest Kodi idFile already checked by _clean_file_table. The first cleanup
+# after PKC's start will look at the entire files table
+_CLEANED_FILE_ID = 0
+# SQLite hands out the ids of deleted files again, e.g. after a sync or Kodi
+# removed the newest files. Check the entire files table on every n-th
+# cleanup so such files are not missed for good
+FULL_CLEANUP_INTERVAL = 10
+_CLEANUP_COUNTER = 0
+
 
 class KodiMonitor(xbmc.Monitor):
     """
@@ -52,6 +61,8 @@ class KodiMonitor(xbmc.Monitor):
         Monitor the PKC settings for changes made by the user
         """
         LOG.debug('PKC settings change detected')
+        utils.invalidate_settings()
+        listing_cache.invalidate()
 
     def onNotification(self, sender, method, data):
         """
@@ -76,11 +87,14 @@ class KodiMonitor(xbmc.Monitor):
                                    'videodb://tvshows/titles/%s/' % data['item']['id'])
             with app.APP.lock_playqueues:
                 self._playlist_onadd(data)
+            app.APP.playqueue_changed.set()
         elif method == 'Playlist.OnRemove':
             self._playlist_onremove(data)
+            app.APP.playqueue_changed.set()
         elif method == 'Playlist.OnClear':
             with app.APP.lock_playqueues:
                 self._playlist_onclear(data)
+            app.APP.playqueue_changed.set()
         elif method == "VideoLibrary.OnUpdate":
             _videolibrary_onupdate(data)
         elif method == "VideoLibrary.OnRemove":
@@ -101,6 +115,10 @@ class KodiMonitor(xbmc.Monitor):
             app.APP.stop_pkc = True
         elif method == 'Other.plugin.video.plexkodiconnect_play_action':
             self._start_next_episode(data)
+        if (method.startswith('Player.') or
+                method == 'Application.OnVolumeChanged'):
+            # Plex Companion needs to query Kodi's player state again
+            app.APP.player_changed.set()
 
     def _playlist_onadd(self, data):
         """
@@ -390,6 +408,8 @@ def _playback_cleanup(ended=False):
     # As all playback has halted, reset the players that have been active
     app.PLAYSTATE.active_players = set()
     app.PLAYSTATE.item = None
+    # Playstates or e.g. On Deck might have changed
+    listing_cache.invalidate()
     utils.delete_temporary_subtitles()
     LOG.debug('Finished PKC playback cleanup')
 
@@ -487,20 +507,34 @@ def _clean_file_table():
     Kodi library item, Kodi will add an additional entry for this (additional)
     path plugin:// in the file table. This leads to all sorts of wierd behavior.
     This function tries for at most 5 seconds to clean the file table.
+
+    Usually, only files added since the last successful cleanup are looked at
     """
+    global _CLEANED_FILE_ID, _CLEANUP_COUNTER
     LOG.debug('Start cleaning Kodi files table')
     if app.APP.monitor.waitForAbort(2):
         # PKC should exit
         return
+    _CLEANUP_COUNTER += 1
     try:
         with kodi_db.KodiVideoDB() as kodidb:
-            obsolete_file_ids = list(kodidb.obsolete_file_ids())
-            for file_id in obsolete_file_ids:
-                LOG.debug('Removing obsolete Kodi file_id %s', file_id)
-                kodidb.remove_file(file_id, remove_orphans=False)
+            max_file_id = kodidb.max_file_id()
+            if (max_file_id < _CLEANED_FILE_ID or
+                    _CLEANUP_COUNTER % FULL_CLEANUP_INTERVAL == 0):
+                # Ids we already checked might have been handed out again
+                LOG.debug('Checking the entire Kodi files table')
+                _CLEANED_FILE_ID = 0
+            obsolete_file_ids = list(kodidb.obsolete_file_ids(_CLEANED_FILE_ID))
+            if obsolete_file_ids:
+                LOG.debug('Removing obsolete Kodi file_ids %s',
+                          obsolete_file_ids)
+                kodidb.remove_files(obsolete_file_ids)
+                # SQLite will hand out the ids of the deleted files again
+                max_file_id = min(max_file_id, kodidb.max_file_id())
     except utils.OperationalError:
         LOG.debug('Database was locked, unable to clean file table')
     else:
+        _CLEANED_FILE_ID = max_file_id
         LOG.debug('Done cleaning up Kodi file table')
 
 
@@ -3,9 +3,9 @@
 from __future__ import absolute_import, division, unicode_literals
 import xbmc
 
-from .. import utils, app, variables as v
+from .. import utils, listing_cache, app, variables as v
 
-PLAYLIST_SYNC_ENABLED = (v.DEVICE != 'Microsoft UWP' and
+PLAYLIST_SYNC_ENABLED = (v.device() != 'Microsoft UWP' and
                          utils.settings('enablePlaylistSync') == 'true')
 
 
@@ -41,6 +41,7 @@ def update_kodi_library(video=True, music=True):
     """
     Updates the Kodi library and thus refreshes the Kodi views and widgets
     """
+    listing_cache.invalidate()
     if video:
         if not xbmc.getCondVisibility('Window.IsMedia'):
             xbmc.executebuiltin('UpdateLibrary(video)')
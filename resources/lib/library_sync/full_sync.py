@@ -7,11 +7,12 @@ import copy
 
 import xbmcgui
 
-from .get_metadata import GetMetadataTask, reset_collections
+from .get_metadata import GetMetadataTask, reset_collections, reset_parents
 from . import common, sections
 from .. import utils, timing, backgroundthread, variables as v, app
 from .. import plex_functions as PF, itemtypes
 from ..plex_db import PlexDB
+from ..profiler import PROFILER
 
 if common.PLAYLIST_SYNC_ENABLED:
     from .. import playlists
@@ -23,6 +24,15 @@ BATCH_SIZE = 2000
 # Safety margin to filter PMS items - how many seconds to look into the past?
 UPDATED_AT_SAFETY = 60 * 5
 LAST_VIEWED_AT_SAFETY = 60 * 5
+# Plex types we can resume an interrupted sync for. Their PMS containers are
+# sorted by plex_id - unlike albums
+CHECKPOINT_PLEX_TYPES = (
+    v.PLEX_TYPE_MOVIE,
+    v.PLEX_TYPE_SHOW,
+    v.PLEX_TYPE_SEASON,
+    v.PLEX_TYPE_EPISODE,
+    v.PLEX_TYPE_ARTIST
+)
 
 
 class InitNewSection(object):
@@ -40,9 +50,11 @@ class InitNewSection(object):
 
 
 class FullSync(common.fullsync_mixin):
-    def __init__(self, repair, callback, show_dialog):
+    def __init__(self, repair, callback, show_dialog, parent=None):
         """
         repair=True: force sync EVERY item
+        parent: FullSync instance if we're syncing some sections concurrently
+        to our parent. We'll share its download threads and cancel with it
         """
         self.repair = repair
         self.callback = callback
@@ -54,13 +66,16 @@ class FullSync(common.fullsync_mixin):
         self.section_type = None
         self.worker_count = int(utils.settings('syncThreadNumber'))
         self.item_count = 0
+        # Number of our GetMetadataTasks that are queued or running. The
+        # download threads might be shared with another FullSync instance
+        self.pending_tasks = 0
+        self.pending_lock = backgroundthread.threading.Lock()
         # For progress dialog
         self.show_dialog = show_dialog
         self.show_dialog_userdata = utils.settings('playstate_sync_indicator') == 'true'
         self.dialog = None
         self.total = 0
         self.current = 0
-        self.processed = 0
         self.title = ''
         self.section = None
         self.section_name = None
@@ -70,11 +85,25 @@ class FullSync(common.fullsync_mixin):
         self.successful = None
         self.section_success = None
         self.install_sync_done = utils.settings('SyncInstallRunDone') == 'true'
-        self.threader = backgroundthread.ThreaderManager(
-            worker=backgroundthread.NonstoppingBackgroundWorker,
-            worker_count=self.worker_count)
+        self.parent = parent
+        # {section_id: timestamp}: earliest start of a sync that contributed
+        # to one of the section's plex types, see get_iterator()
+        self.last_syncs = {}
+        if parent:
+            self.current_sync = parent.current_sync
+            self.successful = True
+            self.threader = parent.threader
+        else:
+            self.threader = backgroundthread.ThreaderManager(
+                worker=backgroundthread.NonstoppingBackgroundWorker,
+                worker_count=self.worker_count)
         super(FullSync, self).__init__()
 
+    def isCanceled(self):
+        if self.parent and self.parent.isCanceled():
+            return True
+        return super(FullSync, self).isCanceled()
+
     def update_progressbar(self):
         if self.dialog:
             try:
@@ -89,6 +118,13 @@ class FullSync(common.fullsync_mixin):
                 self.dialog.close()
                 self.dialog = None
 
+    def task_done(self):
+        """
+        Called by a GetMetadataTask once it's done
+        """
+        with self.pending_lock:
+            self.pending_tasks -= 1
+
     def process_item(self, xml_item):
         """
         Processes a single library item
@@ -99,11 +135,14 @@ class FullSync(common.fullsync_mixin):
                               xml_item.get('updatedAt',
                                            xml_item.get('addedAt', 1541572987)))):
             return
+        with self.pending_lock:
+            self.pending_tasks += 1
         self.threader.addTask(GetMetadataTask(self.queue,
                                               plex_id,
                                               self.plex_type,
                                               self.get_children,
-                                              self.item_count))
+                                              self.item_count,
+                                              self.task_done))
         self.item_count += 1
 
     def update_library(self):
@@ -118,7 +157,6 @@ class FullSync(common.fullsync_mixin):
                 break
             LOG.debug('Start or continue processing section %s (%ss)',
                       section.name, section.plex_type)
-            self.processed = 0
             self.total = section.total
             self.section_name = section.name
             self.section_type_text = utils.lang(
@@ -128,8 +166,11 @@ class FullSync(common.fullsync_mixin):
                     try:
                         _, item = self.queue.get(block=False)
                     except backgroundthread.Queue.Empty:
-                        if self.threader.threader.working():
-                            app.APP.monitor.waitForAbort(0.02)
+                        if self.pending_tasks:
+                            # Don't block Kodi or the writer of another
+                            # section while waiting for the PMS
+                            with PROFILER.measure('writer_wait'):
+                                context.wait(0.02)
                             continue
                         else:
                             # Try again, in case a thread just finished
@@ -140,12 +181,12 @@ class FullSync(common.fullsync_mixin):
                     i = 0
                     self.queue.task_done()
                     if isinstance(item, dict):
-                        context.add_update(item['xml'][0],
-                                           section_name=section.name,
-                                           section_id=section.id,
-                                           children=item['children'])
+                        with PROFILER.measure('write.%s' % section.plex_type):
+                            context.add_update(item['xml'][0],
+                                               section_name=section.name,
+                                               section_id=section.id,
+                                               children=item['children'])
                         self.title = item['xml'][0].get('title')
-                        self.processed += 1
                     elif isinstance(item, InitNewSection) or item is None:
                         self.section = item
                         break
@@ -154,8 +195,7 @@ class FullSync(common.fullsync_mixin):
                     self.item_count -= 1
                     self.current += 1
                     self.update_progressbar()
-                    if self.processed == 500:
-                        self.processed = 0
+                    if context.commit_due():
                         context.commit()
         LOG.debug('Done writing changes to Kodi library')
 
@@ -184,8 +224,9 @@ class FullSync(common.fullsync_mixin):
             # we're breaking the for loop
             loop = common.tag_last(iterator)
             while True:
-                # Check Plex DB to see what we need to add/update
-                with PlexDB() as self.plexdb:
+                # Check Plex DB to see what we need to add/update. We're only
+                # reading, so don't block the writer of another section
+                with PlexDB(lock=False) as self.plexdb:
                     for last, xml_item in loop:
                         if self.isCanceled():
                             return False
@@ -196,12 +237,71 @@ class FullSync(common.fullsync_mixin):
                 self.update_library()
                 if last:
                     break
-            reset_collections()
+                self.save_checkpoint(section, iterator, xml_item)
+            if section.plex_type == v.PLEX_TYPE_MOVIE:
+                reset_collections()
             return True
         except RuntimeError:
             LOG.error('Could not entirely process section %s', section)
             return False
 
+    def save_checkpoint(self, section, iterator, xml_item):
+        """
+        Persists how far we got with section so an interrupted sync can pick
+        up from here. Only if every item up to xml_item has been written
+        """
+        if (self.isCanceled() or self.item_count > 0 or
+                section.plex_type not in CHECKPOINT_PLEX_TYPES):
+            return
+        with PlexDB() as plexdb:
+            plexdb.set_sync_checkpoint(section.section_id,
+                                       section.plex_type,
+                                       section.updated_at,
+                                       # tag_last() already fetched the
+                                       # item following xml_item
+                                       iterator.current - 1,
+                                       int(xml_item.get('ratingKey')),
+                                       section.sync_start)
+
+    def get_iterator(self, section, updated_at):
+        """
+        Returns the PMS iterator for section's items. Resumes an interrupted
+        full sync of section if possible
+        """
+        checkpoint = None
+        if not self.repair and section.plex_type in CHECKPOINT_PLEX_TYPES:
+            with PlexDB(lock=False) as plexdb:
+                checkpoint = plexdb.sync_checkpoint(section.section_id,
+                                                    section.plex_type)
+        if checkpoint:
+            # The same updatedAt filter yields the same items as before -
+            # plus any that changed since. We'll skip items before our
+            # checkpoint that changed after the interrupted sync started. The
+            # next delta sync will thus need to start from there
+            section.updated_at = checkpoint['updated_at']
+            section.sync_start = checkpoint['sync_start']
+            iterator = PF.get_section_iterator(section.section_id,
+                                               plex_type=section.plex_type,
+                                               updated_at=section.updated_at,
+                                               last_viewed_at=None,
+                                               start=checkpoint['position'])
+            # Items sorted before our checkpoint might have been deleted on
+            # the PMS, shifting the container to the left
+            if (len(iterator.xml) and
+                    int(iterator.xml[0].get('ratingKey')) <= checkpoint['plex_id']):
+                LOG.info('Resuming sync of %s (%ss) with item %s of %s',
+                         section, section.plex_type, iterator.current,
+                         iterator.total)
+                return iterator
+            LOG.info('Could not resume sync of %s (%ss)',
+                     section, section.plex_type)
+        section.updated_at = updated_at
+        section.sync_start = self.current_sync
+        return PF.get_section_iterator(section.section_id,
+                                       plex_type=section.plex_type,
+                                       updated_at=updated_at,
+                                       last_viewed_at=None)
+
     @utils.log_time
     def playstate_per_section(self, section):
         LOG.debug('Processing %s playstates for library section %s',
@@ -241,6 +341,8 @@ class FullSync(common.fullsync_mixin):
                         self.update_progressbar()
                         if (i + 1) % (10 * BATCH_SIZE) == 0:
                             break
+                        if itemtype.commit_due():
+                            itemtype.commit()
                 if last:
                     break
             return True
@@ -274,11 +376,15 @@ class FullSync(common.fullsync_mixin):
                         updated_at = section.last_sync - UPDATED_AT_SAFETY \
                             if section.last_sync else None
                     try:
-                        element.iterator = PF.get_section_iterator(
-                            section.section_id,
-                            plex_type=element.plex_type,
-                            updated_at=updated_at,
-                            last_viewed_at=None)
+                        if all_items:
+                            element.iterator = PF.get_section_iterator(
+                                section.section_id,
+                                plex_type=element.plex_type,
+                                updated_at=updated_at,
+                                last_viewed_at=None)
+                        else:
+                            element.iterator = self.get_iterator(element,
+                                                                 updated_at)
                     except RuntimeError:
                         LOG.warn('Sync at least partially unsuccessful')
                         self.successful = False
@@ -290,27 +396,11 @@ class FullSync(common.fullsync_mixin):
         finally:
             queue.put(None)
 
-    def full_library_sync(self):
+    def addupdate_kinds(self, kinds):
         """
+        Adds and updates new or changed items for all sections of kinds, one
+        section after the other. Returns False if we need to abort
         """
-        # structure:
-        #  (plex_type,
-        #   section_type,
-        #   context for itemtype,
-        #   download children items, e.g. songs for a specific album?,
-        #   Queue)
-        kinds = [
-            (v.PLEX_TYPE_MOVIE, v.PLEX_TYPE_MOVIE, itemtypes.Movie, False, Queue.Queue),
-            (v.PLEX_TYPE_SHOW, v.PLEX_TYPE_SHOW, itemtypes.Show, False, Queue.Queue),
-            (v.PLEX_TYPE_SEASON, v.PLEX_TYPE_SHOW, itemtypes.Season, False, Queue.Queue),
-            (v.PLEX_TYPE_EPISODE, v.PLEX_TYPE_SHOW, itemtypes.Episode, False, Queue.Queue)
-        ]
-        if app.SYNC.enable_music:
-            kinds.extend([
-                (v.PLEX_TYPE_ARTIST, v.PLEX_TYPE_ARTIST, itemtypes.Artist, False, Queue.Queue),
-                (v.PLEX_TYPE_ALBUM, v.PLEX_TYPE_ARTIST, itemtypes.Album, True, backgroundthread.OrderedQueue),
-            ])
-        # ADD NEW ITEMS
         # Already start setting up the iterators. We need to enforce
         # syncing e.g. show before season before episode
         iterator_queue = Queue.Queue()
@@ -337,10 +427,79 @@ class FullSync(common.fullsync_mixin):
             if self.section_success:
                 # Need to check because a thread might have missed to get
                 # some items from the PMS
+                last_sync = min(self.last_syncs.get(section.section_id,
+                                                    section.sync_start),
+                                section.sync_start)
+                self.last_syncs[section.section_id] = last_sync
                 with PlexDB() as plexdb:
                     # Set the new time mark for the next delta sync
                     plexdb.update_section_last_sync(section.section_id,
-                                                    self.current_sync)
+                                                    last_sync)
+                    plexdb.remove_sync_checkpoint(section.section_id,
+                                                  section.plex_type)
+        return True
+
+    def threaded_addupdate_kinds(self, kinds, result_queue):
+        """
+        Runs addupdate_kinds in a separate thread and puts its result into
+        result_queue
+        """
+        result = False
+        try:
+            result = self.addupdate_kinds(kinds)
+        except Exception:
+            utils.ERROR(notify=True)
+        finally:
+            result_queue.put(result)
+
+    def full_library_sync(self):
+        """
+        """
+        # structure:
+        #  (plex_type,
+        #   section_type,
+        #   context for itemtype,
+        #   download children items, e.g. songs for a specific album?,
+        #   Queue)
+        kinds = [
+            (v.PLEX_TYPE_MOVIE, v.PLEX_TYPE_MOVIE, itemtypes.Movie, False, Queue.Queue),
+            (v.PLEX_TYPE_SHOW, v.PLEX_TYPE_SHOW, itemtypes.Show, False, Queue.Queue),
+            (v.PLEX_TYPE_SEASON, v.PLEX_TYPE_SHOW, itemtypes.Season, False, Queue.Queue),
+            (v.PLEX_TYPE_EPISODE, v.PLEX_TYPE_SHOW, itemtypes.Episode, False, Queue.Queue)
+        ]
+        music_kinds = []
+        if app.SYNC.enable_music:
+            music_kinds = [
+                (v.PLEX_TYPE_ARTIST, v.PLEX_TYPE_ARTIST, itemtypes.Artist, False, Queue.Queue),
+                (v.PLEX_TYPE_ALBUM, v.PLEX_TYPE_ARTIST, itemtypes.Album, True, backgroundthread.OrderedQueue),
+            ]
+        # ADD NEW ITEMS
+        # Music sections end up in a different Kodi database than video
+        # sections. Sync them concurrently with a writer thread of their own
+        if music_kinds:
+            music = FullSync(self.repair, None, False, parent=self)
+            music_result = Queue.Queue()
+            task = backgroundthread.FunctionAsTask(music.threaded_addupdate_kinds,
+                                                   None,
+                                                   music_kinds,
+                                                   music_result)
+            backgroundthread.BGThreader.addTask(task)
+        result = self.addupdate_kinds(kinds)
+        if music_kinds:
+            if result:
+                # Keep the user informed about the sections still syncing
+                music.dialog = self.dialog
+            else:
+                music.abort()
+            result = music_result.get() and result
+            if not music.successful:
+                self.successful = False
+            if music.dialog is None:
+                # Closed by music.update_progressbar() due to video playback
+                self.dialog = None
+        reset_parents()
+        if not result:
+            return False
         common.update_kodi_library(video=True, music=True)
 
         # Sync Plex playlists to Kodi and vice-versa
@@ -361,8 +520,8 @@ class FullSync(common.fullsync_mixin):
         # In order to not delete all your songs again
         if app.SYNC.enable_music:
             # We don't need to enforce the album order now
-            kinds.pop(5)
             kinds.extend([
+                music_kinds[0],
                 (v.PLEX_TYPE_ALBUM, v.PLEX_TYPE_ARTIST, itemtypes.Album, True, Queue.Queue),
                 (v.PLEX_TYPE_SONG, v.PLEX_TYPE_ARTIST, itemtypes.Song, True, Queue.Queue),
             ])
@@ -374,6 +533,7 @@ class FullSync(common.fullsync_mixin):
             # Close the progress indicator dialog
             self.dialog.close()
             self.dialog = None
+        iterator_queue = Queue.Queue()
         task = backgroundthread.FunctionAsTask(self.threaded_get_iterators,
                                                None,
                                                kinds,
@@ -435,10 +595,13 @@ class FullSync(common.fullsync_mixin):
     @utils.log_time
     def _run(self):
         self.current_sync = timing.plex_now()
+        itemtypes.COMMIT_STATS.reset()
         # Get latest Plex libraries and build playlist and video node files
         if self.isCanceled() or not sections.sync_from_pms(self):
             return
         self.successful = True
+        if app.SYNC.profiler:
+            PROFILER.start()
         try:
             if self.show_dialog:
                 self.dialog = xbmcgui.DialogProgressBG()
@@ -451,6 +614,10 @@ class FullSync(common.fullsync_mixin):
                 self.successful = False
                 return
         finally:
+            LOG.info('Database writes: %s', itemtypes.COMMIT_STATS)
+            PROFILER.stop(repair=self.repair,
+                          successful=self.successful,
+                          canceled=self.isCanceled())
             common.update_kodi_library(video=True, music=True)
             if self.dialog:
                 self.dialog.close()
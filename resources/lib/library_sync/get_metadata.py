@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
+import time
 
 from . import common
 from ..plex_api import API
-from .. import plex_functions as PF, backgroundthread, utils, variables as v
+from ..plex_db import PlexDB
+from ..profiler import PROFILER
+from .. import itemtypes, plex_functions as PF, backgroundthread, utils, \
+    variables as v
 
 
 LOG = getLogger("PLEX." + __name__)
@@ -15,6 +19,9 @@ LOCK = backgroundthread.threading.Lock()
 COLLECTION_MATCH = None
 # Dict with entries of the form <collection index>: <collection xml>
 COLLECTION_XMLS = {}
+# Set of plex_ids of parents already in the Plex DB or prefetched during this
+# sync - no need to look them up again for their next child
+KNOWN_PARENTS = set()
 
 
 def reset_collections():
@@ -27,6 +34,14 @@ def reset_collections():
         COLLECTION_XMLS = {}
 
 
+def reset_parents():
+    """
+    Forget the parents once a sync is done - they might get deleted
+    """
+    KNOWN_PARENTS.clear()
+    itemtypes.PARENT_XMLS.clear()
+
+
 class GetMetadataTask(common.fullsync_mixin, backgroundthread.Task):
     """
     Threaded download of Plex XML metadata for a certain library item.
@@ -35,14 +50,19 @@ class GetMetadataTask(common.fullsync_mixin, backgroundthread.Task):
     Input:
         queue               Queue.Queue() object where this thread will store
                             the downloaded metadata XMLs as etree objects
+        callback            Called without arguments once the task is done,
+                            whether or not it succeeded
     """
     def __init__(self, queue, plex_id, plex_type, get_children=False,
-                 count=None):
+                 count=None, callback=None):
         self.queue = queue
         self.plex_id = plex_id
         self.plex_type = plex_type
         self.get_children = get_children
         self.count = count
+        self.callback = callback
+        # To measure how long we've been waiting for a download thread
+        self.created = time.time()
         super(GetMetadataTask, self).__init__()
 
     def _collections(self, item):
@@ -80,10 +100,64 @@ class GetMetadataTask(common.fullsync_mixin, backgroundthread.Task):
                     continue
             item['children'][plex_set_id] = COLLECTION_XMLS[plex_set_id]
 
+    def _parents(self, item):
+        """
+        Downloads the metadata of parent items that are not yet in the Plex
+        DB, e.g. the artist of an album or the show and season of an episode.
+        The writer thread would otherwise need to fetch them while holding
+        the DB locks
+        """
+        api = API(item['xml'][0])
+        if self.plex_type == v.PLEX_TYPE_SEASON:
+            parents = ((api.parent_id(), v.PLEX_TYPE_SHOW), )
+        elif self.plex_type == v.PLEX_TYPE_EPISODE:
+            parents = ((api.show_id(), v.PLEX_TYPE_SHOW),
+                       (api.season_id(), v.PLEX_TYPE_SEASON))
+        elif self.plex_type == v.PLEX_TYPE_ALBUM:
+            parents = ((api.parent_id(), v.PLEX_TYPE_ARTIST), )
+        elif self.plex_type == v.PLEX_TYPE_SONG:
+            parents = ((api.grandparent_id(), v.PLEX_TYPE_ARTIST),
+                       (api.parent_id(), v.PLEX_TYPE_ALBUM))
+        else:
+            return
+        parents = [x for x in parents if x[0] and
+                   x[0] not in KNOWN_PARENTS and
+                   x[0] not in itemtypes.PARENT_XMLS]
+        if not parents:
+            return
+        with PlexDB(lock=False) as plexdb:
+            missing = []
+            for plex_id, plex_type in parents:
+                if plexdb.item_by_id(plex_id, plex_type):
+                    KNOWN_PARENTS.add(plex_id)
+                else:
+                    missing.append((plex_id, plex_type))
+        for plex_id, plex_type in missing:
+            if self.isCanceled():
+                return
+            LOG.debug('Prefetching missing parent %s %s', plex_type, plex_id)
+            xml = PF.GetPlexMetadata(plex_id)
+            try:
+                xml[0].attrib
+            except (TypeError, IndexError, AttributeError):
+                LOG.error('Could not get parent %s %s', plex_type, plex_id)
+                continue
+            itemtypes.PARENT_XMLS[plex_id] = xml
+            KNOWN_PARENTS.add(plex_id)
+
     def run(self):
         """
         Do the work
         """
+        PROFILER.add('metadata_queue_wait', time.time() - self.created)
+        try:
+            with PROFILER.measure('metadata_download'):
+                self._run()
+        finally:
+            if self.callback:
+                self.callback()
+
+    def _run(self):
         if self.isCanceled():
             return
         # Download Metadata
@@ -112,6 +186,8 @@ class GetMetadataTask(common.fullsync_mixin, backgroundthread.Task):
                 global LOCK
                 with LOCK:
                     self._collections(item)
+        if not self.isCanceled():
+            self._parents(item)
         if not self.isCanceled() and self.get_children:
             children_xml = PF.GetAllPlexChildren(self.plex_id)
             try:
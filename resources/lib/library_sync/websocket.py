@@ -2,14 +2,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
+from itertools import count
+from collections import OrderedDict
+import heapq
 
 from .common import update_kodi_library, PLAYLIST_SYNC_ENABLED
 from .fanart import SYNC_FANART, FanartTask
 from ..plex_api import API
 from ..plex_db import PlexDB
-from .. import kodi_db
 from .. import backgroundthread, plex_functions as PF, itemtypes
-from .. import artwork, utils, timing, variables as v, app
+from .. import artwork, utils, timing, listing_cache, variables as v, app
 
 if PLAYLIST_SYNC_ENABLED:
     from .. import playlists
@@ -17,20 +19,226 @@ if PLAYLIST_SYNC_ENABLED:
 LOG = getLogger('PLEX.sync.websocket')
 
 CACHING_ENALBED = utils.settings('enableTextureCache') == "true"
+# Maximum number of Plex items we ask the PMS metadata for in one request
+METADATA_BATCH_SIZE = 50
+# Playing sessions we did not hear of for this many seconds are forgotten
+SESSION_TIMEOUT = 600
+# Maximum number of playing sessions we keep track of
+MAX_SESSIONS = 50
+# Seconds we remember which Kodi item belongs to a Plex item being played
+ITEM_TIMEOUT = 600
+# Resume points of a playing session are written to the Kodi DB at most once
+# within this many seconds
+PLAYSTATE_WRITE_INTERVAL = 30
 
-WEBSOCKET_MESSAGES = []
-# Dict to save info for Plex items currently being played somewhere
-PLAYSTATE_SESSIONS = {}
 
 
-def multi_delete(input_list, delete_list):
+class MessageStore(object):
     """
-    Deletes the list items of input_list at the positions in delete_list
-    (which can be in any arbitrary order)
+    Websocket messages waiting to be processed, at most one per plex_id.
+    Messages are due once their safety margin has passed; a heap sorted by
+    due time lets us find these without looking at all the other messages.
+    Entries on the heap that have been replaced or removed in the meantime
+    are skipped when they come up.
     """
-    for index in sorted(delete_list, reverse=True):
-        del input_list[index]
-    return input_list
+    def __init__(self):
+        # {plex_id: message}
+        self._messages = {}
+        # [(due, sequence number, plex_id)]
+        self._heap = []
+        self._counter = count()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __contains__(self, plex_id):
+        return plex_id in self._messages
+
+    def get(self, plex_id):
+        return self._messages.get(plex_id)
+
+    def add(self, message, delay=0):
+        """
+        Adds message, replacing any pending message for the same plex_id.
+        message will be due in delay seconds
+        """
+        message['due'] = timing.unix_timestamp() + delay
+        message['seq'] = next(self._counter)
+        self._messages[message['plex_id']] = message
+        heapq.heappush(self._heap,
+                       (message['due'], message['seq'], message['plex_id']))
+
+    def pop_due(self, now):
+        """
+        Removes and returns all messages that are due at unix timestamp now,
+        sorted by due time
+        """
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, plex_id = heapq.heappop(self._heap)
+            message = self._messages.get(plex_id)
+            if message is None or message['seq'] != seq:
+                # Outdated heap entry
+                continue
+            del self._messages[plex_id]
+            due.append(message)
+        return due
+
+
+class PlaystateSession(object):
+    """
+    A Plex item that is currently being played somewhere, including all the
+    info we need to update its playstate in Kodi
+    """
+    def __init__(self, plex_id, item):
+        self.plex_id = plex_id
+        self.kodi_id = item['kodi_id']
+        self.kodi_type = item['kodi_type']
+        self.kodi_fileid = item['kodi_fileid']
+        if item['plex_type'] == v.PLEX_TYPE_EPISODE:
+            self.kodi_fileid_2 = item['kodi_fileid_2']
+        else:
+            self.kodi_fileid_2 = None
+        self.user_id = None
+        self.username = None
+        self.duration = None
+        self.view_count = None
+        self.marked_played = False
+        self.last_seen = timing.unix_timestamp()
+        self.last_write = 0
+        # (mark_played, resume, unix timestamp) not yet written to Kodi
+        self.pending = None
+
+    def __repr__(self):
+        return ('{{'
+                'plex_id: {self.plex_id}, '
+                'kodi_type: {self.kodi_type}, '
+                'kodi_id: {self.kodi_id}, '
+                'user_id: {self.user_id}, '
+                'username: {self.username}, '
+                'duration: {self.duration}, '
+                'view_count: {self.view_count}, '
+                'marked_played: {self.marked_played}'
+                '}}').format(self=self)
+
+    def update(self, resume, mark_played, force=False):
+        """
+        Sets a new resume point. It is only written to the Kodi DB if the last
+        write happened more than PLAYSTATE_WRITE_INTERVAL seconds ago, if the
+        item has been completely watched or if force is True
+        """
+        now = timing.unix_timestamp()
+        self.pending = (mark_played, resume, now)
+        if (force or mark_played or
+                now - self.last_write >= PLAYSTATE_WRITE_INTERVAL):
+            self.flush()
+
+    def flush(self):
+        """
+        Writes a pending resume point to the Kodi DB
+        """
+        if self.pending is None:
+            return
+        mark_played, resume, timestamp = self.pending
+        self.pending = None
+        self.last_write = timing.unix_timestamp()
+        LOG.debug('Update playstate for user %s for %s with plex id %s to '
+                  'viewCount %s, resume %s, mark_played %s for item %s',
+                  app.ACCOUNT.plex_username, self.kodi_type, self.plex_id,
+                  self.view_count, resume, mark_played, self)
+        listing_cache.invalidate()
+        with itemtypes.ITEMTYPE_FROM_KODITYPE[self.kodi_type](None) as fkt:
+            fkt.update_playstate(mark_played,
+                                 self.view_count,
+                                 resume,
+                                 self.duration,
+                                 self.kodi_fileid,
+                                 self.kodi_fileid_2,
+                                 timestamp)
+
+
+class PlaystateSessions(object):
+    """
+    Keeps PlaystateSession() by the PMS' sessionKey. Sessions we did not hear
+    of for SESSION_TIMEOUT seconds are dropped, as are the least recently used
+    ones if there are more than MAX_SESSIONS. Also remembers which Kodi item
+    belongs to a plex_id so we don't need to look through all Plex DB tables
+    for every new session.
+    """
+    def __init__(self):
+        # {session_key: PlaystateSession}, least recently used first
+        self._sessions = OrderedDict()
+        # {plex_id: (unix timestamp, Plex DB item or None)}
+        self._items = {}
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_key):
+        session = self._sessions.pop(session_key, None)
+        if session is not None:
+            session.last_seen = timing.unix_timestamp()
+            self._sessions[session_key] = session
+        return session
+
+    def add(self, session_key, session):
+        self._sessions[session_key] = session
+        self.expire()
+
+    def stop(self, session_key):
+        """
+        Drops the session, making sure that its last resume point is written
+        to the Kodi DB
+        """
+        session = self._sessions.pop(session_key, None)
+        if session is not None:
+            session.flush()
+
+    def expire(self):
+        now = timing.unix_timestamp()
+        while self._sessions:
+            session_key, session = next(self._sessions.iteritems())
+            if (len(self._sessions) <= MAX_SESSIONS and
+                    now - session.last_seen <= SESSION_TIMEOUT):
+                break
+            LOG.debug('Dropping playing session %s', session_key)
+            del self._sessions[session_key]
+            session.flush()
+        for plex_id in [key for key, value in self._items.iteritems()
+                        if now - value[0] > ITEM_TIMEOUT]:
+            del self._items[plex_id]
+
+    def item(self, plex_id):
+        """
+        Returns the Plex DB item for plex_id or None if it has not been synced
+        """
+        now = timing.unix_timestamp()
+        try:
+            timestamp, item = self._items[plex_id]
+        except KeyError:
+            pass
+        else:
+            if now - timestamp <= ITEM_TIMEOUT:
+                return item
+        with PlexDB(lock=False) as plexdb:
+            item = plexdb.item_by_id(plex_id, plex_type=None)
+        self._items[plex_id] = (now, item)
+        return item
+
+    def forget_item(self, plex_id):
+        """
+        Call BEFORE the Plex item changes in the Kodi library, e.g. before it
+        is deleted. Pending resume points of its sessions are written first
+        """
+        self._items.pop(plex_id, None)
+        for session_key in [key for key, session in self._sessions.iteritems()
+                            if session.plex_id == plex_id]:
+            self._sessions.pop(session_key).flush()
+
+
+WEBSOCKET_MESSAGES = MessageStore()
+# Info for Plex items currently being played somewhere
+PLAYSTATE_SESSIONS = PlaystateSessions()
 
 
 def store_websocket_message(message):
@@ -72,69 +280,107 @@ def process_websocket_messages():
         6: 'analyzing',
         9: 'deleted'
     """
-    global WEBSOCKET_MESSAGES
-    now = timing.unix_timestamp()
     update_kodi_video_library, update_kodi_music_library = False, False
-    delete_list = []
-    for i, message in enumerate(WEBSOCKET_MESSAGES):
-        if message['state'] == 9:
-            successful, video, music = process_delete_message(message)
-        elif now - message['timestamp'] < app.SYNC.backgroundsync_saftymargin:
-            # We haven't waited long enough for the PMS to finish processing the
-            # item. Do it later (excepting deletions)
-            continue
-        else:
-            successful, video, music = process_new_item_message(message)
-            if (successful and SYNC_FANART and
+    # Messages only become due once the PMS had enough time to finish
+    # processing the item (excepting deletions)
+    messages = WEBSOCKET_MESSAGES.pop_due(timing.unix_timestamp())
+    for message in messages:
+        # Write pending resume points while the Kodi items still exist
+        PLAYSTATE_SESSIONS.forget_item(message['plex_id'])
+    # {plex_id: plex_type} of all successfully processed items
+    processed = process_delete_messages(
+        [x for x in messages if x['state'] == 9])
+    processed.update(process_new_item_messages(
+        [x for x in messages if x['state'] != 9]))
+    for message in messages:
+        plex_type = processed.get(message['plex_id'])
+        if plex_type is not None:
+            if plex_type in v.PLEX_VIDEOTYPES:
+                update_kodi_video_library = True
+            if plex_type in v.PLEX_AUDIOTYPES:
+                update_kodi_music_library = True
+            if (message['state'] != 9 and SYNC_FANART and
                     message['plex_type'] in (v.PLEX_TYPE_MOVIE, v.PLEX_TYPE_SHOW)):
                 task = FanartTask()
                 task.setup(message['plex_id'],
                            message['plex_type'],
                            refresh=False)
                 backgroundthread.BGThreader.addTask(task)
-        if successful is True:
-            delete_list.append(i)
-            update_kodi_video_library = True if video else update_kodi_video_library
-            update_kodi_music_library = True if music else update_kodi_music_library
         else:
             # Safety net if we can't process an item
             message['attempt'] += 1
             if message['attempt'] > 3:
                 LOG.error('Repeatedly could not process message %s, abort',
                           message)
-                delete_list.append(i)
-
-    # Get rid of the items we just processed
-    if delete_list:
-        WEBSOCKET_MESSAGES = multi_delete(WEBSOCKET_MESSAGES, delete_list)
+            else:
+                # Try again with the next run
+                WEBSOCKET_MESSAGES.add(message)
     # Let Kodi know of the change
     if update_kodi_video_library or update_kodi_music_library:
         update_kodi_library(video=update_kodi_video_library,
                             music=update_kodi_music_library)
 
 
-def process_new_item_message(message):
-    LOG.debug('Message: %s', message)
-    xml = PF.GetPlexMetadata(message['plex_id'])
-    try:
-        plex_type = xml[0].attrib['type']
-    except (IndexError, KeyError, TypeError):
-        LOG.error('Could not download metadata for %s', message['plex_id'])
-        return False, False, False
-    LOG.debug("Processing new/updated PMS item: %s", message['plex_id'])
-    with itemtypes.ITEMTYPE_FROM_PLEXTYPE[plex_type](timing.unix_timestamp()) as typus:
-        typus.add_update(xml[0],
-                         section_name=xml.get('librarySectionTitle'),
-                         section_id=xml.get('librarySectionID'))
-    cache_artwork(message['plex_id'], plex_type)
-    return True, plex_type in v.PLEX_VIDEOTYPES, plex_type in v.PLEX_AUDIOTYPES
+def process_new_item_messages(messages):
+    """
+    Downloads the metadata for all messages with as few PMS requests as
+    possible. Then adds/updates the items using one DB transaction per Plex
+    type. Returns the dict {plex_id: plex_type} for all items processed
+    """
+    # {plex_type: [(xml element, xml container)]}
+    items = {}
+    for i in range(0, len(messages), METADATA_BATCH_SIZE):
+        plex_ids = [x['plex_id'] for x in messages[i:i + METADATA_BATCH_SIZE]]
+        LOG.debug('Downloading metadata for new/updated PMS items %s',
+                  plex_ids)
+        xml = PF.GetPlexMetadata(','.join(unicode(x) for x in plex_ids))
+        if xml in (None, 401):
+            LOG.error('Could not download metadata for %s', plex_ids)
+            continue
+        for child in xml:
+            items.setdefault(child.get('type'), []).append((child, xml))
+    processed = {}
+    art_urls = []
+    for plex_type, elements in items.iteritems():
+        if plex_type not in itemtypes.ITEMTYPE_FROM_PLEXTYPE:
+            LOG.error('Cannot process PMS items of type %s', plex_type)
+            continue
+        LOG.debug('Processing %s new/updated PMS items of type %s',
+                  len(elements), plex_type)
+        with itemtypes.ITEMTYPE_FROM_PLEXTYPE[plex_type](timing.unix_timestamp()) as typus:
+            for child, xml in elements:
+                plex_id = utils.cast(int, child.get('ratingKey'))
+                typus.add_update(
+                    child,
+                    section_name=child.get('librarySectionTitle',
+                                           xml.get('librarySectionTitle')),
+                    section_id=child.get('librarySectionID',
+                                         xml.get('librarySectionID')))
+                processed[plex_id] = plex_type
+                if CACHING_ENALBED:
+                    art_urls.extend(artwork_urls(typus, plex_id, plex_type))
+    # Only hit Kodi's webserver once we released the DB locks
+    for url in art_urls:
+        artwork.cache_url(url)
+    return processed
 
 
-def process_delete_message(message):
-    plex_type = message['plex_type']
-    with itemtypes.ITEMTYPE_FROM_PLEXTYPE[plex_type](None) as typus:
-        typus.remove(message['plex_id'], plex_type=plex_type)
-    return True, plex_type in v.PLEX_VIDEOTYPES, plex_type in v.PLEX_AUDIOTYPES
+def process_delete_messages(messages):
+    """
+    Deletes the items of all messages using one DB transaction per Plex type.
+    Returns the dict {plex_id: plex_type} for all items processed
+    """
+    # {plex_type: [plex_id]}
+    plex_ids = {}
+    for message in messages:
+        plex_ids.setdefault(message['plex_type'], []).append(message['plex_id'])
+    processed = {}
+    for plex_type, ids in plex_ids.iteritems():
+        with itemtypes.ITEMTYPE_FROM_PLEXTYPE[plex_type](None) as typus:
+            for plex_id in ids:
+                typus.remove(plex_id, plex_type=plex_type)
+                processed[plex_id] = plex_type
+    return processed
 
 
 def store_timeline_message(data):
@@ -142,7 +388,6 @@ def store_timeline_message(data):
     PMS is messing with the library items, e.g. new or changed. Put in our
     "processing queue" for later
     """
-    global WEBSOCKET_MESSAGES
     for message in data:
         if 'tv.plex' in message.get('identifier', ''):
             # Ommit Plex DVR messages - the Plex IDs are not corresponding
@@ -165,7 +410,8 @@ def store_timeline_message(data):
         elif status == 9:
             # Immediately and always process deletions (as the PMS will
             # send additional message with other codes)
-            WEBSOCKET_MESSAGES.append({
+            listing_cache.invalidate()
+            WEBSOCKET_MESSAGES.add({
                 'state': status,
                 'plex_type': typus,
                 'plex_id': utils.cast(int, message['itemID']),
@@ -175,20 +421,20 @@ def store_timeline_message(data):
         elif typus in (v.PLEX_TYPE_MOVIE,
                        v.PLEX_TYPE_EPISODE,
                        v.PLEX_TYPE_SONG) and status == 5:
+            # PMS listings, e.g. Recently Added, change immediately
+            listing_cache.invalidate()
             plex_id = int(message['itemID'])
-            # Have we already added this element for processing?
-            for existing_message in WEBSOCKET_MESSAGES:
-                if existing_message['plex_id'] == plex_id:
-                    break
-            else:
-                # Haven't added this element to the queue yet
-                WEBSOCKET_MESSAGES.append({
+            # Have we already added this element for processing? A pending
+            # deletion is superseded, e.g. if the item has been re-added
+            existing_message = WEBSOCKET_MESSAGES.get(plex_id)
+            if existing_message is None or existing_message['state'] == 9:
+                WEBSOCKET_MESSAGES.add({
                     'state': status,
                     'plex_type': typus,
                     'plex_id': plex_id,
                     'timestamp': timing.unix_timestamp(),
                     'attempt': 0
-                })
+                }, delay=app.SYNC.backgroundsync_saftymargin)
 
 
 def store_activity_message(data):
@@ -196,7 +442,6 @@ def store_activity_message(data):
     PMS is re-scanning an item, e.g. after having changed a movie poster.
     WATCH OUT for this if it's triggered by our PKC library scan!
     """
-    global WEBSOCKET_MESSAGES
     for message in data:
         if message['event'] != 'ended':
             # Scan still going on, so skip for now
@@ -211,25 +456,22 @@ def store_activity_message(data):
         if not plex_id:
             # Likely a Plex id like /library/metadata/3/children
             continue
+        if plex_id in WEBSOCKET_MESSAGES:
+            # Already added this element
+            continue
         # We're only looking at existing elements - have we synced yet?
         with PlexDB(lock=False) as plexdb:
             typus = plexdb.item_by_id(plex_id, plex_type=None)
         if not typus:
             LOG.debug('plex_id %s not synced yet - skipping', plex_id)
             continue
-        # Have we already added this element?
-        for existing_message in WEBSOCKET_MESSAGES:
-            if existing_message['plex_id'] == plex_id:
-                break
-        else:
-            # Haven't added this element to the queue yet
-            WEBSOCKET_MESSAGES.append({
-                'state': None,  # Don't need a state here
-                'plex_type': typus['plex_type'],
-                'plex_id': plex_id,
-                'timestamp': timing.unix_timestamp(),
-                'attempt': 0
-            })
+        WEBSOCKET_MESSAGES.add({
+            'state': None,  # Don't need a state here
+            'plex_type': typus['plex_type'],
+            'plex_id': plex_id,
+            'timestamp': timing.unix_timestamp(),
+            'attempt': 0
+        }, delay=app.SYNC.backgroundsync_saftymargin)
 
 
 def process_playing(data):
@@ -237,11 +479,13 @@ def process_playing(data):
     Someone (not necessarily the user signed in) is playing something some-
     where
     """
-    global PLAYSTATE_SESSIONS
+    # Write resume points of sessions that went silent, e.g. because the
+    # client crashed
+    PLAYSTATE_SESSIONS.expire()
     for message in data:
         status = message['state']
-        if status == 'buffering' or status == 'stopped':
-            # Drop buffering and stop messages immediately - no value
+        if status == 'buffering':
+            # Drop buffering messages immediately - no value
             continue
         plex_id = utils.cast(int, message['ratingKey'])
         skip = False
@@ -255,118 +499,96 @@ def process_playing(data):
             LOG.warn('Received malformed message from the PMS: %s', message)
             continue
         session_key = message['sessionKey']
+        if status == 'stopped':
+            PLAYSTATE_SESSIONS.stop(session_key)
+            continue
         # Do we already have a sessionKey stored?
-        if session_key not in PLAYSTATE_SESSIONS:
-            with PlexDB(lock=False) as plexdb:
-                typus = plexdb.item_by_id(plex_id, plex_type=None)
-            if not typus or 'kodi_fileid' not in typus:
+        session = PLAYSTATE_SESSIONS.get(session_key)
+        if session is None:
+            item = PLAYSTATE_SESSIONS.item(plex_id)
+            if not item or 'kodi_fileid' not in item:
                 # Item not (yet) in Kodi library or not affiliated with a file
                 continue
-            if utils.settings('plex_serverowned') == 'false':
-                # Not our PMS, we are not authorized to get the sessions
-                # On the bright side, it must be us playing :-)
-                PLAYSTATE_SESSIONS[session_key] = {}
-            else:
+            session = PlaystateSession(plex_id, item)
+            if utils.settings('plex_serverowned') != 'false':
                 # PMS is ours - get all current sessions
+                # If it's not our PMS, we are not authorized to get the
+                # sessions. On the bright side, it must be us playing :-)
                 pms_sessions = PF.GetPMSStatus(app.ACCOUNT.plex_token)
                 if session_key not in pms_sessions:
                     LOG.info('Session key %s still unknown! Skip '
                              'playstate update', session_key)
                     continue
-                PLAYSTATE_SESSIONS[session_key] = pms_sessions[session_key]
-                LOG.debug('Updated current sessions. They are: %s',
-                          PLAYSTATE_SESSIONS)
-            # Attach Kodi info to the session
-            PLAYSTATE_SESSIONS[session_key]['kodi_fileid'] = typus['kodi_fileid']
-            if typus['plex_type'] == v.PLEX_TYPE_EPISODE:
-                PLAYSTATE_SESSIONS[session_key]['kodi_fileid_2'] = typus['kodi_fileid_2']
-            else:
-                PLAYSTATE_SESSIONS[session_key]['kodi_fileid_2'] = None
-            PLAYSTATE_SESSIONS[session_key]['kodi_id'] = typus['kodi_id']
-            PLAYSTATE_SESSIONS[session_key]['kodi_type'] = typus['kodi_type']
-        session = PLAYSTATE_SESSIONS[session_key]
+                session.user_id = pms_sessions[session_key]['userId']
+                session.username = pms_sessions[session_key]['username']
+            PLAYSTATE_SESSIONS.add(session_key, session)
+            LOG.debug('Added session %s: %s', session_key, session)
         if utils.settings('plex_serverowned') != 'false':
             # Identify the user - same one as signed on with PKC? Skip
             # update if neither session's username nor userid match
             # (Owner sometime's returns id '1', not always)
-            if not app.ACCOUNT.plex_token and session['userId'] == '1':
+            if not app.ACCOUNT.plex_token and session.user_id == '1':
                 # PKC not signed in to plex.tv. Plus owner of PMS is
                 # playing (the '1').
                 # Hence must be us (since several users require plex.tv
                 # token for PKC)
                 pass
-            elif not (session['userId'] == app.ACCOUNT.plex_user_id or
-                      session['username'] == app.ACCOUNT.plex_username):
+            elif not (session.user_id == app.ACCOUNT.plex_user_id or
+                      session.username == app.ACCOUNT.plex_username):
                 LOG.debug('Our username %s, userid %s did not match '
                           'the session username %s with userid %s',
                           app.ACCOUNT.plex_username,
                           app.ACCOUNT.plex_user_id,
-                          session['username'],
-                          session['userId'])
+                          session.username,
+                          session.user_id)
                 continue
         # Get an up-to-date XML from the PMS because PMS will NOT directly
         # tell us: duration of item viewCount
-        if not session.get('duration'):
+        if not session.duration:
             xml = PF.GetPlexMetadata(plex_id)
             if xml in (None, 401):
                 LOG.error('Could not get up-to-date xml for item %s',
                           plex_id)
                 continue
             api = API(xml[0])
-            session['duration'] = api.runtime()
-            session['viewCount'] = api.viewcount()
+            session.duration = api.runtime()
+            session.view_count = api.viewcount()
         # Sometimes, Plex tells us resume points in milliseconds and
         # not in seconds - thank you very much!
-        if message['viewOffset'] > session['duration']:
+        if message['viewOffset'] > session.duration:
             resume = message['viewOffset'] / 1000
         else:
             resume = message['viewOffset']
         if resume < v.IGNORE_SECONDS_AT_START:
             continue
         try:
-            completed = float(resume) / float(session['duration'])
+            completed = float(resume) / float(session.duration)
         except (ZeroDivisionError, TypeError):
             LOG.error('Could not mark playstate for %s and session %s',
                       data, session)
             continue
         if completed >= v.MARK_PLAYED_AT:
             # Only mark completely watched ONCE
-            if session.get('marked_played') is None:
-                session['marked_played'] = True
+            if not session.marked_played:
+                session.marked_played = True
                 mark_played = True
             else:
                 # Don't mark it as completely watched again
                 continue
         else:
             mark_played = False
-        LOG.debug('Update playstate for user %s for %s with plex id %s to '
-                  'viewCount %s, resume %s, mark_played %s for item %s',
-                  app.ACCOUNT.plex_username, session['kodi_type'], plex_id,
-                  session['viewCount'], resume, mark_played, PLAYSTATE_SESSIONS[session_key])
-        func = itemtypes.ITEMTYPE_FROM_KODITYPE[session['kodi_type']]
-        with func(None) as fkt:
-            fkt.update_playstate(mark_played,
-                                 session['viewCount'],
-                                 resume,
-                                 session['duration'],
-                                 session['kodi_fileid'],
-                                 session['kodi_fileid_2'],
-                                 timing.unix_timestamp())
+        # Coalesce resume points while playing, but e.g. write immediately
+        # once the user paused
+        session.update(resume, mark_played, force=status != 'playing')
 
 
-def cache_artwork(plex_id, plex_type, kodi_id=None, kodi_type=None):
+def artwork_urls(typus, plex_id, plex_type):
     """
-    Triggers caching of artwork (if so enabled in the PKC settings)
+    Returns a list of all artwork urls of the Kodi item belonging to plex_id,
+    using the DB connections of the itemtypes instance typus
     """
-    if not CACHING_ENALBED:
-        return
-    if not kodi_id:
-        with PlexDB(lock=False) as plexdb:
-            item = plexdb.item_by_id(plex_id, plex_type)
-        if not item:
-            LOG.error('Could not retrieve Plex db info for %s', plex_id)
-            return
-        kodi_id, kodi_type = item['kodi_id'], item['kodi_type']
-    with kodi_db.KODIDB_FROM_PLEXTYPE[plex_type]() as kodidb:
-        for url in kodidb.art_urls(kodi_id, kodi_type):
-            artwork.cache_url(url)
+    item = typus.plexdb.item_by_id(plex_id, plex_type)
+    if not item:
+        LOG.error('Could not retrieve Plex db info for %s', plex_id)
+        return []
+    return list(typus.kodidb.art_urls(item['kodi_id'], item['kodi_type']))
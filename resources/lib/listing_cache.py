@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cache for the listings PKC shows for widgets and plugin://... paths.
+
+Skins reload all their widgets every time the user returns to the home screen.
+Every one of these plugin calls starts a new, short-lived Python instance
+that would need to download and process the PMS xml again. Rendered listings
+are thus shared through Kodi window properties, the same channel transfer.py
+uses. The long-running PKC service owns these entries: it evicts old ones and
+invalidates all of them as soon as e.g. the PMS tells us that an item changed.
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+from collections import OrderedDict
+from threading import Lock
+from hashlib import md5
+from uuid import uuid4
+import json
+import time
+
+import xbmcgui
+
+from . import transfer
+
+LOG = getLogger('PLEX.listing_cache')
+
+WINDOW = xbmcgui.Window(10000)
+# Prefix of the window properties holding cached listings
+WINDOW_LISTING = b'plexkodiconnect.listing.%s'
+# Changes every time the cache is invalidated. Empty if the service is not
+# running, in which case caching is disabled
+WINDOW_GENERATION = 'plexkodiconnect.listing.generation'.encode('utf-8')
+# Seconds a cached listing stays valid even without any invalidation
+TTL = 600
+# Maximum number of listings we keep in memory. Oldest ones are dropped first
+MAX_ENTRIES = 30
+
+# Only used within the PKC service: {cache_id: unix timestamp}
+_ENTRIES = OrderedDict()
+_LOCK = Lock()
+
+
+class Listing(object):
+    """
+    A listing as it is requested by one plugin://... call. Pass all arguments
+    that influence the content of the listing, e.g. the PMS key and the
+    Kodi content type. The current PMS user is considered automatically.
+
+    Create the instance BEFORE you download anything from the PMS so that an
+    invalidation of the cache while we're busy is detected.
+    """
+    def __init__(self, *args):
+        self.generation = generation()
+        args = (WINDOW.getProperty(b'pms_token'), ) + args
+        self.cache_id = md5(json.dumps(args)).hexdigest()
+        self.content_type = None
+        self.items = None
+
+    @property
+    def enabled(self):
+        return bool(self.generation)
+
+    def load(self):
+        """
+        Returns True if a valid cached listing was found. self.content_type
+        and self.items (dicts created by widgets.prepare_listitem) are then
+        set
+        """
+        if not self.enabled:
+            return False
+        answ = WINDOW.getProperty(WINDOW_LISTING % self.cache_id)
+        if not answ:
+            return False
+        answ = json.loads(answ)
+        if (answ['generation'] != self.generation or
+                time.time() - answ['timestamp'] > TTL):
+            return False
+        self.content_type = answ['content_type']
+        self.items = answ['items']
+        # json does not know tuples
+        for item in self.items:
+            item['castandrole'] = [tuple(x) for x in item['castandrole']]
+        LOG.debug('Using cached listing %s', self.cache_id)
+        return True
+
+    def save(self, content_type, items):
+        """
+        Hands the listing to the PKC service for caching. Pass the items
+        BEFORE widgets.create_listitem() alters them
+        """
+        if not self.enabled:
+            return
+        self.content_type = content_type
+        self.items = items
+        WINDOW.setProperty(WINDOW_LISTING % self.cache_id,
+                           json.dumps({'generation': self.generation,
+                                       'timestamp': time.time(),
+                                       'content_type': content_type,
+                                       'items': items}))
+        transfer.plex_command('LISTING-%s' % self.cache_id)
+
+
+def generation():
+    """
+    Returns the current cache generation [str]. Changes whenever Plex items
+    changed. Empty if caching is disabled
+    """
+    return WINDOW.getProperty(WINDOW_GENERATION)
+
+
+def init():
+    """
+    Called by the PKC service on startup. Enables caching for other PKC Python
+    instances. A new generation also discards any leftovers from a previous
+    run
+    """
+    WINDOW.setProperty(WINDOW_GENERATION, uuid4().hex)
+
+
+def register(cache_id):
+    """
+    Called by the PKC service after another PKC Python instance cached a
+    listing
+    """
+    with _LOCK:
+        _ENTRIES.pop(cache_id, None)
+        _ENTRIES[cache_id] = time.time()
+        now = time.time()
+        while _ENTRIES:
+            oldest, timestamp = next(_ENTRIES.iteritems())
+            if len(_ENTRIES) <= MAX_ENTRIES and now - timestamp <= TTL:
+                break
+            del _ENTRIES[oldest]
+            WINDOW.clearProperty(WINDOW_LISTING % oldest)
+
+
+def invalidate():
+    """
+    Call if any Plex item changed, e.g. its playstate. Cached listings will not
+    be used anymore and are dropped
+    """
+    with _LOCK:
+        if not WINDOW.getProperty(WINDOW_GENERATION):
+            # PKC service is not running or shutting down
+            return
+        WINDOW.setProperty(WINDOW_GENERATION, uuid4().hex)
+        if _ENTRIES:
+            LOG.debug('Invalidating %s cached listings', len(_ENTRIES))
+        for cache_id in _ENTRIES:
+            WINDOW.clearProperty(WINDOW_LISTING % cache_id)
+        _ENTRIES.clear()
+
+
+def shutdown():
+    """
+    Called by the PKC service when exiting. Disables caching
+    """
+    invalidate()
+    WINDOW.clearProperty(WINDOW_GENERATION)
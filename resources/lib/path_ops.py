@@ -19,7 +19,9 @@ import shutil
 import os
 from os import path  # allows to use path_ops.path.join, for example
 from distutils import dir_util
+from threading import Lock
 import re
+import time
 
 import xbmc
 import xbmcvfs
@@ -29,6 +31,13 @@ from .tools import unicode_paths
 # Kodi seems to encode in utf-8 in ALL cases (unlike e.g. the OS filesystem)
 KODI_ENCODING = 'utf-8'
 REGEX_FILE_NUMBERING = re.compile(r'''_(\d\d)\.\w+$''')
+# Seconds we trust a directory listing of PathCache
+PATH_CACHE_TTL = 300
+# Seconds we remember that a path did NOT exist - it might just be a NAS
+# waking up
+PATH_CACHE_NEGATIVE_TTL = 15
+# Maximum number of directories PathCache keeps
+PATH_CACHE_SIZE = 200
 
 
 def encode_path(path):
@@ -69,6 +78,93 @@ def exists(path):
     return xbmcvfs.exists(path.encode(KODI_ENCODING, 'strict')) == 1
 
 
+def _split(path):
+    """
+    Returns the tuple (directory, filename) for path [unicode]. directory keeps
+    its trailing slash or backslash, filename is empty for folders
+    """
+    i = max(path.rfind('/'), path.rfind('\\')) + 1
+    return path[:i], path[i:]
+
+
+class PathCache(object):
+    """
+    Caches whether paths exist, because a single stat on the SMB/NFS share of
+    a sleeping NAS can take seconds. Works per directory: one listing answers
+    the checks for all its files, e.g. for all the episodes of a season.
+    Thread-safe
+    """
+    def __init__(self):
+        self._lock = Lock()
+        # {directory: (timestamp, set of names or None if missing)}
+        self._dirs = {}
+        # {path: timestamp} for files that did not exist
+        self._missing = {}
+
+    def _scan(self, directory):
+        if not exists(directory):
+            return
+        dirs, files = xbmcvfs.listdir(directory.encode(KODI_ENCODING,
+                                                       'strict'))
+        return set(name.decode(KODI_ENCODING, 'replace')
+                   for name in dirs + files)
+
+    def _purge(self, now):
+        for directory, (timestamp, names) in self._dirs.items():
+            ttl = PATH_CACHE_TTL if names is not None else \
+                PATH_CACHE_NEGATIVE_TTL
+            if now - timestamp > ttl:
+                del self._dirs[directory]
+        for missing, timestamp in self._missing.items():
+            if now - timestamp > PATH_CACHE_NEGATIVE_TTL:
+                del self._missing[missing]
+
+    def exists(self, path):
+        """
+        Returns True if the path [unicode] exists. Folders NEED a trailing
+        slash or backslash!!
+        """
+        directory, filename = _split(path)
+        now = time.time()
+        with self._lock:
+            entry = self._dirs.get(directory)
+            missing = self._missing.get(path)
+        if (entry is None or now - entry[0] > (PATH_CACHE_TTL
+                                               if entry[1] is not None
+                                               else PATH_CACHE_NEGATIVE_TTL)):
+            entry = (now, self._scan(directory))
+            with self._lock:
+                if (len(self._dirs) >= PATH_CACHE_SIZE or
+                        len(self._missing) >= PATH_CACHE_SIZE):
+                    self._purge(now)
+                self._dirs[directory] = entry
+            missing = None
+        names = entry[1]
+        if names is None:
+            return False
+        if not filename or filename in names:
+            return True
+        if missing is not None and now - missing <= PATH_CACHE_NEGATIVE_TTL:
+            return False
+        # Not part of the listing. Might be a new file or e.g. differ in case
+        # on a case-insensitive share - ask again
+        if exists(path):
+            with self._lock:
+                names.add(filename)
+            return True
+        with self._lock:
+            self._missing[path] = now
+        return False
+
+    def clear(self):
+        with self._lock:
+            self._dirs.clear()
+            self._missing.clear()
+
+
+PATH_CACHE = PathCache()
+
+
 def rmtree(path, *args, **kwargs):
     """Recursively delete a directory tree.
 
@@ -5,8 +5,10 @@ Used to kick off Kodi playback
 """
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
-from threading import Thread
+from threading import Thread, Lock
+from collections import OrderedDict
 import datetime
+import time
 
 import xbmc
 
@@ -19,6 +21,7 @@ from . import playlist_func as PL
 from . import playqueue as PQ
 from . import json_rpc as js
 from . import transfer
+from . import listing_cache
 from .playback_decision import set_playurl, audio_subtitle_prefs
 from . import variables as v
 from . import app
@@ -29,9 +32,132 @@ LOG = getLogger('PLEX.playback')
 RESOLVE = True
 TRY_TO_SEEK_FOR = 300  # =30 seconds
 IGNORE_SECONDS_AT_START = 15
+# Seconds PMS metadata fetched ahead of playback stays valid
+METADATA_TTL = 60
+# Maximum number of items we keep PMS metadata for
+METADATA_CACHE_SIZE = 100
+# Playback decisions asked for while the PMS playqueue is being created
+# {(plex_id, part): PlayurlThread}
+DECISIONS = {}
+# StartupTimer for the playback currently being started
+STARTUP = None
 ###############################################################################
 
 
+class StartupTimer(object):
+    """
+    Measures the stages of a playback startup until Kodi actually plays
+    """
+    def __init__(self, plex_id):
+        self.plex_id = plex_id
+        self.start = self.last = time.time()
+        self.stages = []
+
+    def stage(self, name):
+        now = time.time()
+        self.stages.append('%s %.0fms' % (name, (now - self.last) * 1000))
+        self.last = now
+
+    def done(self):
+        self.stage('kodi')
+        LOG.info('Playback startup for plex_id %s took %.0fms: %s',
+                 self.plex_id,
+                 (self.last - self.start) * 1000,
+                 ', '.join(self.stages))
+
+
+class MetadataCache(object):
+    """
+    Short-lived cache of the PMS metadata of items the user is likely to play
+    next, i.e. the items of the listing he's browsing. Entries are dropped as
+    soon as any Plex item changed, see listing_cache.generation()
+    """
+    def __init__(self):
+        self._lock = Lock()
+        # {plex_id: (timestamp, generation, xml)}
+        self._xmls = OrderedDict()
+
+    def prefetch(self, plex_ids):
+        """
+        Downloads the metadata for all plex_ids [list of int] with a single
+        PMS request
+        """
+        generation = listing_cache.generation()
+        xml = PF.GetPlexMetadata(','.join(unicode(x) for x in plex_ids))
+        if xml in (None, 401):
+            return
+        now = time.time()
+        with self._lock:
+            for element in xml:
+                # Mimic the PMS answer for a single item
+                container = utils.etree.Element(xml.tag, attrib=xml.attrib)
+                container.append(element)
+                plex_id = utils.cast(int, element.get('ratingKey'))
+                self._xmls.pop(plex_id, None)
+                self._xmls[plex_id] = (now, generation, container)
+            while len(self._xmls) > METADATA_CACHE_SIZE:
+                self._xmls.popitem(last=False)
+        LOG.debug('Prefetched PMS metadata for %s', plex_ids)
+
+    def pop(self, plex_id):
+        """
+        Returns the cached PMS metadata xml for plex_id or None. Entries are
+        only used once as playback changes e.g. the resume point
+        """
+        with self._lock:
+            entry = self._xmls.pop(plex_id, None)
+        if (entry is None or
+                time.time() - entry[0] > METADATA_TTL or
+                entry[1] != listing_cache.generation()):
+            return
+        return entry[2]
+
+
+METADATA_CACHE = MetadataCache()
+
+
+def prefetch_metadata(plex_ids):
+    """
+    Called by the PKC service with the plex_ids [unicode, comma-separated] of
+    the items another PKC Python instance just listed
+    """
+    METADATA_CACHE.prefetch([int(x) for x in plex_ids.split(',')])
+
+
+def _get_metadata(plex_id):
+    xml = METADATA_CACHE.pop(plex_id)
+    if xml is None:
+        xml = PF.GetPlexMetadata(plex_id, reraise=True)
+    else:
+        LOG.debug('Using prefetched PMS metadata for plex_id %s', plex_id)
+    return xml
+
+
+class PlayurlThread(Thread):
+    """
+    Gets the playurl including the PMS' playback decision for xml_element
+    [etree element] while the PMS playqueue is being created. Use apply() to
+    hand the result to the actual playqueue item
+    """
+    def __init__(self, xml_element):
+        self.api = API(xml_element)
+        self.api.part = 0
+        self.item = PL.PlaylistItem()
+        self.item.force_transcode = app.PLAYSTATE.force_transcode
+        super(PlayurlThread, self).__init__()
+        self.daemon = True
+
+    def run(self):
+        set_playurl(self.api, self.item)
+
+    def apply(self, api, item):
+        self.join()
+        item.playmethod = self.item.playmethod
+        item.file = self.item.file
+        item.quality = self.item.quality
+        api.mediastream = self.api.mediastream
+
+
 def playback_triage(plex_id=None, plex_type=None, path=None, resolve=True,
                     resume=False):
     """
@@ -159,7 +285,7 @@ def _playlist_playback(plex_id):
     for the next item in line :-)
     (by the way: trying to get active Kodi player id will return [])
     """
-    xml = PF.GetPlexMetadata(plex_id, reraise=True)
+    xml = _get_metadata(plex_id)
     if xml in (None, 401):
         _ensure_resolve(abort=True)
         return
@@ -180,14 +306,19 @@ def _playback_init(plex_id, plex_type, playqueue, pos, resume):
     Playback setup if Kodi starts playing an item for the first time.
     """
     LOG.debug('Initializing PKC playback')
+    global STARTUP
+    timer = StartupTimer(plex_id)
+    STARTUP = timer
+    DECISIONS.clear()
     # Stop playback so we don't get an error message that the last item of the
     # queue failed to play
     app.APP.player.stop()
-    xml = PF.GetPlexMetadata(plex_id, reraise=True)
+    xml = _get_metadata(plex_id)
     if xml in (None, 401):
         LOG.error('Could not get a PMS xml for plex id %s', plex_id)
         _ensure_resolve(abort=True)
         return
+    timer.stage('metadata')
     if (xbmc.getCondVisibility('Window.IsVisible(Home.xml)') and
             plex_type in v.PLEX_VIDEOTYPES and
             playqueue.kodi_pl.size() > 1):
@@ -231,6 +362,13 @@ def _playback_init(plex_id, plex_type, playqueue, pos, resume):
         else:
             trailers = True
     LOG.debug('Resuming: %s. Playing trailers: %s', resume, trailers)
+    if not trailers and len(xml[0].findall('./Media')) == 1:
+        # Item will be played first. Ask the PMS for its playback decision
+        # while we're creating the playqueue. Several media would need the
+        # user to choose first
+        thread = PlayurlThread(xml[0])
+        DECISIONS[(plex_id, 0)] = thread
+        thread.start()
     playqueue.clear()
     if plex_type != v.PLEX_TYPE_CLIP:
         # Post to the PMS to create a playqueue - in any case due to Companion
@@ -248,14 +386,16 @@ def _playback_init(plex_id, plex_type, playqueue, pos, resume):
             # Do NOT use _ensure_resolve() because we resolved above already
             return
         PL.get_playlist_details_from_xml(playqueue, xml)
+        timer.stage('playqueue')
     stack = _prep_playlist_stack(xml, resume)
     _process_stack(playqueue, stack)
+    timer.stage('stack')
     offset = _use_kodi_db_offset(playqueue.items[pos].plex_id,
                                  playqueue.items[pos].plex_type,
                                  playqueue.items[pos].offset) if resume else 0
     # New thread to release this one sooner (e.g. harddisk spinning up)
     thread = Thread(target=threaded_playback,
-                    args=(playqueue.kodi_pl, pos, offset))
+                    args=(playqueue.kodi_pl, pos, offset, timer))
     thread.setDaemon(True)
     LOG.debug('Done initializing playback, starting Kodi player at pos %s and '
               'offset %s', pos, offset)
@@ -453,7 +593,13 @@ def _conclude_playback(playqueue, pos):
     api = API(item.xml)
     api.part = item.part or 0
     listitem = api.listitem(listitem=transfer.PKCListItem, resume=False)
-    set_playurl(api, item)
+    decision = DECISIONS.pop((item.plex_id, api.part), None)
+    if decision is None:
+        set_playurl(api, item)
+    else:
+        decision.apply(api, item)
+    if STARTUP and STARTUP.plex_id == item.plex_id:
+        STARTUP.stage('playurl')
     if not item.file:
         LOG.debug('Did not get a playurl, aborting playback silently')
         _ensure_resolve()
@@ -465,9 +611,32 @@ def _conclude_playback(playqueue, pos):
                              v.PLAYBACK_METHOD_TRANSCODE):
         audio_subtitle_prefs(api, listitem)
     transfer.send(listitem)
+    _check_next_path(playqueue, pos)
     LOG.debug('Done concluding playback')
 
 
+def _check_next_path(playqueue, pos):
+    """
+    Checks whether the next playqueue item's file exists in the background.
+    The result is cached, so starting that item won't wait for e.g. a NAS to
+    wake up
+    """
+    try:
+        item = playqueue.items[pos + 1]
+    except IndexError:
+        return
+    if item.xml is None:
+        return
+    api = API(item.xml)
+    api.part = item.part or 0
+    thread = Thread(target=api.validate_playurl,
+                    args=(api.file_path(force_first_media=True),
+                          api.plex_type),
+                    kwargs={'force_check': True})
+    thread.setDaemon(True)
+    thread.start()
+
+
 def process_indirect(key, offset, resolve=True):
     """
     Called e.g. for Plex "Play later" - Plex items where we need to fetch an
@@ -570,13 +739,14 @@ def play_xml(playqueue, xml, offset=None, start_plex_id=None):
     thread.start()
 
 
-def threaded_playback(kodi_playlist, startpos, offset):
+def threaded_playback(kodi_playlist, startpos, offset, timer=None):
     """
     Seek immediately after kicking off playback is not reliable. We even seek
     to 0 (starting position) in case Kodi wants to resume but we want to start
     over.
 
     offset: resume position in seconds [int/float]
+    timer: StartupTimer to log the startup time with
     """
     LOG.debug('threaded_playback with startpos %s, offset %s',
               startpos, offset)
@@ -591,6 +761,8 @@ def threaded_playback(kodi_playlist, startpos, offset):
         if i > TRY_TO_SEEK_FOR:
             LOG.error('Could not seek to %s', offset)
             return
+    if timer:
+        timer.done()
     try:
         if offset == 0 and app.APP.player.getTime() < IGNORE_SECONDS_AT_START:
             LOG.debug('Avoiding small jump to the very start of the video')
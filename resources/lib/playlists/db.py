@@ -9,7 +9,7 @@ from logging import getLogger
 
 from .common import Playlist, PlaylistError
 from ..plex_db import PlexDB
-from ..kodi_db import kodiid_from_filename
+from ..kodi_db import kodiids_from_filenames
 from .. import path_ops, utils, variables as v
 ###############################################################################
 LOG = getLogger('PLEX.playlists.db')
@@ -79,23 +79,27 @@ def m3u_to_plex_ids(playlist):
     with open(path_ops.encode_path(playlist.kodi_path), 'rb') as f:
         text = f.read()
     try:
-        text = text.decode(v.M3U_ENCODING)
+        text = text.decode(v.m3u_encoding())
     except UnicodeDecodeError:
         LOG.warning('Fallback to ISO-8859-1 decoding for %s', playlist)
         text = text.decode('ISO-8859-1')
-    for entry in _m3u_iterator(text):
-        plex_id = utils.REGEX_PLEX_ID.search(entry)
-        if plex_id:
-            plex_id = plex_id.group(1)
-            plex_ids.append(plex_id)
-        else:
-            # Add-on paths not working, try direct
-            kodi_id, kodi_type = kodiid_from_filename(entry,
-                                                      db_type=playlist.kodi_type)
+    entries = list(_m3u_iterator(text))
+    # Add-on paths not working, try direct. Resolve all of them at once
+    direct = [x for x in entries if not utils.REGEX_PLEX_ID.search(x)]
+    if direct:
+        direct = dict(zip(direct,
+                          kodiids_from_filenames(direct,
+                                                 db_type=playlist.kodi_type)))
+    with PlexDB() as plexdb:
+        for entry in entries:
+            plex_id = utils.REGEX_PLEX_ID.search(entry)
+            if plex_id:
+                plex_ids.append(plex_id.group(1))
+                continue
+            kodi_id, kodi_type = direct[entry]
             if not kodi_id:
                 continue
-            with PlexDB() as plexdb:
-                item = plexdb.item_by_kodi_id(kodi_id, kodi_type)
+            item = plexdb.item_by_kodi_id(kodi_id, kodi_type)
             if item:
                 plex_ids.append(item['plex_id'])
     return plex_ids
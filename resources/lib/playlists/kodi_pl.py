@@ -118,7 +118,7 @@ def _write_playlist_to_file(playlist, xml):
             text += ('#EXTINF:%s,%s\n%s\n'
                      % (api.runtime(), api.title(), api.path()))
     text += '\n'
-    text = text.encode(v.M3U_ENCODING, 'ignore')
+    text = text.encode(v.m3u_encoding(), 'ignore')
     try:
         with open(path_ops.encode_path(playlist.kodi_path), 'wb') as f:
             f.write(text)
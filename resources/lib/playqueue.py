@@ -5,7 +5,7 @@ Monitors the Kodi playqueue and adjusts the Plex playqueue accordingly
 """
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
-import copy
+import time
 
 import xbmc
 
@@ -97,76 +97,131 @@ def init_playqueue_from_plex_children(plex_id, transient_token=None):
     return playqueue
 
 
+def _kodi_item_key(kodi_item):
+    """
+    Returns the key to identify the item kodi_item of a Kodi playlist (as
+    returned by json_rpc.playlist_get_items()) with one of our PlaylistItems
+    """
+    if 'id' in kodi_item:
+        return ('kodi', kodi_item['id'], kodi_item['type'])
+    try:
+        return ('plex', int(utils.REGEX_PLEX_ID.findall(kodi_item['file'])[0]))
+    except IndexError:
+        LOG.debug('Comparing paths directly as a fallback')
+        return ('file', kodi_item['file'])
+
+
+def _playlist_item_keys(item):
+    """
+    Returns all the keys that could identify our PlaylistItem item, see
+    _kodi_item_key()
+    """
+    keys = [('file', item.file)]
+    if item.kodi_id is not None:
+        keys.append(('kodi', item.kodi_id, item.kodi_type))
+    if item.plex_id is not None:
+        keys.append(('plex', item.plex_id))
+    return keys
+
+
 class PlayqueueMonitor(backgroundthread.KillableThread):
     """
     Unfortunately, Kodi does not tell if items within a Kodi playqueue
     (playlist) are swapped. This is what this monitor is for. Don't replace
-    this mechanism till Kodi's implementation of playlists has improved
+    this mechanism till Kodi's implementation of playlists has improved.
+
+    Kodi does tell us about added, removed and cleared items. kodimonitor
+    then sets app.APP.playqueue_changed and we compare the playqueues right
+    away. Otherwise, we only poll every POLL_INTERVAL seconds.
     """
+    # Seconds between comparing all playqueues if Kodi didn't tell us about
+    # any change
+    POLL_INTERVAL = 5
+
     def _compare_playqueues(self, playqueue, new_kodi_playqueue):
         """
         Used to poll the Kodi playqueue and update the Plex playqueue if needed
+
+        Every Kodi item is looked up by its Kodi id, Plex id or path in a
+        first pass, so we know which of our items have been deleted. We then
+        walk both playqueues only once: our items up to position "pos" are in
+        the same order as the Kodi items processed so far.
         """
         old = list(playqueue.items)
-        # We might append to new_kodi_playqueue but will need the original
-        # still back in the main loop
-        new = copy.deepcopy(new_kodi_playqueue)
-        index = list(range(0, len(old)))
-        LOG.debug('Comparing new Kodi playqueue %s with our play queue %s',
-                  new, old)
-        for i, new_item in enumerate(new):
+        # {key: [positions in old]}
+        positions = {}
+        for j, old_item in enumerate(old):
+            if (old_item.file and old_item.file.startswith('plugin://') and
+                    not old_item.file.startswith(PLUGIN)):
+                # Ignore media by other addons
+                continue
+            for key in _playlist_item_keys(old_item):
+                positions.setdefault(key, []).append(j)
+        for key in positions:
+            positions[key].reverse()
+        # Item of old for every Kodi item, None for new ones
+        matches = []
+        for new_item in new_kodi_playqueue:
             if (new_item['file'].startswith('plugin://') and
                     not new_item['file'].startswith(PLUGIN)):
                 # Ignore new media added by other addons
+                matches.append(False)
                 continue
-            for j, old_item in enumerate(old):
-                if self.isCanceled():
-                    # Chances are that we got an empty Kodi playlist due to
-                    # Kodi exit
-                    return
+            candidates = positions.get(_kodi_item_key(new_item), [])
+            while candidates and old[candidates[-1]] is None:
+                candidates.pop()
+            if candidates:
+                j = candidates.pop()
+                matches.append(old[j])
+                old[j] = None
+            else:
+                matches.append(None)
+        # Whatever is left of old has been deleted
+        deleted = set(id(x) for x in old if x is not None)
+        LOG.debug('Comparing new Kodi playqueue %s with our play queue %s',
+                  new_kodi_playqueue, playqueue.items)
+        pos = 0
+        for i, (new_item, item) in enumerate(zip(new_kodi_playqueue, matches)):
+            if self.isCanceled():
+                # Chances are that we got an empty Kodi playlist due to
+                # Kodi exit
+                return
+            if item is False:
+                continue
+            while (pos < len(playqueue.items) and
+                   id(playqueue.items[pos]) in deleted):
+                pos += 1
+            if item is not None:
+                if pos < len(playqueue.items) and playqueue.items[pos] is item:
+                    pos += 1
+                    continue
                 try:
-                    if (old_item.file.startswith('plugin://') and
-                            not old_item.file.startswith(PLUGIN)):
-                        # Ignore media by other addons
-                        continue
-                except AttributeError:
-                    # were not passed a filename; ignore
-                    pass
-                if 'id' in new_item:
-                    identical = (old_item.kodi_id == new_item['id'] and
-                                 old_item.kodi_type == new_item['type'])
+                    old_pos = playqueue.items.index(item)
+                except ValueError:
+                    # E.g. our playqueue has been re-initialized
+                    continue
+                LOG.debug('Playqueue item %s moved to position %s',
+                          old_pos, pos)
+                try:
+                    PL.move_playlist_item(playqueue, old_pos, pos)
+                except PL.PlaylistError:
+                    LOG.error('Could not modify playqueue positions')
+                    LOG.error('This is likely caused by mixing audio and '
+                              'video tracks in the Kodi playqueue')
                 else:
-                    try:
-                        plex_id = int(utils.REGEX_PLEX_ID.findall(new_item['file'])[0])
-                    except IndexError:
-                        LOG.debug('Comparing paths directly as a fallback')
-                        identical = old_item.file == new_item['file']
-                    else:
-                        identical = plex_id == old_item.plex_id
-                if j == 0 and identical:
-                    del old[j], index[j]
-                    break
-                elif identical:
-                    LOG.debug('Playqueue item %s moved to position %s',
-                              i + j, i)
-                    try:
-                        PL.move_playlist_item(playqueue, i + j, i)
-                    except PL.PlaylistError:
-                        LOG.error('Could not modify playqueue positions')
-                        LOG.error('This is likely caused by mixing audio and '
-                                  'video tracks in the Kodi playqueue')
-                    del old[j], index[j]
-                    break
+                    pos += 1
             else:
                 LOG.debug('Detected new Kodi element at position %s: %s ',
                           i, new_item)
                 try:
                     if playqueue.id is None:
                         PL.init_plex_playqueue(playqueue, kodi_item=new_item)
+                        pos = len(playqueue.items)
                     else:
                         PL.add_item_to_plex_playqueue(playqueue,
-                                                      i,
+                                                      pos,
                                                       kodi_item=new_item)
+                        pos += 1
                 except PL.PlaylistError:
                     # Could not add the element
                     pass
@@ -185,10 +240,8 @@ class PlayqueueMonitor(backgroundthread.KillableThread):
                     # start-up playback. Hence kodimonitor kicks off playback.
                     # Also see kodimonitor.py - _playlist_onadd()
                     pass
-                else:
-                    for j in range(i, len(index)):
-                        index[j] += 1
-        for i in reversed(index):
+        for i in reversed([i for i, item in enumerate(playqueue.items)
+                           if id(item) in deleted]):
             if self.isCanceled():
                 # Chances are that we got an empty Kodi playlist due to
                 # Kodi exit
@@ -212,9 +265,16 @@ class PlayqueueMonitor(backgroundthread.KillableThread):
             LOG.info("----===## PlayqueueMonitor stopped ##===----")
 
     def _run(self):
+        last_poll = 0
         while not self.isCanceled():
             if self.wait_while_suspended():
                 return
+            if app.APP.playqueue_changed.is_set():
+                app.APP.playqueue_changed.clear()
+            elif time.time() - last_poll < self.POLL_INTERVAL:
+                app.APP.monitor.waitForAbort(0.1)
+                continue
+            last_poll = time.time()
             with app.APP.lock_playqueues:
                 for playqueue in PLAYQUEUES:
                     kodi_pl = js.playlist_get_items(playqueue.playlistid)
@@ -228,4 +288,3 @@ class PlayqueueMonitor(backgroundthread.KillableThread):
                             # compare old and new playqueue
                             self._compare_playqueues(playqueue, kodi_pl)
                         playqueue.old_kodi_pl = list(kodi_pl)
-            app.APP.monitor.waitForAbort(0.2)
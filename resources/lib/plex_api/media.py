@@ -326,20 +326,20 @@ class Media(object):
         # exist() needs a / or \ at the end to work for directories
         if not folder:
             # files
-            check = path_ops.exists(path)
+            check = path_ops.PATH_CACHE.exists(path)
         else:
             # directories
             if "\\" in path:
                 if not path.endswith('\\'):
                     # Add the missing backslash
-                    check = path_ops.exists(path + "\\")
+                    check = path_ops.PATH_CACHE.exists(path + "\\")
                 else:
-                    check = path_ops.exists(path)
+                    check = path_ops.PATH_CACHE.exists(path)
             else:
                 if not path.endswith('/'):
-                    check = path_ops.exists(path + "/")
+                    check = path_ops.PATH_CACHE.exists(path + "/")
                 else:
-                    check = path_ops.exists(path)
+                    check = path_ops.PATH_CACHE.exists(path)
         if not check:
             if force_check is False:
                 # Validate the path is correct with user intervention
@@ -7,7 +7,6 @@ from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
 from threading import Thread
 from Queue import Empty
-from socket import SHUT_RDWR
 from xbmc import executebuiltin
 
 from .plexbmchelper import listener, plexgdm, subscribers, httppersist
@@ -261,14 +260,9 @@ class PlexCompanion(backgroundthread.KillableThread):
             self._run()
         finally:
             try:
-                self.httpd.socket.shutdown(SHUT_RDWR)
+                self.httpd.server_close()
             except AttributeError:
                 pass
-            finally:
-                try:
-                    self.httpd.socket.close()
-                except AttributeError:
-                    pass
             app.APP.deregister_thread(self)
             LOG.info("----===## Plex Companion stopped ##===----")
 
@@ -278,7 +272,7 @@ class PlexCompanion(backgroundthread.KillableThread):
         client = self.client
 
         # Start up instances
-        request_mgr = httppersist.RequestMgr()
+        request_mgr = httppersist.RequestMgr(timeout=10)
         subscription_manager = subscribers.SubscriptionMgr(request_mgr,
                                                            app.APP.player)
         self.subscription_manager = subscription_manager
@@ -291,9 +285,8 @@ class PlexCompanion(backgroundthread.KillableThread):
                     httpd = listener.ThreadedHTTPServer(
                         client,
                         subscription_manager,
-                        ('', v.COMPANION_PORT),
+                        ('', v.companion_port()),
                         listener.MyHandler)
-                    httpd.timeout = 0.95
                     break
                 except Exception:
                     LOG.error("Unable to start PlexCompanion. Traceback:")
@@ -307,10 +300,14 @@ class PlexCompanion(backgroundthread.KillableThread):
                 start_count += 1
         else:
             LOG.info('User deactivated Plex Companion')
+        self.httpd = httpd
         client.start_all()
         message_count = 0
         if httpd:
-            thread = Thread(target=httpd.handle_request)
+            server_thread = Thread(target=httpd.serve_forever,
+                                   kwargs={'poll_interval': 0.5})
+            server_thread.daemon = True
+            server_thread.start()
 
         while not self.isCanceled():
             # If we are not authorized, sleep
@@ -320,27 +317,20 @@ class PlexCompanion(backgroundthread.KillableThread):
                 break
             try:
                 message_count += 1
-                if httpd:
-                    if not thread.isAlive():
-                        # Use threads cause the method will stall
-                        thread = Thread(target=httpd.handle_request)
-                        thread.start()
-
-                    if message_count == 3000:
-                        message_count = 0
+                if message_count == 3000:
+                    message_count = 0
+                    if httpd:
                         if client.check_client_registration():
                             LOG.debug('Client is still registered')
                         else:
                             LOG.debug('Client is no longer registered. Plex '
                                       'Companion still running on port %s',
-                                      v.COMPANION_PORT)
+                                      v.companion_port())
                             client.register_as_client()
                 # Get and set servers
                 if message_count % 30 == 0:
                     subscription_manager.serverlist = client.getServerList()
                     subscription_manager.notify()
-                    if not httpd:
-                        message_count = 0
             except Exception:
                 LOG.warn("Error in loop, continuing anyway. Traceback:")
                 import traceback
@@ -357,5 +347,8 @@ class PlexCompanion(backgroundthread.KillableThread):
                 # Don't sleep
                 continue
             app.APP.monitor.waitForAbort(0.05)
+        if httpd:
+            httpd.shutdown()
         subscription_manager.signal_stop()
+        subscription_manager.stop_senders()
         client.stop_all()
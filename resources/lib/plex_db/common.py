@@ -1,12 +1,73 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
 from threading import Lock
 
 from .. import db, variables as v
+from ..profiler import PROFILER
+
+LOG = getLogger('PLEX.plex_db')
 
 PLEXDB_LOCK = Lock()
 
+# Plex types with their own table. Their plex_ids are also kept in the table
+# item_type so we can look up an item without knowing its type
+INDEXED_PLEX_TYPES = (
+    v.PLEX_TYPE_MOVIE,
+    v.PLEX_TYPE_SHOW,
+    v.PLEX_TYPE_SEASON,
+    v.PLEX_TYPE_EPISODE,
+    v.PLEX_TYPE_ARTIST,
+    v.PLEX_TYPE_ALBUM,
+    v.PLEX_TYPE_SONG
+)
+
+# Schema changes applied on top of the tables created by initialize(), in this
+# order. Existing Plex DBs thus evolve without a wipe and resync, see
+# v.MIN_DB_VERSION. Applied migrations are recorded by name in the table
+# version. Append new ones at the end and never alter a released migration.
+# Commands need to be idempotent: wipe() of a single table runs them again
+MIGRATIONS = (
+    # (Re-)build the index of plex_types, e.g. if the Plex DB has been
+    # created by an older PKC version
+    ('item_type', ['DELETE FROM item_type'] + [
+        'INSERT OR REPLACE INTO item_type(plex_id, plex_type) '
+        'SELECT plex_id, \'%s\' FROM %s' % (plex_type, plex_type)
+        for plex_type in INDEXED_PLEX_TYPES]),
+    # Look-ups of children, e.g. whether a season still has episodes, and
+    # of a library section's items
+    ('parent_indices', (
+        'CREATE INDEX IF NOT EXISTS ix_movie_3 ON movie (section_id)',
+        'CREATE INDEX IF NOT EXISTS ix_show_3 ON show (section_id)',
+        'CREATE INDEX IF NOT EXISTS ix_season_3 ON season (section_id)',
+        'CREATE INDEX IF NOT EXISTS ix_season_4 ON season (show_id)',
+        'CREATE INDEX IF NOT EXISTS ix_episode_3 ON episode (section_id)',
+        'CREATE INDEX IF NOT EXISTS ix_episode_4 ON episode (season_id)',
+        'CREATE INDEX IF NOT EXISTS ix_episode_5 ON episode (show_id)',
+        'CREATE INDEX IF NOT EXISTS ix_artist_3 ON artist (section_id)',
+        'CREATE INDEX IF NOT EXISTS ix_album_3 ON album (section_id)',
+        'CREATE INDEX IF NOT EXISTS ix_album_4 ON album (artist_id)',
+        'CREATE INDEX IF NOT EXISTS ix_track_3 ON track (section_id)',
+        'CREATE INDEX IF NOT EXISTS ix_track_4 ON track (album_id)',
+        'CREATE INDEX IF NOT EXISTS ix_track_5 ON track (artist_id)',
+    )),
+    # Progress of an unfinished full sync of a library section, see
+    # Sections.set_sync_checkpoint()
+    ('sync_checkpoint', (
+        '''CREATE TABLE IF NOT EXISTS sync_checkpoint(
+            section_id INTEGER,
+            plex_type TEXT,
+            updated_at INTEGER,
+            position INTEGER,
+            plex_id INTEGER,
+            sync_start INTEGER,
+            PRIMARY KEY (section_id, plex_type))''',
+    )),
+)
+# Prefix for the migrations' entries in the table version
+MIGRATION_PREFIX = 'migration:'
+
 SUPPORTED_KODI_TYPES = (
     v.KODI_TYPE_MOVIE,
     v.KODI_TYPE_SHOW,
@@ -30,7 +91,8 @@ class PlexDBBase(object):
 
     def __enter__(self):
         if self.lock:
-            PLEXDB_LOCK.acquire()
+            with PROFILER.measure('lock_wait.plexdb'):
+                PLEXDB_LOCK.acquire()
         self.plexconn = db.connect('plex')
         self.cursor = self.plexconn.cursor()
         return self
@@ -78,20 +140,29 @@ class PlexDBBase(object):
             # Will never be synched to Kodi
             pass
         elif plex_type is None:
-            # SLOW - lookup plex_id in all our tables
-            for kind in (v.PLEX_TYPE_MOVIE,
-                         v.PLEX_TYPE_EPISODE,
-                         v.PLEX_TYPE_SHOW,
-                         v.PLEX_TYPE_SEASON,
-                         'song',  # darn
-                         v.PLEX_TYPE_ALBUM,
-                         v.PLEX_TYPE_ARTIST):
-                method = getattr(self, kind)
-                answ = method(plex_id)
-                if answ:
-                    break
+            plex_type = self.plex_type(plex_id)
+            if plex_type:
+                answ = self.item_by_id(plex_id, plex_type)
         return answ
 
+    def plex_type(self, plex_id):
+        """
+        Returns the plex_type for plex_id or None if we haven't synced the item
+        """
+        self.cursor.execute('SELECT plex_type FROM item_type WHERE plex_id = ?',
+                            (plex_id, ))
+        try:
+            return self.cursor.fetchone()[0]
+        except TypeError:
+            pass
+
+    def add_item_type(self, plex_id, plex_type):
+        """
+        Records the plex_type of plex_id. Call whenever adding an item
+        """
+        self.cursor.execute('INSERT OR REPLACE INTO item_type(plex_id, plex_type) VALUES (?, ?)',
+                            (plex_id, plex_type))
+
     def item_by_kodi_id(self, kodi_id, kodi_type):
         """
         """
@@ -135,6 +206,8 @@ class PlexDBBase(object):
         Removes the item from our Plex db
         """
         self.cursor.execute('DELETE FROM %s WHERE plex_id = ?' % plex_type, (plex_id, ))
+        self.cursor.execute('DELETE FROM item_type WHERE plex_id = ? AND plex_type = ?',
+                            (plex_id, plex_type))
 
     def every_plex_id(self, plex_type, offset, limit):
         """
@@ -279,6 +352,11 @@ def initialize():
                     kodi_pathid INTEGER,
                     last_sync INTEGER)
             ''')
+            plexdb.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS item_type(
+                    plex_id INTEGER PRIMARY KEY,
+                    plex_type TEXT)
+            ''')
             plexdb.cursor.execute('''
                 CREATE TABLE IF NOT EXISTS playlists(
                     plex_id INTEGER PRIMARY KEY,
@@ -309,6 +387,23 @@ def initialize():
             )
             for cmd in commands:
                 plexdb.cursor.execute(cmd)
+            _migrate(plexdb.cursor)
+
+
+def _migrate(cursor):
+    """
+    Applies all MIGRATIONS that have not yet been applied to the Plex DB
+    """
+    cursor.execute('SELECT idVersion FROM version')
+    applied = set(row[0] for row in cursor.fetchall())
+    for name, commands in MIGRATIONS:
+        if MIGRATION_PREFIX + name in applied:
+            continue
+        LOG.info('Applying Plex DB migration %s', name)
+        for cmd in commands:
+            cursor.execute(cmd)
+        cursor.execute('INSERT INTO version(idVersion) VALUES (?)',
+                       (MIGRATION_PREFIX + name, ))
 
 
 def wipe(table=None):
@@ -322,5 +417,9 @@ def wipe(table=None):
         else:
             plexdb.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
             tables = [i[0] for i in plexdb.cursor.fetchall()]
-        for table in tables:
-            plexdb.cursor.execute('DROP table IF EXISTS %s' % table)
+        for name in tables:
+            plexdb.cursor.execute('DROP table IF EXISTS %s' % name)
+        if table and table != 'version':
+            # Let initialize() apply all migrations to the new table again
+            plexdb.cursor.execute('DELETE FROM version WHERE idVersion LIKE ?',
+                                  (MIGRATION_PREFIX + '%', ))
@@ -25,6 +25,7 @@ class Music(object):
              section_id,
              kodi_id,
              last_sync))
+        self.add_item_type(plex_id, v.PLEX_TYPE_ARTIST)
 
     def add_album(self, plex_id, checksum, section_id, artist_id, parent_id,
                   kodi_id, last_sync):
@@ -51,6 +52,7 @@ class Music(object):
              parent_id,
              kodi_id,
              last_sync))
+        self.add_item_type(plex_id, v.PLEX_TYPE_ALBUM)
 
     def add_song(self, plex_id, checksum, section_id, artist_id, grandparent_id,
                  album_id, parent_id, kodi_id, kodi_pathid, last_sync):
@@ -83,6 +85,7 @@ class Music(object):
              kodi_id,
              kodi_pathid,
              last_sync))
+        self.add_item_type(plex_id, v.PLEX_TYPE_SONG)
 
     def artist(self, plex_id):
         """
@@ -86,6 +86,7 @@ class Sections(object):
         """
         self.cursor.execute('DELETE FROM sections WHERE section_id = ?',
                             (section_id, ))
+        self.remove_sync_checkpoint(section_id)
 
     def update_section_sync(self, section_id, sync_to_kodi):
         """
@@ -105,6 +106,8 @@ class Sections(object):
                 WHERE section_id = ?
             '''
         self.cursor.execute(query, (sync_to_kodi, section_id))
+        if not sync_to_kodi:
+            self.remove_sync_checkpoint(section_id)
 
     def update_section_last_sync(self, section_id, last_sync):
         """
@@ -118,3 +121,60 @@ class Sections(object):
         Sets the last_sync flag to 0 for every section
         """
         self.cursor.execute('UPDATE sections SET last_sync = 0')
+        self.cursor.execute('DELETE FROM sync_checkpoint')
+
+    def sync_checkpoint(self, section_id, plex_type):
+        """
+        Returns the checkpoint of an unfinished full sync of section_id's
+        items of plex_type as a dict (or None)
+            updated_at INTEGER,  PMS updatedAt filter used for the sync or None
+            position INTEGER,    Number of items fully written to the DBs
+            plex_id INTEGER      Last plex_id fully written
+            sync_start INTEGER   Start of the first interrupted sync
+        """
+        self.cursor.execute('''
+            SELECT updated_at, position, plex_id, sync_start FROM sync_checkpoint
+            WHERE section_id = ? AND plex_type = ?
+            LIMIT 1
+        ''', (section_id, plex_type))
+        entry = self.cursor.fetchone()
+        if entry:
+            return {
+                'updated_at': entry[0],
+                'position': entry[1],
+                'plex_id': entry[2],
+                'sync_start': entry[3]
+            }
+
+    def set_sync_checkpoint(self, section_id, plex_type, updated_at,
+                            position, plex_id, sync_start):
+        """
+        Remembers that the first position items of section_id's PMS
+        container (sorted by plex_id) are safely written to the DBs. An
+        interrupted full sync can then resume from there. sync_start is the
+        timestamp of the sync that started with the first item
+        """
+        self.cursor.execute('''
+            INSERT OR REPLACE INTO sync_checkpoint(
+                section_id,
+                plex_type,
+                updated_at,
+                position,
+                plex_id,
+                sync_start)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (section_id, plex_type, updated_at, position, plex_id,
+              sync_start))
+
+    def remove_sync_checkpoint(self, section_id, plex_type=None):
+        """
+        Removes the checkpoint(s) of section_id, e.g. once it's fully synced
+        """
+        if plex_type:
+            self.cursor.execute('''
+                DELETE FROM sync_checkpoint
+                WHERE section_id = ? AND plex_type = ?
+            ''', (section_id, plex_type))
+        else:
+            self.cursor.execute('DELETE FROM sync_checkpoint WHERE section_id = ?',
+                                (section_id, ))
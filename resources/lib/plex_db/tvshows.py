@@ -29,6 +29,7 @@ class TVShows(object):
              kodi_pathid,
              0,
              last_sync))
+        self.add_item_type(plex_id, v.PLEX_TYPE_SHOW)
 
     def add_season(self, plex_id, checksum, section_id, show_id, parent_id,
                    kodi_id, last_sync):
@@ -56,6 +57,7 @@ class TVShows(object):
              kodi_id,
              0,
              last_sync))
+        self.add_item_type(plex_id, v.PLEX_TYPE_SEASON)
 
     def add_episode(self, plex_id, checksum, section_id, show_id,
                     grandparent_id, season_id, parent_id, kodi_id, kodi_fileid,
@@ -94,6 +96,7 @@ class TVShows(object):
              kodi_pathid,
              0,
              last_sync))
+        self.add_item_type(plex_id, v.PLEX_TYPE_EPISODE)
 
     def show(self, plex_id):
         """
@@ -8,6 +8,7 @@ from time import time
 from threading import Thread
 
 from .downloadutils import DownloadUtils as DU, exceptions
+from .profiler import PROFILER
 from . import backgroundthread, utils, plex_tv, variables as v, app
 
 ###############################################################################
@@ -568,7 +569,8 @@ class ThreadedDownloadChunk(backgroundthread.Task):
         super(ThreadedDownloadChunk, self).__init__()
 
     def run(self):
-        xml = DU().downloadUrl(self.url, parameters=self.args)
+        with PROFILER.measure('chunk_download'):
+            xml = DU().downloadUrl(self.url, parameters=self.args)
         try:
             xml.attrib
         except AttributeError:
@@ -584,9 +586,13 @@ class DownloadGen(object):
     saves the original xml.attrib.
 
     Yields XML etree children or raises RuntimeError at the end
+
+    Pass start to skip the first items of the PMS container, e.g. to resume an
+    interrupted sync. It is rounded down to a multiple of CONTAINERSIZE
     """
     def __init__(self, url, plex_type, last_viewed_at, updated_at, args,
-                 downloader):
+                 downloader, start=0):
+        start -= start % CONTAINERSIZE
         self._downloader = downloader
         self.successful = True
         self.xml = None
@@ -603,16 +609,16 @@ class DownloadGen(object):
         if updated_at:
             url = '%supdatedAt>=%s&' % (url, updated_at)
         self.url = url[:-1]
-        _blocking_download_chunk(self.url, self.args, 0, self.set_xml)
+        _blocking_download_chunk(self.url, self.args, start, self.set_xml)
         self.attrib = self.xml.attrib
-        self.current = 0
+        self.current = start
         self.total = int(self.attrib['totalSize'])
         self.cache_factor = 10
         # Will keep track whether we still have results incoming
         self.pending_counter = []
-        end = min(self.cache_factor * CONTAINERSIZE,
+        end = min(start + self.cache_factor * CONTAINERSIZE,
                   self.total + CONTAINERSIZE - self.total % CONTAINERSIZE)
-        for pos in range(CONTAINERSIZE, end, CONTAINERSIZE):
+        for pos in range(start + CONTAINERSIZE, end, CONTAINERSIZE):
             self.pending_counter.append(None)
             self._downloader(self.url, self.args, pos, self.on_chunk_downloaded)
 
@@ -657,7 +663,9 @@ class DownloadGen(object):
                     else:
                         raise StopIteration()
             LOG.debug('Waiting for download to finish')
-            if app.APP.monitor.waitForAbort(0.1):
+            with PROFILER.measure('chunk_wait'):
+                abort = app.APP.monitor.waitForAbort(0.1)
+            if abort:
                 raise StopIteration('PKC needs to exit now')
 
     next = __next__
@@ -668,7 +676,8 @@ def _blocking_download_chunk(url, args, start, callback):
     callback will be called with the downloaded xml (fragment)
     """
     args['X-Plex-Container-Start'] = start
-    xml = DU().downloadUrl(url, parameters=args)
+    with PROFILER.measure('chunk_download'):
+        xml = DU().downloadUrl(url, parameters=args)
     try:
         xml.attrib
     except AttributeError:
@@ -688,7 +697,7 @@ def _async_download_chunk(url, args, start, callback):
 
 
 def get_section_iterator(section_id, plex_type=None, last_viewed_at=None,
-                         updated_at=None, args=None):
+                         updated_at=None, args=None, start=0):
     args = args or {}
     args.update({
         'checkFiles': 0,
@@ -717,7 +726,8 @@ def get_section_iterator(section_id, plex_type=None, last_viewed_at=None,
                        last_viewed_at,
                        updated_at,
                        args,
-                       downloader)
+                       downloader,
+                       start=start)
 
 
 def DownloadChunks(url):
@@ -6,6 +6,7 @@ import httplib
 import traceback
 import string
 import errno
+from threading import Lock
 from socket import error as socket_error
 
 ###############################################################################
@@ -14,31 +15,63 @@ LOG = getLogger('PLEX.httppersist')
 
 ###############################################################################
 
+# Remote close and connection refused (e.g. shutdown PKC). The WSA* codes
+# only exist on Windows
+IGNORED_ERRNOS = tuple(getattr(errno, code) for code in ('WSAECONNABORTED',
+                                                         'WSAECONNREFUSED',
+                                                         'ECONNABORTED',
+                                                         'ECONNREFUSED')
+                       if hasattr(errno, code))
+
 
 class RequestMgr:
-    def __init__(self):
+    """
+    Keeps one persistent connection per host. Pass timeout [float] in seconds
+    to not get stuck on unresponsive hosts. Several threads may use the same
+    RequestMgr as long as they talk to different hosts
+    """
+    def __init__(self, timeout=None):
         self.conns = {}
+        self.timeout = timeout
+        self.lock = Lock()
 
     def getConnection(self, protocol, host, port):
-        conn = self.conns.get(protocol + host + str(port), False)
-        if not conn:
-            if protocol == "https":
-                conn = httplib.HTTPSConnection(host, port)
-            else:
-                conn = httplib.HTTPConnection(host, port)
-            self.conns[protocol + host + str(port)] = conn
-        return conn
+        with self.lock:
+            conn = self.conns.get(protocol + host + str(port), False)
+            if not conn:
+                if protocol == "https":
+                    conn = httplib.HTTPSConnection(host,
+                                                   port,
+                                                   timeout=self.timeout)
+                else:
+                    conn = httplib.HTTPConnection(host,
+                                                  port,
+                                                  timeout=self.timeout)
+                self.conns[protocol + host + str(port)] = conn
+            return conn
 
     def closeConnection(self, protocol, host, port):
-        conn = self.conns.get(protocol + host + str(port), False)
+        with self.lock:
+            conn = self.conns.pop(protocol + host + str(port), False)
         if conn:
             conn.close()
-            self.conns.pop(protocol + host + str(port), None)
 
     def dumpConnections(self):
-        for conn in self.conns.values():
+        with self.lock:
+            conns, self.conns = self.conns, {}
+        for conn in conns.values():
             conn.close()
-        self.conns = {}
+
+    def _read(self, protocol, host, port, data):
+        """
+        Returns the body of the response data. Some Plex Companion clients
+        neither send a Content-Length header nor close the connection. Reading
+        would stall, so we close the connection ourselves in that case
+        """
+        if data.length is None and not data.chunked:
+            self.closeConnection(protocol, host, port)
+            return ''
+        return data.read()
 
     def post(self, host, port, path, body, header={}, protocol="http"):
         conn = None
@@ -51,25 +84,23 @@ class RequestMgr:
                 LOG.error("HTTP response error: %s" % str(data.status))
                 # this should return false, but I'm hacking it since iOS
                 # returns 404 no matter what
-                return data.read() or True
+                return self._read(protocol, host, port, data) or True
             else:
-                return data.read() or True
+                return self._read(protocol, host, port, data) or True
         except socket_error as serr:
             # Ignore remote close and connection refused (e.g. shutdown PKC)
-            if serr.errno in (errno.WSAECONNABORTED, errno.WSAECONNREFUSED):
+            if serr.errno in IGNORED_ERRNOS:
                 pass
             else:
                 LOG.error("Unable to connect to %s\nReason:" % host)
                 LOG.error(traceback.print_exc())
-            self.conns.pop(protocol + host + str(port), None)
-            if conn:
-                conn.close()
+            self.closeConnection(protocol, host, port)
             return False
         except Exception as e:
             LOG.error("Exception encountered: %s", e)
             # Close connection just in case
             try:
-                conn.close()
+                self.closeConnection(protocol, host, port)
             except Exception:
                 pass
             return False
@@ -96,11 +127,10 @@ class RequestMgr:
                 return data.read() or True
         except socket_error as serr:
             # Ignore remote close and connection refused (e.g. shutdown PKC)
-            if serr.errno in (errno.WSAECONNABORTED, errno.WSAECONNREFUSED):
+            if serr.errno in IGNORED_ERRNOS:
                 pass
             else:
                 LOG.error("Unable to connect to %s\nReason:", host)
                 LOG.error(traceback.print_exc())
-            self.conns.pop(protocol + host + str(port), None)
-            conn.close()
+            self.closeConnection(protocol, host, port)
             return False
@@ -6,6 +6,7 @@ Plex Companion listener
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
 from re import sub
+from threading import Lock
 from SocketServer import ThreadingMixIn
 from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
 
@@ -16,8 +17,15 @@ from .. import app
 
 LOG = getLogger('PLEX.listener')
 
-# Hack we need in order to keep track of the open connections from Plex Web
-CLIENT_DICT = {}
+# The timeline polls from Plex Web we're currently holding back:
+# {client ip: [poll, ...]}, oldest first
+POLLS = {}
+POLLS_LOCK = Lock()
+# Plex Web opens new polls before its old ones timed out. Hold back at most
+# this many polls per client and answer the oldest one if there are more
+MAX_POLLS = 3
+# Seconds until we close an idle keep-alive connection
+KEEP_ALIVE_TIMEOUT = 30
 
 ###############################################################################
 
@@ -42,6 +50,10 @@ class MyHandler(BaseHTTPRequestHandler):
     BaseHTTPRequestHandler implementation of Plex Companion listener
     """
     protocol_version = 'HTTP/1.1'
+    timeout = KEEP_ALIVE_TIMEOUT
+    # Headers and body are sent separately. Don't let Nagle's algorithm delay
+    # the body on kept-alive connections
+    disable_nagle_algorithm = True
 
     def __init__(self, *args, **kwargs):
         self.serverlist = []
@@ -66,7 +78,6 @@ class MyHandler(BaseHTTPRequestHandler):
         self.send_header('Content-Length', '0')
         self.send_header('X-Plex-Client-Identifier', v.PKC_MACHINE_IDENTIFIER)
         self.send_header('Content-Type', 'text/plain')
-        self.send_header('Connection', 'close')
         self.send_header('Access-Control-Max-Age', '1209600')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods',
@@ -78,24 +89,32 @@ class MyHandler(BaseHTTPRequestHandler):
             'x-plex-device-name, x-plex-platform, x-plex-product, accept, '
             'x-plex-device, x-plex-device-screen-resolution')
         self.end_headers()
-        self.wfile.close()
 
     def sendOK(self):
         self.send_response(200)
 
-    def response(self, body, headers=None, code=200):
+    def response(self, body, headers=None, code=200, close=False):
+        """
+        Sends body [unicode]. The connection is kept alive unless you set
+        close=True
+        """
         headers = {} if headers is None else headers
+        if isinstance(body, unicode):
+            body = body.encode('utf-8')
         try:
             self.send_response(code)
             for key in headers:
                 self.send_header(key, headers[key])
             self.send_header('Content-Length', len(body))
-            self.send_header('Connection', "close")
+            if close:
+                self.send_header('Connection', 'close')
+                self.close_connection = 1
             self.end_headers()
-            self.wfile.write(body)
-            self.wfile.close()
+            if self.command != 'HEAD':
+                self.wfile.write(body)
         except Exception:
-            pass
+            # Don't reuse a connection we might have left in a broken state
+            self.close_connection = 1
 
     def answer_request(self, send_data):
         self.serverlist = self.server.client.getServerList()
@@ -122,7 +141,7 @@ class MyHandler(BaseHTTPRequestHandler):
         elif request_path == 'resources':
             self.response(
                 RESOURCES_XML.format(
-                    title=v.DEVICENAME,
+                    title=v.device_name(),
                     machineIdentifier=v.PKC_MACHINE_IDENTIFIER),
                 clientinfo.getXArgsDeviceInfo(include_token=False))
         elif request_path == 'player/timeline/poll':
@@ -131,21 +150,23 @@ class MyHandler(BaseHTTPRequestHandler):
             # Otherwise, all clients seem to keep connection open
             if params.get('wait') == '1':
                 app.APP.monitor.waitForAbort(0.95)
-            if self.client_address[0] not in CLIENT_DICT:
-                CLIENT_DICT[self.client_address[0]] = []
-            tracker = CLIENT_DICT[self.client_address[0]]
-            tracker.append(self.client_address[1])
-            while (not app.APP.is_playing and
-                   not app.APP.monitor.abortRequested() and
-                   sub_mgr.stop_sent_to_web and not
-                   (len(tracker) >= 4 and
-                    tracker[0] == self.client_address[1])):
-                # Keep at most 3 connections open, then drop the first one
-                # Doesn't need to be thread-save
-                # Silly stuff really
-                app.APP.monitor.waitForAbort(1)
-            # Let PKC know that we're releasing this connection
-            tracker.pop(0)
+            # Several polls might arrive on the same kept-alive connection,
+            # so track the polls themselves, not the client's ports
+            poll = object()
+            with POLLS_LOCK:
+                polls = POLLS.setdefault(self.client_address[0], [])
+                polls.append(poll)
+            try:
+                while (not app.APP.is_playing and
+                       not app.APP.monitor.abortRequested() and
+                       sub_mgr.stop_sent_to_web and not
+                       (len(polls) > MAX_POLLS and polls[0] is poll)):
+                    app.APP.monitor.waitForAbort(1)
+            finally:
+                with POLLS_LOCK:
+                    polls.remove(poll)
+                    if not polls and POLLS.get(self.client_address[0]) is polls:
+                        del POLLS[self.client_address[0]]
             msg = sub_mgr.msg(js.get_players()).format(
                 command_id=params.get('commandID', 0))
             if sub_mgr.isplaying:
@@ -187,7 +208,8 @@ class MyHandler(BaseHTTPRequestHandler):
                             'X-Plex-Client-Identifier',
                         'Content-Type': 'text/xml;charset=utf-8'
                     },
-                    code=500)
+                    code=500,
+                    close=True)
         elif "/subscribe" in request_path:
             self.response(v.COMPANION_OK_MESSAGE,
                           clientinfo.getXArgsDeviceInfo(include_token=False))
@@ -215,7 +237,10 @@ class MyHandler(BaseHTTPRequestHandler):
 
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     """
-    Using ThreadingMixIn Thread magic
+    Long-lived HTTP server that serves every connection in a thread of its
+    own - timeline polls and kept-alive connections may stay open for a long
+    time. Run serve_forever() in its own thread and call shutdown() and
+    server_close() to stop it
     """
     daemon_threads = True
 
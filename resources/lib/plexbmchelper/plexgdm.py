@@ -78,8 +78,8 @@ class plexgdm:
             "Device-Class: HTPC\n"
         ) % (
             v.PKC_MACHINE_IDENTIFIER,
-            v.DEVICENAME,
-            v.COMPANION_PORT,
+            v.device_name(),
+            v.companion_port(),
             v.ADDON_NAME,
             v.ADDON_VERSION
         )
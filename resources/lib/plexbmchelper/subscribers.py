@@ -6,7 +6,9 @@ subscribed Plex Companion clients.
 """
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
-from threading import Thread
+from threading import Thread, Lock
+import Queue
+import time
 
 from ..downloadutils import DownloadUtils as DU
 from .. import timing
@@ -35,6 +37,12 @@ STREAM_DETAILS = {
     'subtitle': 'currentsubtitle'
 }
 
+# Number of threads sending our timelines to Plex Companion subscribers
+SENDER_THREADS = 4
+# Kodi's player state is re-queried after this many seconds even if Kodi did
+# not tell us about any change
+PLAYER_STATE_MAX_AGE = 10
+
 XML = ('%s<MediaContainer commandID="{command_id}" location="{location}">\n'
        '  <Timeline {%s}/>\n'
        '  <Timeline {%s}/>\n'
@@ -50,7 +58,7 @@ HEADERS_PMS = {
     'Accept': 'text/plain, */*; q=0.01',
     'Accept-Language': 'en',
     'Accept-Encoding': 'gzip, deflate',
-    'User-Agent': '%s %s (%s)' % (v.ADDON_NAME, v.ADDON_VERSION, v.DEVICE)
+    'User-Agent': '%s %s (%s)' % (v.ADDON_NAME, v.ADDON_VERSION, v.device())
 }
 
 
@@ -60,8 +68,8 @@ def params_pms():
     """
     return {
         'X-Plex-Client-Identifier': v.PKC_MACHINE_IDENTIFIER,
-        'X-Plex-Device': v.DEVICE,
-        'X-Plex-Device-Name': v.DEVICENAME,
+        'X-Plex-Device': v.device(),
+        'X-Plex-Device-Name': v.device_name(),
         'X-Plex-Model': v.MODEL,
         'X-Plex-Platform': v.PLATFORM,
         'X-Plex-Platform-Version': v.PLATFORM_VERSION,
@@ -79,7 +87,7 @@ def headers_companion_client():
         'Content-Type': 'application/xml',
         'Connection': 'Keep-Alive',
         'X-Plex-Client-Identifier': v.PKC_MACHINE_IDENTIFIER,
-        'X-Plex-Device-Name': v.DEVICENAME,
+        'X-Plex-Device-Name': v.device_name(),
         'X-Plex-Platform': v.PLATFORM,
         'X-Plex-Platform-Version': v.PLATFORM_VERSION,
         'X-Plex-Product': v.ADDON_NAME,
@@ -89,6 +97,24 @@ def headers_companion_client():
     }
 
 
+def _dict_to_xml(dictionary):
+    """
+    Returns the string 'key1="value1" key2="value2" ...' for dictionary
+    """
+    return ''.join('%s="%s" ' % (key, value)
+                   for key, value in dictionary.iteritems())
+
+
+# Timelines for Plex player types that are not playing anything never change
+STOPPED_TIMELINES = {
+    typus: _dict_to_xml({
+        'controllable': CONTROLLABLE[typus],
+        'type': typus,
+        'state': 'stopped'
+    }) for typus in CONTROLLABLE
+}
+
+
 def update_player_info(playerid):
     """
     Updates all player info for playerid [int] in state.py.
@@ -98,6 +124,54 @@ def update_player_info(playerid):
     app.PLAYSTATE.player_states[playerid]['muted'] = js.get_muted()
 
 
+class PlayerState(object):
+    """
+    Keeps app.PLAYSTATE.player_states up to date with Kodi's active players.
+    Kodi is only asked again if kodimonitor signaled a change using
+    app.APP.player_changed or after PLAYER_STATE_MAX_AGE seconds. In between,
+    the playback time is extrapolated using the playback speed.
+    """
+    def __init__(self):
+        self.players = {}
+        self.timestamp = 0
+        # {playerid: playback time in milliseconds at self.timestamp}
+        self.times = {}
+
+    def invalidate(self):
+        """
+        Forces a new query of Kodi's player state with the next update()
+        """
+        self.timestamp = 0
+
+    def update(self):
+        """
+        Returns all the active Kodi players like json_rpc.get_players()
+        """
+        now = time.time()
+        if (app.APP.player_changed.is_set() or
+                now - self.timestamp > PLAYER_STATE_MAX_AGE):
+            # Clear first so we don't miss a change while we're querying
+            app.APP.player_changed.clear()
+            self.players = js.get_players()
+            self.times = {}
+            for player in self.players.values():
+                playerid = player['playerid']
+                update_player_info(playerid)
+                self.times[playerid] = timing.kodi_time_to_millis(
+                    app.PLAYSTATE.player_states[playerid]['time'])
+            self.timestamp = now
+            return self.players
+        for playerid, millis in self.times.iteritems():
+            info = app.PLAYSTATE.player_states[playerid]
+            millis += (now - self.timestamp) * 1000 * int(info['speed'])
+            totaltime = timing.kodi_time_to_millis(info['totaltime'])
+            if totaltime:
+                # Not the case for e.g. live TV
+                millis = min(millis, totaltime)
+            info['time'] = timing.millis_to_kodi_time(max(millis, 0))
+        return self.players
+
+
 class SubscriptionMgr(object):
     """
     Manages Plex companion subscriptions
@@ -117,6 +191,38 @@ class SubscriptionMgr(object):
         # In order to signal a stop to Plex Web ONCE on playback stop
         self.stop_sent_to_web = True
         self.request_mgr = request_mgr
+        self.player_state = PlayerState()
+        # Subscribers with a pending timeline update. A subscriber is only
+        # queued once, see Subscriber.send_update()
+        self.send_queue = Queue.Queue()
+        self.senders = []
+        for _ in range(SENDER_THREADS):
+            thread = Thread(target=self._sender)
+            thread.daemon = True
+            thread.start()
+            self.senders.append(thread)
+
+    def _sender(self):
+        """
+        Worker thread sending timelines to our Plex Companion subscribers
+        """
+        while True:
+            subscriber = self.send_queue.get()
+            if subscriber is None:
+                break
+            try:
+                subscriber.process_updates()
+            except Exception:
+                LOG.exception('Could not send timeline to %s',
+                              subscriber.uuid)
+
+    def stop_senders(self):
+        """
+        Stops the worker threads sending timelines to our subscribers
+        """
+        for _ in self.senders:
+            self.send_queue.put(None)
+        self.senders = []
 
     def _server_by_host(self, host):
         if len(self.serverlist) == 1:
@@ -146,37 +252,21 @@ class SubscriptionMgr(object):
         """
         self.isplaying = False
         self.location = 'navigation'
-        answ = str(XML)
-        timelines = {
-            v.PLEX_PLAYLIST_TYPE_VIDEO: None,
-            v.PLEX_PLAYLIST_TYPE_AUDIO: None,
-            v.PLEX_PLAYLIST_TYPE_PHOTO: None
-        }
-        for typus in timelines:
-            if players.get(v.KODI_PLAYLIST_TYPE_FROM_PLEX_PLAYLIST_TYPE[typus]) is None:
-                timeline = {
-                    'controllable': CONTROLLABLE[typus],
-                    'type': typus,
-                    'state': 'stopped'
-                }
+        timelines = {}
+        for typus in CONTROLLABLE:
+            player = players.get(
+                v.KODI_PLAYLIST_TYPE_FROM_PLEX_PLAYLIST_TYPE[typus])
+            if player is None:
+                timelines[typus] = STOPPED_TIMELINES[typus]
+                continue
+            timeline = self._timeline_dict(player, typus)
+            if timeline is None:
+                timelines[typus] = STOPPED_TIMELINES[typus]
             else:
-                timeline = self._timeline_dict(players[
-                        v.KODI_PLAYLIST_TYPE_FROM_PLEX_PLAYLIST_TYPE[typus]],
-                    typus)
-            timelines[typus] = self._dict_to_xml(timeline)
+                timelines[typus] = _dict_to_xml(timeline)
         timelines.update({'command_id': '{command_id}',
                          'location': self.location})
-        return answ.format(**timelines)
-
-    @staticmethod
-    def _dict_to_xml(dictionary):
-        """
-        Returns the string 'key1="value1" key2="value2" ...' for dictionary
-        """
-        answ = ''
-        for key, value in dictionary.iteritems():
-            answ += '%s="%s" ' % (key, value)
-        return answ
+        return XML.format(**timelines)
 
     def _timeline_dict(self, player, ptype):
         with app.APP.lock_playqueues:
@@ -188,11 +278,7 @@ class SubscriptionMgr(object):
                 item = playqueue.items[position]
             except IndexError:
                 # E.g. for direct path playback for single item
-                return {
-                    'controllable': CONTROLLABLE[ptype],
-                    'type': ptype,
-                    'state': 'stopped'
-                }
+                return
             self.isplaying = True
             self.stop_sent_to_web = False
             if ptype in (v.PLEX_PLAYLIST_TYPE_VIDEO,
@@ -340,17 +426,17 @@ class SubscriptionMgr(object):
         with app.APP.lock_subscriber:
             self._cleanup()
             # Get all the active/playing Kodi players (video, audio, pictures)
-            players = js.get_players()
-            # Update the PKC info with what's playing on the Kodi side
-            for player in players.values():
-                update_player_info(player['playerid'])
+            # and update the PKC info with what's playing on the Kodi side
+            players = self.player_state.update()
             # Check whether we can use the CURRENT info or whether PKC is still
             # initializing
             if self._playqueue_init_done(players) is False:
                 LOG.debug('PKC playqueue is still initializing - skip update')
+                self.player_state.invalidate()
                 return
             self._notify_server(players)
             if self.subscribers:
+                # Render once for all subscribers
                 msg = self.msg(players)
                 for subscriber in self.subscribers.values():
                     subscriber.send_update(msg)
@@ -430,7 +516,8 @@ class SubscriptionMgr(object):
                                 uuid,
                                 command_id,
                                 self,
-                                self.request_mgr)
+                                self.request_mgr,
+                                self.send_queue)
         with app.APP.lock_subscriber:
             self.subscribers[subscriber.uuid] = subscriber
         return subscriber
@@ -459,7 +546,7 @@ class Subscriber(object):
     Plex Companion subscribing device
     """
     def __init__(self, protocol, host, port, uuid, command_id, sub_mgr,
-                 request_mgr):
+                 request_mgr, send_queue):
         self.protocol = protocol or "http"
         self.host = host
         self.port = port or 32400
@@ -468,6 +555,12 @@ class Subscriber(object):
         self.age = 0
         self.sub_mgr = sub_mgr
         self.request_mgr = request_mgr
+        self.send_queue = send_queue
+        # Latest timeline not yet sent. Older ones are simply dropped
+        self.pending = None
+        # Whether we're already queued or served by a sender thread
+        self.queued = False
+        self.lock = Lock()
 
     def __eq__(self, other):
         return self.uuid == other.uuid
@@ -480,25 +573,37 @@ class Subscriber(object):
 
     def send_update(self, msg):
         """
-        Sends msg to the Plex Companion client (via .../:/timeline)
+        Queues msg for sending to the Plex Companion client (via
+        .../:/timeline). Will not block
         """
         self.age += 1
         msg = msg.format(command_id=self.command_id)
         LOG.debug("sending xml to subscriber uuid=%s,commandID=%i:\n%s",
                   self.uuid, self.command_id, msg)
-        url = '%s://%s:%s/:/timeline' % (self.protocol, self.host, self.port)
-        thread = Thread(target=self._threaded_send, args=(url, msg))
-        thread.start()
-
-    def _threaded_send(self, url, msg):
-        """
-        Threaded POST request, because they stall due to response missing
-        the Content-Length header :-(
-        """
-        response = DU().downloadUrl(url,
-                                    action_type="POST",
-                                    postBody=msg,
-                                    authenticate=False,
-                                    headerOverride=headers_companion_client())
-        if response in (False, None, 401):
-            self.sub_mgr.remove_subscriber(self.uuid)
+        with self.lock:
+            self.pending = msg
+            if self.queued:
+                # A sender thread will pick up the latest msg
+                return
+            self.queued = True
+        self.send_queue.put(self)
+
+    def process_updates(self):
+        """
+        Called by a sender thread. Sends the latest timeline until there is
+        none pending anymore - so only one thread talks to a client at a time
+        """
+        while True:
+            with self.lock:
+                msg, self.pending = self.pending, None
+                if msg is None:
+                    self.queued = False
+                    return
+            response = self.request_mgr.post(self.host,
+                                             self.port,
+                                             '/:/timeline',
+                                             msg.encode('utf-8'),
+                                             headers_companion_client(),
+                                             self.protocol)
+            if response is False:
+                self.sub_mgr.remove_subscriber(self.uuid)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Optional profiling of library syncs, see setting syncProfiler. Collects
+counters and histograms of the time spent in the different stages of a sync,
+e.g. downloading from the PMS, writing to the DBs or waiting for locks. This
+tells whether a slow sync is bound by the PMS, the network or SQLite.
+
+A full sync calls start() and stop(). Nothing is recorded outside of these
+calls, e.g. by other PKC Python instances, and profiling then costs next to
+nothing.
+"""
+from __future__ import absolute_import, division, unicode_literals
+from logging import getLogger
+from contextlib import contextmanager
+from threading import Lock
+from bisect import bisect_left
+import sqlite3
+import json
+import time
+import re
+
+from . import path_ops, variables as v
+
+LOG = getLogger('PLEX.profiler')
+
+# Where the report of the last profiled sync is saved
+REPORT_PATH = path_ops.path.join(v.ADDON_PROFILE, 'sync_profile.json')
+# Upper bounds [seconds] of the histogram buckets of every stage
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10)
+# Used to attribute an SQL statement to the table it's working on
+REGEX_SQL_TABLE = re.compile(r'''\b(?:INTO|UPDATE|FROM)\s+['"]?(\w+)''',
+                             re.IGNORECASE)
+
+
+class Stage(object):
+    """
+    Counters and histogram of the durations of one stage
+    """
+    __slots__ = ('count', 'total', 'max', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.histogram[bisect_left(BUCKETS, seconds)] += 1
+
+    def report(self):
+        """
+        Returns a dict suitable for json. The histogram's keys are the upper
+        bounds of the buckets in seconds, only buckets with entries are listed
+        """
+        bounds = [unicode(x) for x in BUCKETS] + ['inf']
+        return {
+            'count': self.count,
+            'total': round(self.total, 3),
+            'mean': round(self.total / self.count, 6) if self.count else 0,
+            'max': round(self.max, 6),
+            'histogram': dict((bound, number) for bound, number
+                              in zip(bounds, self.histogram) if number)
+        }
+
+
+class Profiler(object):
+    def __init__(self):
+        self.enabled = False
+        self.started = None
+        self.stages = {}
+        self._lock = Lock()
+
+    def start(self):
+        """
+        Discards everything recorded before and starts recording
+        """
+        with self._lock:
+            self.stages = {}
+            self.started = time.time()
+            self.enabled = True
+
+    def add(self, stage, seconds):
+        """
+        Records that stage [unicode] took seconds [float]
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            try:
+                self.stages[stage].add(seconds)
+            except KeyError:
+                self.stages[stage] = Stage()
+                self.stages[stage].add(seconds)
+
+    @contextmanager
+    def measure(self, stage):
+        """
+        Use with a with-statement to record the time spent for stage
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(stage, time.time() - start)
+
+    def stop(self, **info):
+        """
+        Stops recording, logs a summary and saves the report to REPORT_PATH.
+        Pass any info about the sync (keyword arguments) you'd like to see in
+        the report. Does nothing if we have not been recording
+        """
+        with self._lock:
+            if not self.enabled:
+                return
+            self.enabled = False
+            stages = self.stages
+            self.stages = {}
+        info['duration'] = round(time.time() - self.started, 3)
+        info['started'] = int(self.started)
+        LOG.info('Sync profile (%s). Stages may overlap as they run in '
+                 'parallel threads:',
+                 ', '.join('%s: %s' % x for x in sorted(info.iteritems())))
+        for name, stage in sorted(stages.iteritems(),
+                                  key=lambda x: x[1].total,
+                                  reverse=True):
+            LOG.info('%-32s %8d calls, %9.2fs total, %9.2fms mean, '
+                     '%9.2fms max',
+                     name, stage.count, stage.total,
+                     stage.total / stage.count * 1000, stage.max * 1000)
+        info['stages'] = dict((name, stage.report())
+                              for name, stage in stages.iteritems())
+        try:
+            with open(path_ops.encode_path(REPORT_PATH), 'wb') as f:
+                f.write(json.dumps(info, indent=2, sort_keys=True))
+        except (IOError, OSError) as err:
+            LOG.error('Could not save the sync profile to %s: %s',
+                      REPORT_PATH, err)
+        else:
+            LOG.info('Saved the sync profile to %s', REPORT_PATH)
+
+
+PROFILER = Profiler()
+# Cache {(media_type, SQL query): stage}
+_SQL_STAGES = {}
+
+
+def sql_stage(media_type, query):
+    """
+    Returns the stage for the SQL query, e.g. 'sql.video.files'
+    """
+    try:
+        return _SQL_STAGES[(media_type, query)]
+    except KeyError:
+        pass
+    table = REGEX_SQL_TABLE.search(query)
+    stage = 'sql.%s.%s' % (media_type, table.group(1) if table else 'other')
+    if len(_SQL_STAGES) > 2000:
+        # Queries with e.g. inlined values
+        _SQL_STAGES.clear()
+    _SQL_STAGES[(media_type, query)] = stage
+    return stage
+
+
+class Cursor(sqlite3.Cursor):
+    """
+    Records the time spent executing SQL per DB and table
+    """
+    def execute(self, query, *args):
+        start = time.time()
+        try:
+            return super(Cursor, self).execute(query, *args)
+        finally:
+            PROFILER.add(sql_stage(self.connection.media_type, query),
+                         time.time() - start)
+
+    def executemany(self, query, *args):
+        start = time.time()
+        try:
+            return super(Cursor, self).executemany(query, *args)
+        finally:
+            PROFILER.add(sql_stage(self.connection.media_type, query),
+                         time.time() - start)
+
+
+class Connection(sqlite3.Connection):
+    """
+    Use as factory for sqlite3.connect() while profiling. Set media_type
+    """
+    media_type = 'video'
+
+    def cursor(self, factory=Cursor):
+        return super(Connection, self).cursor(factory)
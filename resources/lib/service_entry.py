@@ -13,11 +13,14 @@ from . import websocket_client
 from . import plex_companion
 from . import plex_functions as PF, playqueue as PQ
 from . import playback_starter
+from . import playback
 from . import playqueue
 from . import variables as v
 from . import app
 from . import loghandler
 from . import backgroundthread
+from . import listing_cache
+from . import transfer
 from .windows import userselect
 
 ###############################################################################
@@ -60,7 +63,7 @@ class Service(object):
                  utils.settings('usePlexArtwork') == 'true')
         LOG.info("Number of sync threads: %s",
                  utils.settings('syncThreadNumber'))
-        LOG.info('Playlist m3u encoding: %s', v.M3U_ENCODING)
+        LOG.info('Playlist m3u encoding: %s', v.m3u_encoding())
         LOG.info("Full sys.argv received: %s", sys.argv)
         LOG.info('Sync playlists: %s', utils.settings('enablePlaylistSync'))
         LOG.info('Synching only specific Kodi playlists: %s',
@@ -424,6 +427,10 @@ class Service(object):
         app.APP.player = xbmc.Player()
         # Initialize the PKC playqueues
         PQ.init_playqueues()
+        # Allow other PKC Python instances to cache their listings
+        listing_cache.init()
+        # Let other PKC Python instances connect to us
+        transfer.start_server()
 
         # Server auto-detect
         self.setup = initialsetup.InitialSetup()
@@ -437,19 +444,27 @@ class Service(object):
         self.playqueue = playqueue.PlayqueueMonitor()
 
         # Main PKC program loop
+        plex_command = None
         while not self.isCanceled():
 
             # Check for PKC commands from other Python instances
-            plex_command = utils.window('plexkodiconnect.command')
+            plex_command = plex_command or transfer.get_command()
             if plex_command:
                 # Commands/user interaction received from other PKC Python
                 # instances (default.py and context.py instead of service.py)
-                utils.window('plexkodiconnect.command', clear=True)
                 task = None
                 if plex_command.startswith('PLAY-'):
                     # Add-on path playback!
                     task = playback_starter.PlaybackTask(
                         plex_command.replace('PLAY-', ''))
+                elif plex_command.startswith('LISTING-'):
+                    listing_cache.register(
+                        plex_command.replace('LISTING-', ''))
+                elif plex_command.startswith('PREFETCH-'):
+                    task = backgroundthread.FunctionAsTask(
+                        playback.prefetch_metadata,
+                        None,
+                        plex_command.replace('PREFETCH-', ''))
                 elif plex_command.startswith('CONTEXT_menu?'):
                     task = playback_starter.PlaybackTask(
                         'dummy?mode=context_menu&%s'
@@ -487,6 +502,7 @@ class Service(object):
                     raise RuntimeError('Unknown command: %s', plex_command)
                 if task:
                     backgroundthread.BGThreader.addTasksToFront([task])
+                plex_command = None
                 continue
 
             if app.APP.suspend:
@@ -538,12 +554,15 @@ class Service(object):
                 if utils.settings('enable_alexa') == 'true':
                     self.alexa.start()
 
-            xbmc.sleep(100)
+            # Sleep, but wake up immediately if we receive a command
+            plex_command = transfer.get_command(timeout=0.1)
 
         # EXITING PKC
         # Tell all threads to terminate (e.g. several lib sync threads)
         LOG.debug('Aborting all threads')
         app.APP.stop_pkc = True
+        transfer.stop_server()
+        listing_cache.shutdown()
         # Load/Reset PKC entirely - important for user/Kodi profile switch
         # Clear video nodes properties
         library_sync.clear_window_vars()
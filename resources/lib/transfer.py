@@ -3,10 +3,22 @@
 """
 Used to shovel data from separate Kodi Python instances to the main thread
 and vice versa.
+
+The PKC service offers a socket on localhost for that. Messages are JSON
+objects, prefixed by their length as a 4 byte unsigned int. Every request
+carries an id that the answer repeats. If the socket cannot be used, we fall
+back to Kodi window properties.
 """
 from __future__ import absolute_import, division, unicode_literals
 from logging import getLogger
+from threading import Thread, Lock
+from SocketServer import ThreadingMixIn, TCPServer, BaseRequestHandler
+import Queue
+import binascii
 import json
+import os
+import socket
+import struct
 
 import xbmc
 import xbmcgui
@@ -16,8 +28,17 @@ WINDOW = xbmcgui.Window(10000)
 WINDOW_UPSTREAM = 'plexkodiconnect.result.upstream'.encode('utf-8')
 WINDOW_DOWNSTREAM = 'plexkodiconnect.result.downstream'.encode('utf-8')
 WINDOW_COMMAND = 'plexkodiconnect.command'.encode('utf-8')
+# '<port>:<secret>' of the PKC service's socket
+WINDOW_IPC = 'plexkodiconnect.ipc'.encode('utf-8')
 KODIVERSION = int(xbmc.getInfoLabel("System.BuildVersion")[:2])
 
+HEADER = struct.Struct(b'>I')
+# Only set within the PKC service
+SERVER = None
+# Only used by other PKC Python instances, e.g. default.py. False if we
+# could not connect to the PKC service
+_CLIENT = None
+
 
 def cast(func, value):
     """
@@ -76,16 +97,227 @@ def kodi_window(property, value=None, clear=False):
         return WINDOW.getProperty(property)
 
 
+def _send_message(sock, message):
+    data = json.dumps(message)
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def _receive_bytes(sock, length):
+    chunks = []
+    while length:
+        chunk = sock.recv(length)
+        if not chunk:
+            raise socket.error('Connection closed by peer')
+        chunks.append(chunk)
+        length -= len(chunk)
+    return b''.join(chunks)
+
+
+def _receive_message(sock):
+    length = HEADER.unpack(_receive_bytes(sock, HEADER.size))[0]
+    return json.loads(_receive_bytes(sock, length))
+
+
+class IPCClient(object):
+    """
+    Connection of another PKC Python instance to the PKC service. Raises
+    socket.error if the PKC service cannot be reached
+    """
+    def __init__(self):
+        try:
+            port, self.secret = kodi_window(WINDOW_IPC).split(b':')
+            port = int(port)
+        except ValueError:
+            raise socket.error('PKC service does not offer a socket')
+        self.sock = socket.create_connection(('127.0.0.1', port), timeout=2)
+        # Waiting for playback to start can take a while
+        self.sock.settimeout(None)
+        self.request_id = 0
+
+    def request(self, typus, **kwargs):
+        self.request_id += 1
+        kwargs['type'] = typus
+        kwargs['id'] = self.request_id
+        kwargs['secret'] = self.secret
+        _send_message(self.sock, kwargs)
+        answ = _receive_message(self.sock)
+        if answ.get('id') != self.request_id:
+            raise socket.error('Unexpected answer %s' % answ)
+        return answ
+
+
+def _request(typus, **kwargs):
+    """
+    Sends a request to the PKC service via its socket. Returns the answer or
+    None if the socket cannot be used - use window properties instead
+    """
+    global _CLIENT
+    if _CLIENT is None:
+        try:
+            _CLIENT = IPCClient()
+        except socket.error as err:
+            LOG.debug('Falling back to window properties: %s', err)
+            _CLIENT = False
+    if _CLIENT is False:
+        return
+    try:
+        return _CLIENT.request(typus, **kwargs)
+    except socket.error as err:
+        LOG.error('Socket connection to the PKC service failed: %s', err)
+        _CLIENT = False
+
+
+class IPCHandler(BaseRequestHandler):
+    """
+    Serves one other PKC Python instance for as long as it is connected
+    """
+    def handle(self):
+        server = self.server
+        while not server.stopped:
+            try:
+                message = _receive_message(self.request)
+            except (socket.error, ValueError, struct.error):
+                return
+            if message.get('secret') != server.secret:
+                LOG.error('Rejecting message with wrong secret')
+                return
+            answ = {'id': message.get('id')}
+            if message['type'] == 'command':
+                server.commands.put(message['value'])
+            elif message['type'] == 'send':
+                server.upstream.put(message['data'])
+            elif message['type'] == 'wait':
+                answ['data'] = server.wait_downstream()
+                if answ['data'] is None:
+                    # PKC is shutting down
+                    return
+            else:
+                LOG.error('Unknown message type: %s', message['type'])
+                return
+            try:
+                _send_message(self.request, answ)
+            except socket.error:
+                return
+
+
+class IPCServer(ThreadingMixIn, TCPServer):
+    """
+    Socket within the PKC service that other PKC Python instances connect to
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        TCPServer.__init__(self, ('127.0.0.1', 0), IPCHandler)
+        self.secret = binascii.hexlify(os.urandom(16))
+        self.stopped = False
+        # Commands for the PKC main loop
+        self.commands = Queue.Queue()
+        # Data sent by other PKC Python instances
+        self.upstream = Queue.Queue()
+        # One Queue for every PKC Python instance waiting for data
+        self.waiters = []
+        self.lock = Lock()
+
+    def deliver(self, data):
+        """
+        Hands data to the PKC Python instance that waits the longest. If
+        nobody is waiting via a socket, data is stored in a window property
+        for the next instance that starts waiting
+        """
+        with self.lock:
+            if self.waiters:
+                self.waiters.pop(0).put(data)
+            else:
+                kodi_window(WINDOW_DOWNSTREAM, value=json.dumps(data))
+
+    def wait_downstream(self):
+        waiter = Queue.Queue()
+        with self.lock:
+            # The data might have been sent before we started waiting.
+            # Holding the lock, deliver() can't store data in between
+            answ = kodi_window(WINDOW_DOWNSTREAM)
+            if answ:
+                kodi_window(WINDOW_DOWNSTREAM, clear=True)
+                return json.loads(answ)
+            self.waiters.append(waiter)
+        try:
+            while not self.stopped:
+                try:
+                    return waiter.get(timeout=1)
+                except Queue.Empty:
+                    pass
+        finally:
+            with self.lock:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+
+
+def start_server():
+    """
+    Called by the PKC service on startup
+    """
+    global SERVER
+    try:
+        SERVER = IPCServer()
+    except socket.error as err:
+        LOG.error('Could not open socket, using window properties: %s', err)
+        return
+    thread = Thread(target=SERVER.serve_forever, name='PKC IPC')
+    thread.daemon = True
+    thread.start()
+    kodi_window(WINDOW_IPC,
+                value=b'%s:%s' % (SERVER.server_address[1], SERVER.secret))
+    LOG.info('Listening for other PKC instances on port %s',
+             SERVER.server_address[1])
+
+
+def stop_server():
+    """
+    Called by the PKC service on exit
+    """
+    global SERVER
+    kodi_window(WINDOW_IPC, clear=True)
+    if SERVER is None:
+        return
+    SERVER.stopped = True
+    SERVER.shutdown()
+    SERVER.server_close()
+    SERVER = None
+
+
 def plex_command(value):
     """
     Used to funnel states between different Python instances. NOT really thread
-    safe - let's hope the Kodi user can't click fast enough
+    safe if we need to use window properties - let's hope the Kodi user can't
+    click fast enough
     """
+    if _request('command', value=value) is not None:
+        return
     while kodi_window(WINDOW_COMMAND):
         xbmc.sleep(50)
     kodi_window(WINDOW_COMMAND, value=value)
 
 
+def get_command(timeout=None):
+    """
+    Used by the PKC service. Returns the next command sent by another PKC
+    Python instance via plex_command() as unicode or None. Pass timeout in
+    seconds to wait for a command to arrive
+    """
+    if SERVER is not None:
+        try:
+            return SERVER.commands.get(block=timeout is not None,
+                                       timeout=timeout)
+        except Queue.Empty:
+            pass
+    elif timeout:
+        xbmc.sleep(int(timeout * 1000))
+    command = kodi_window(WINDOW_COMMAND)
+    if command:
+        kodi_window(WINDOW_COMMAND, clear=True)
+        return command.decode('utf-8')
+
+
 def serialize(obj):
     if isinstance(obj, PKCListItem):
         return {'type': 'PKCListItem', 'data': obj.data}
@@ -117,10 +349,16 @@ def send(pkc_listitem, target='default'):
     Set target='default' if you send data TO another Python default.py
     instance, 'main' if your default.py needs to send to the main thread
     """
-    window = WINDOW_DOWNSTREAM if target == 'default' else WINDOW_UPSTREAM
     LOG.debug('Sending: %s', pkc_listitem)
-    kodi_window(window,
-                value=json.dumps(serialize(pkc_listitem)))
+    data = serialize(pkc_listitem)
+    if target == 'default':
+        if SERVER is not None:
+            SERVER.deliver(data)
+            return
+    elif _request('send', data=data) is not None:
+        return
+    window = WINDOW_DOWNSTREAM if target == 'default' else WINDOW_UPSTREAM
+    kodi_window(window, value=json.dumps(data))
 
 
 def wait_for_transfer(source='main'):
@@ -129,16 +367,29 @@ def wait_for_transfer(source='main'):
     instance, 'main' if your default.py needs to wait for the main thread
     """
     LOG.debug('Waiting for transfer from %s', source)
+    if source == 'main':
+        answ = _request('wait')
+        if answ is not None:
+            LOG.debug('Received')
+            return de_serialize(answ['data'])
     window = WINDOW_DOWNSTREAM if source == 'main' else WINDOW_UPSTREAM
-    result = ''
-    while not result:
+    while True:
+        if source == 'default' and SERVER is not None:
+            try:
+                result = SERVER.upstream.get(timeout=0.05)
+            except Queue.Empty:
+                pass
+            else:
+                LOG.debug('Received')
+                return de_serialize(result)
         result = kodi_window(window)
         if result:
             kodi_window(window, clear=True)
             LOG.debug('Received')
             result = json.loads(result)
             return de_serialize(result)
-        xbmc.sleep(50)
+        if source == 'main' or SERVER is None:
+            xbmc.sleep(50)
 
 
 def convert_pkc_to_listitem(pkc_listitem):
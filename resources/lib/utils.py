@@ -16,7 +16,7 @@ import xml.etree.ElementTree as etree
 # etree parse unsafe; make sure we're always receiving unicode
 from . import defused_etree
 from xml.etree.ElementTree import ParseError
-from functools import wraps
+from functools import wraps, partial
 import re
 import gc
 try:
@@ -40,6 +40,16 @@ ADDON = xbmcaddon.Addon(id='plugin.video.plexkodiconnect')
 # If several threads access  the settings.xml file concurrently, it gets
 # corrupted
 SETTINGS_LOCK = Lock()
+# Snapshot of the settings read so far {setting: unicode value}. Plain dict
+# lookups are atomic, so reading does not need SETTINGS_LOCK. Populating and
+# invalidating the cache happens while holding SETTINGS_LOCK
+_SETTINGS_CACHE = {}
+
+# ThreadPool for process_methods_on_list(), see _get_pool()
+_POOL = None
+_POOL_LOCK = Lock()
+# Lists with fewer items are processed without the ThreadPool
+POOL_THRESHOLD = 20
 
 # Grab Plex id from '...plex_id=XXXX....'
 REGEX_PLEX_ID = re.compile(r'''plex_id=(\d+)''')
@@ -115,16 +125,39 @@ def settings(setting, value=None):
     Get or add addon setting. Returns unicode
 
     setting and value can either be unicode or string
-    """
-    # We need to instantiate every single time to read changed variables!
+
+    Reads are served from an in-memory snapshot of settings.xml; only the
+    first read of a setting instantiates xbmcaddon.Addon(). Call
+    invalidate_settings() if settings might have been changed outside of this
+    Python instance, e.g. by the user or another add-on invocation
+    """
+    if value is not None:
+        with SETTINGS_LOCK:
+            addon = xbmcaddon.Addon(id='plugin.video.plexkodiconnect')
+            # Takes string or unicode by default!
+            addon.setSetting(try_encode(setting), try_encode(value))
+            _SETTINGS_CACHE[setting] = try_decode(value)
+        return
+    try:
+        return _SETTINGS_CACHE[setting]
+    except KeyError:
+        pass
     with SETTINGS_LOCK:
+        # We need to instantiate every single time to read changed variables!
         addon = xbmcaddon.Addon(id='plugin.video.plexkodiconnect')
-        if value is not None:
-                # Takes string or unicode by default!
-                addon.setSetting(try_encode(setting), try_encode(value))
-        else:
-            # Should return unicode by default, but just in case
-            return try_decode(addon.getSetting(setting))
+        # Should return unicode by default, but just in case
+        value = try_decode(addon.getSetting(setting))
+        _SETTINGS_CACHE[setting] = value
+    return value
+
+
+def invalidate_settings():
+    """
+    Drops the cached snapshot of PKC's settings. The next call to settings()
+    will read the value from Kodi again
+    """
+    with SETTINGS_LOCK:
+        _SETTINGS_CACHE.clear()
 
 
 def lang(stringid):
@@ -474,14 +507,14 @@ def valid_filename(text):
     text = re.sub(r'(?! )\s', '', text)
     # ASCII characters 0 to 31 (non-printable, just in case)
     text = re.sub(u'[\x00-\x1f]', '', text)
-    if v.DEVICE == 'Windows':
+    if v.device() == 'Windows':
         # Whitespace at the end of the filename is illegal
         text = text.strip()
         # Dot at the end of a filename is illegal
         text = re.sub(r'\.+$', '', text)
         # Illegal Windows characters
         text = re.sub(r'[/\\:*?"<>|\^]', '', text)
-    elif v.DEVICE == 'MacOSX':
+    elif v.device() == 'MacOSX':
         # Colon is illegal
         text = re.sub(r':', '', text)
         # Files cannot begin with a dot
@@ -928,27 +961,68 @@ class XmlKodiSetting(object):
         return element
 
 
-def process_method_on_list(method_to_run, items):
+def _get_pool():
     """
-    helper method that processes a method on each item with pooling if the
-    system supports it
+    Returns PKC's ThreadPool. It is only created once it is needed and then
+    reused
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPool()
+    return _POOL
+
+
+def shutdown_pool():
+    """
+    Closes PKC's ThreadPool and waits for its threads to exit. Kodi waits for
+    all threads of a Python instance before it ends the instance - so call
+    this before the instance is done
+    """
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+
+def _run_methods(methods, item):
+    for method in methods:
+        item = method(item)
+        if item is None:
+            break
+    return item
+
+
+def process_methods_on_list(methods, items):
+    """
+    helper method that runs all methods on each item in one go, i.e.
+    method_n(...method_2(method_1(item))), with pooling if the system supports
+    it. Items yielding None are dropped. Short lists are processed in the
+    current thread since handing items to the pool costs more than it's worth
     """
     all_items = []
-    if SUPPORTS_POOL:
-        pool = ThreadPool()
+    if SUPPORTS_POOL and len(items) >= POOL_THRESHOLD:
         try:
-            all_items = pool.map(method_to_run, items)
+            all_items = _get_pool().map(partial(_run_methods, methods), items)
         except Exception:
             # catch exception to prevent threadpool running forever
             ERROR(notify=True)
-        pool.close()
-        pool.join()
     else:
-        all_items = [method_to_run(item) for item in items]
+        all_items = [_run_methods(methods, item) for item in items]
     all_items = filter(None, all_items)
     return all_items
 
 
+def process_method_on_list(method_to_run, items):
+    """
+    helper method that processes a method on each item with pooling if the
+    system supports it
+    """
+    return process_methods_on_list((method_to_run, ), items)
+
+
 ###############################################################################
 # WRAPPERS
 
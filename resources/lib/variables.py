@@ -50,44 +50,77 @@ KODIVERSION = int(xbmc.getInfoLabel("System.BuildVersion")[:2])
 KODILONGVERSION = xbmc.getInfoLabel('System.BuildVersion')
 KODI_PROFILE = try_decode(xbmc.translatePath("special://profile"))
 
-if xbmc.getCondVisibility('system.platform.osx'):
-    DEVICE = "MacOSX"
-elif xbmc.getCondVisibility("system.platform.uwp"):
-    DEVICE = "Microsoft UWP"
-elif xbmc.getCondVisibility('system.platform.atv2'):
-    DEVICE = "AppleTV2"
-elif xbmc.getCondVisibility('system.platform.ios'):
-    DEVICE = "iOS"
-elif xbmc.getCondVisibility('system.platform.windows'):
-    DEVICE = "Windows"
-elif xbmc.getCondVisibility('system.platform.raspberrypi'):
-    DEVICE = "RaspberryPi"
-elif xbmc.getCondVisibility('system.platform.linux'):
-    DEVICE = "Linux"
-elif xbmc.getCondVisibility('system.platform.android'):
-    DEVICE = "Android"
-else:
-    DEVICE = "Unknown"
-
 MODEL = platform.release() or 'Unknown'
 
-DEVICENAME = try_decode(_ADDON.getSetting('deviceName'))
-if not DEVICENAME:
-    DEVICENAME = try_decode(xbmc.getInfoLabel('System.FriendlyName'))
-    _ADDON.setSetting('deviceName', DEVICENAME)
-DEVICENAME = DEVICENAME.replace(":", "")
-DEVICENAME = DEVICENAME.replace("/", "-")
-DEVICENAME = DEVICENAME.replace("\\", "-")
-DEVICENAME = DEVICENAME.replace("<", "")
-DEVICENAME = DEVICENAME.replace(">", "")
-DEVICENAME = DEVICENAME.replace("*", "")
-DEVICENAME = DEVICENAME.replace("?", "")
-DEVICENAME = DEVICENAME.replace('|', "")
-DEVICENAME = DEVICENAME.replace('(', "")
-DEVICENAME = DEVICENAME.replace(')', "")
-DEVICENAME = DEVICENAME.replace(' ', "")
-
-COMPANION_PORT = int(_ADDON.getSetting('companionPort'))
+# The following values need several calls to Kodi. Most plugin invocations via
+# default.py never use them, hence they're only determined on first use
+_DEVICE = None
+_DEVICENAME = None
+_COMPANION_PORT = None
+
+
+def device():
+    """
+    Returns the kind of device Kodi is running on, e.g. 'Linux' [unicode]
+    """
+    global _DEVICE
+    if _DEVICE is None:
+        if xbmc.getCondVisibility('system.platform.osx'):
+            _DEVICE = "MacOSX"
+        elif xbmc.getCondVisibility("system.platform.uwp"):
+            _DEVICE = "Microsoft UWP"
+        elif xbmc.getCondVisibility('system.platform.atv2'):
+            _DEVICE = "AppleTV2"
+        elif xbmc.getCondVisibility('system.platform.ios'):
+            _DEVICE = "iOS"
+        elif xbmc.getCondVisibility('system.platform.windows'):
+            _DEVICE = "Windows"
+        elif xbmc.getCondVisibility('system.platform.raspberrypi'):
+            _DEVICE = "RaspberryPi"
+        elif xbmc.getCondVisibility('system.platform.linux'):
+            _DEVICE = "Linux"
+        elif xbmc.getCondVisibility('system.platform.android'):
+            _DEVICE = "Android"
+        else:
+            _DEVICE = "Unknown"
+    return _DEVICE
+
+
+def device_name():
+    """
+    Returns the name of this Plex player as set in the PKC settings or Kodi's
+    friendly name, stripped of problematic characters [unicode]
+    """
+    global _DEVICENAME
+    if _DEVICENAME is None:
+        name = try_decode(_ADDON.getSetting('deviceName'))
+        if not name:
+            name = try_decode(xbmc.getInfoLabel('System.FriendlyName'))
+            _ADDON.setSetting('deviceName', name)
+        name = name.replace(":", "")
+        name = name.replace("/", "-")
+        name = name.replace("\\", "-")
+        name = name.replace("<", "")
+        name = name.replace(">", "")
+        name = name.replace("*", "")
+        name = name.replace("?", "")
+        name = name.replace('|', "")
+        name = name.replace('(', "")
+        name = name.replace(')', "")
+        name = name.replace(' ', "")
+        _DEVICENAME = name
+    return _DEVICENAME
+
+
+def companion_port():
+    """
+    Returns the port the Plex Companion listens on [int]
+    """
+    global _COMPANION_PORT
+    if _COMPANION_PORT is None:
+        _COMPANION_PORT = int(_ADDON.getSetting('companionPort'))
+    return _COMPANION_PORT
+
 
 # Unique ID for this Plex client; also see clientinfo.py
 PKC_MACHINE_IDENTIFIER = None
@@ -674,16 +707,19 @@ PLEX_STREAM_TYPE_FROM_STREAM_TYPE = {
     'subtitle': '3'
 }
 
-# Encoding to be used for our m3u playlist files
-# m3u files do not have encoding specified by definition, unfortunately.
-if DEVICE == 'Windows':
-    M3U_ENCODING = 'mbcs'
-else:
-    M3U_ENCODING = sys.getfilesystemencoding()
-    if (not M3U_ENCODING or
-            M3U_ENCODING == 'ascii' or
-            M3U_ENCODING == 'ANSI_X3.4-1968'):
-        M3U_ENCODING = 'utf-8'
+def m3u_encoding():
+    """
+    Encoding to be used for our m3u playlist files
+    m3u files do not have encoding specified by definition, unfortunately.
+    """
+    if device() == 'Windows':
+        return 'mbcs'
+    encoding = sys.getfilesystemencoding()
+    if (not encoding or
+            encoding == 'ascii' or
+            encoding == 'ANSI_X3.4-1968'):
+        encoding = 'utf-8'
+    return encoding
 
 
 def database_paths():
@@ -37,11 +37,11 @@ except ImportError:
 
 from urlparse import urlparse
 import os
-import array
 import struct
 import uuid
 import hashlib
 import base64
+from binascii import hexlify, unhexlify
 import threading
 import logging
 import traceback
@@ -81,6 +81,9 @@ STATUS_INVALID_EXTENSION = 1010
 STATUS_UNEXPECTED_CONDITION = 1011
 STATUS_TLS_HANDSHAKE_ERROR = 1015
 
+# Initial size of the receive buffer. Grows if a frame does not fit
+RECV_BUFSIZE = 65536
+
 
 class WebSocketException(Exception):
     """
@@ -344,8 +347,7 @@ class ABNF(object):
             return frame_header + self._get_masked(mask_key)
 
     def _get_masked(self, mask_key):
-        s = ABNF.mask(mask_key, self.data)
-        return mask_key + "".join(s)
+        return mask_key + ABNF.mask(mask_key, self.data)
 
     @staticmethod
     def mask(mask_key, data):
@@ -355,12 +357,17 @@ class ABNF(object):
         mask_key: 4 byte string(byte).
 
         data: data to mask/unmask.
+
+        Instead of looping over every single byte in Python, data and the
+        repeated mask_key are turned into two long integers and xor'ed in one
+        go.
         """
-        _m = array.array("B", mask_key)
-        _d = array.array("B", data)
-        for i in xrange(len(_d)):
-            _d[i] ^= _m[i % 4]
-        return _d.tostring()
+        length = len(data)
+        if not length:
+            return ""
+        key = (mask_key * (length // 4 + 1))[:length]
+        masked = int(hexlify(data), 16) ^ int(hexlify(key), 16)
+        return unhexlify("%0*x" % (2 * length, masked))
 
 
 class WebSocket(object):
@@ -402,13 +409,13 @@ class WebSocket(object):
             self.sock.setsockopt(*opts)
         self.sslopt = sslopt
         self.get_mask_key = get_mask_key
-        # Buffers over the packets from the layer beneath until desired amount
-        # bytes of bytes are received.
-        self._recv_buffer = []
-        # These buffer over the build-up of a single frame.
-        self._frame_header = None
-        self._frame_length = None
-        self._frame_mask = None
+        # Everything we received from the socket is read into this buffer.
+        # Unprocessed bytes are self._recv_buffer[self._recv_start:
+        # self._recv_end]. A frame is only consumed once it has been received
+        # completely, so we can resume after e.g. a socket timeout.
+        self._recv_buffer = bytearray(RECV_BUFSIZE)
+        self._recv_start = 0
+        self._recv_end = 0
         self._cont_data = None
 
     def fileno(self):
@@ -663,39 +670,41 @@ class WebSocket(object):
 
         return value: ABNF frame object.
         """
+        buf = self._recv_buffer
         # Header
-        if self._frame_header is None:
-            self._frame_header = self._recv_strict(2)
-        b1 = ord(self._frame_header[0])
+        self._fill(2)
+        b1 = buf[self._recv_start]
         fin = b1 >> 7 & 1
         rsv1 = b1 >> 6 & 1
         rsv2 = b1 >> 5 & 1
         rsv3 = b1 >> 4 & 1
         opcode = b1 & 0xf
-        b2 = ord(self._frame_header[1])
+        b2 = buf[self._recv_start + 1]
         has_mask = b2 >> 7 & 1
         # Frame length
-        if self._frame_length is None:
-            length_bits = b2 & 0x7f
-            if length_bits == 0x7e:
-                length_data = self._recv_strict(2)
-                self._frame_length = struct.unpack("!H", length_data)[0]
-            elif length_bits == 0x7f:
-                length_data = self._recv_strict(8)
-                self._frame_length = struct.unpack("!Q", length_data)[0]
-            else:
-                self._frame_length = length_bits
+        length = b2 & 0x7f
+        header_length = 2
+        if length == 0x7e:
+            header_length = 4
+            self._fill(header_length)
+            length = struct.unpack_from("!H", buf, self._recv_start + 2)[0]
+        elif length == 0x7f:
+            header_length = 10
+            self._fill(header_length)
+            length = struct.unpack_from("!Q", buf, self._recv_start + 2)[0]
         # Mask
-        if self._frame_mask is None:
-            self._frame_mask = self._recv_strict(4) if has_mask else ""
+        if has_mask:
+            header_length += 4
+        # Wait for the entire frame before consuming anything
+        self._fill(header_length + length)
+        if has_mask:
+            mask_key = self._recv_strict(header_length)[-4:]
+        else:
+            self._consume(header_length)
         # Payload
-        payload = self._recv_strict(self._frame_length)
+        payload = self._recv_strict(length)
         if has_mask:
-            payload = ABNF.mask(self._frame_mask, payload)
-        # Reset for next frame
-        self._frame_header = None
-        self._frame_length = None
-        self._frame_mask = None
+            payload = ABNF.mask(mask_key, payload)
         return ABNF(fin, rsv1, rsv2, rsv3, opcode, has_mask, payload)
 
 
@@ -740,9 +749,9 @@ class WebSocket(object):
             else:
                 raise e
 
-    def _recv(self, bufsize):
+    def _recv_into(self, view):
         try:
-            bytes_ = self.sock.recv(bufsize)
+            nbytes = self.sock.recv_into(view)
         except socket.timeout as e:
             raise WebSocketTimeoutException(e.args[0])
         except SSLError as e:
@@ -750,32 +759,57 @@ class WebSocket(object):
                 raise WebSocketTimeoutException(e.args[0])
             else:
                 raise
-        if not bytes_:
+        if not nbytes:
             raise WebSocketConnectionClosedException()
-        return bytes_
+        return nbytes
+
+    def _fill(self, bufsize):
+        """
+        Receives from the socket until at least bufsize unprocessed bytes are
+        in our receive buffer. Reads as much as the socket offers, so a burst
+        of frames needs only a few system calls
+        """
+        available = self._recv_end - self._recv_start
+        if available >= bufsize:
+            return
+        if self._recv_start + bufsize > len(self._recv_buffer):
+            # Move the unprocessed bytes to the front, growing the buffer if
+            # needed
+            old = self._recv_buffer
+            if bufsize > len(old):
+                self._recv_buffer = bytearray(bufsize)
+            self._recv_buffer[:available] = old[self._recv_start:
+                                                self._recv_end]
+            self._recv_start = 0
+            self._recv_end = available
+        view = memoryview(self._recv_buffer)
+        while self._recv_end - self._recv_start < bufsize:
+            self._recv_end += self._recv_into(view[self._recv_end:])
+
+    def _consume(self, bufsize):
+        self._recv_start += bufsize
+        if self._recv_start == self._recv_end:
+            self._recv_start = 0
+            self._recv_end = 0
+            if len(self._recv_buffer) > RECV_BUFSIZE:
+                # Don't hold on to the memory of an unusually large frame
+                self._recv_buffer = bytearray(RECV_BUFSIZE)
 
     def _recv_strict(self, bufsize):
-        shortage = bufsize - sum(len(x) for x in self._recv_buffer)
-        while shortage > 0:
-            bytes_ = self._recv(shortage)
-            self._recv_buffer.append(bytes_)
-            shortage -= len(bytes_)
-        unified = "".join(self._recv_buffer)
-        if shortage == 0:
-            self._recv_buffer = []
-            return unified
-        else:
-            self._recv_buffer = [unified[bufsize:]]
-            return unified[:bufsize]
+        self._fill(bufsize)
+        data = memoryview(self._recv_buffer)[
+            self._recv_start:self._recv_start + bufsize].tobytes()
+        self._consume(bufsize)
+        return data
 
     def _recv_line(self):
-        line = []
         while True:
-            c = self._recv(1)
-            line.append(c)
-            if c == "\n":
-                break
-        return "".join(line)
+            end = self._recv_buffer.find(b"\n",
+                                         self._recv_start,
+                                         self._recv_end)
+            if end != -1:
+                return self._recv_strict(end + 1 - self._recv_start)
+            self._fill(self._recv_end - self._recv_start + 1)
 
 
 class WebSocketApp(object):
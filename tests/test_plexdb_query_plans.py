@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Makes sure every statement of PlexDB is served by an index - a full table
+scan of e.g. the episode table hurts with large libraries. Builds an empty
+plex.db via plex_db.initialize(), calls all methods of PlexDB for every plex
+type and checks EXPLAIN QUERY PLAN of the SQL they executed.
+
+Runs outside of Kodi with the xbmc* stubs of tools/bench_imports.py. The
+add-on's dependencies, e.g. defusedxml, need to be on the PYTHONPATH:
+    python -m unittest discover -s tests
+"""
+from __future__ import absolute_import, division, unicode_literals
+import imp
+import inspect
+import os
+import re
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Tables that may be scanned: one row per library section
+SCAN_TABLES = ('sections', )
+# PlexDB methods that may scan: they page through a whole table on purpose
+SCAN_METHODS = ('missing_fanart', )
+# PlexDB methods that only work for some plex types - only videos have
+# fanart.tv artwork
+PLEX_TYPES = {
+    'missing_fanart': ('movie', 'show', 'season', 'episode'),
+    'set_fanart_synced': ('movie', 'show', 'season', 'episode')
+}
+REGEX_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+class Playlist(object):
+    """
+    Stand-in for playlists.common.Playlist
+    """
+    plex_id = 1
+    plex_name = 'name'
+    plex_updatedat = 1
+    kodi_path = 'path'
+    kodi_type = 'video'
+    kodi_hash = 'hash'
+
+
+class RecordingCursor(object):
+    """
+    Wraps a sqlite3 cursor and records the statements executed with it
+    """
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.statements = []
+
+    def execute(self, query, args=()):
+        self.statements.append((query, tuple(args)))
+        return self.cursor.execute(query, args)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class TestQueryPlans(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp(prefix='pkc_test_')
+        bench = imp.load_source(b'bench_imports',
+                                os.path.join(ROOT, 'tools', 'bench_imports.py'))
+        stubs, env = bench.fake_kodi(cls.tmp)
+        os.environ.update(env)
+        sys.path[:0] = [stubs, ROOT]
+        from resources.lib import plex_db, variables as v
+        v.DB_PLEX_PATH = os.path.join(cls.tmp, 'plex.db')
+        plex_db.initialize()
+        cls.plex_db = plex_db
+        cls.v = v
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def sample_calls(self):
+        """
+        Yields (method name, kwargs) to call every PlexDB method with, once
+        per plex type if the method takes one
+        """
+        samples = {
+            'playlist': Playlist(),
+            'section_name': 'name',
+            'plex_type': None,
+            'kodi_type': None,
+            'sync_to_kodi': True,
+            'path': 'path'
+        }
+        for name, method in inspect.getmembers(self.plex_db.PlexDB,
+                                               inspect.ismethod):
+            if name.startswith('_') or name.startswith('entry_to_'):
+                continue
+            args = inspect.getargspec(method).args[1:]
+            if 'plex_type' in args or 'kodi_type' in args:
+                plex_types = PLEX_TYPES.get(
+                    name, self.plex_db.common.INDEXED_PLEX_TYPES)
+            else:
+                plex_types = (None, )
+            for plex_type in plex_types:
+                kwargs = dict((arg, samples.get(arg, 1)) for arg in args)
+                if 'plex_type' in kwargs:
+                    kwargs['plex_type'] = plex_type
+                if 'kodi_type' in kwargs:
+                    kwargs['kodi_type'] = \
+                        self.v.KODITYPE_FROM_PLEXTYPE[plex_type]
+                yield name, kwargs
+        # Look-ups by Kodi path instead of plex_id
+        playlist = Playlist()
+        playlist.plex_id = None
+        yield 'playlist', {'playlist': playlist, 'path': 'path'}
+        yield 'delete_playlist', {'playlist': playlist}
+
+    def test_no_table_scans(self):
+        statements = {}
+        with self.plex_db.PlexDB(lock=False) as plexdb:
+            cursor = plexdb.cursor
+            for name, kwargs in self.sample_calls():
+                plexdb.cursor = RecordingCursor(cursor)
+                result = getattr(plexdb, name)(**kwargs)
+                if inspect.isgenerator(result):
+                    list(result)
+                for query, args in plexdb.cursor.statements:
+                    statements[' '.join(query.split())] = (name, args)
+            plexdb.cursor = cursor
+            self.assertTrue(statements)
+            scans = []
+            for query, (name, args) in sorted(statements.iteritems()):
+                if name in SCAN_METHODS:
+                    continue
+                for row in cursor.execute('EXPLAIN QUERY PLAN %s' % query,
+                                          args).fetchall():
+                    detail = row[-1]
+                    scan = REGEX_SCAN.match(detail)
+                    if (scan and scan.group(1) not in SCAN_TABLES and
+                            'INDEX' not in detail):
+                        scans.append('%s: %s -> %s' % (name, query, detail))
+        self.assertEqual(scans, [], 'Full table scans:\n%s' % '\n'.join(scans))
+
+
+if __name__ == '__main__':
+    unittest.main()
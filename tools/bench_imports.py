@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the cold start of plugin invocations. Kodi starts a new Python
+interpreter running default.py for every widget or menu click, so anything
+default.py imports is paid for again and again.
+
+Runs default.py once per mode= in a fresh interpreter - with stubbed xbmc*
+modules instead of Kodi - and reports the wall time of the whole run, the
+time until default.py is done and how many of PKC's modules got imported.
+
+Usage (Python 2.7, from the add-on's root directory):
+    python tools/bench_imports.py [--runs N] [--path DIR] [mode ...]
+
+Without modes, all modes listed in default.py plus the main menu ('') are
+benchmarked. Use --path to add the add-on's dependencies, e.g. the lib
+directory of script.module.requests, to sys.path. Modes that talk to the PMS
+or the PKC service will fail here; they're still listed as the imports
+happened nonetheless.
+"""
+from __future__ import absolute_import, division, unicode_literals
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PY = os.path.join(ROOT, 'default.py')
+# Kill a run that takes longer than this [seconds], e.g. waiting for the
+# PKC service
+TIMEOUT = 20
+# Empty Kodi DBs for variables.database_paths(), versions of Kodi 18 Leia
+KODI_DBS = ('MyVideos116.db', 'MyMusic72.db', 'Textures13.db')
+REGEX_MODE = re.compile(r'''mode == '([^']+)'|mode in \(([^)]+)\)''')
+
+# Minimal stand-ins for the modules Kodi provides. Everything that opens a
+# dialog or asks Kodi for something returns an empty answer
+STUBS = {
+    'xbmc': '''
+import os
+LOGDEBUG, LOGINFO, LOGNOTICE, LOGWARNING, LOGERROR, LOGSEVERE, LOGFATAL, \\
+    LOGNONE = range(8)
+PLAYLIST_MUSIC, PLAYLIST_VIDEO = 0, 1
+ISO_639_1, ISO_639_2, ENGLISH_NAME = 0, 1, 2
+def log(msg, level=LOGDEBUG): pass
+def getCondVisibility(condition): return False
+def getInfoLabel(label):
+    return '18.9 Git:bench' if 'BuildVersion' in label else ''
+def translatePath(path):
+    return os.path.join(os.environ['BENCH_KODI_HOME'],
+                        path.replace('special://', ''))
+def executebuiltin(*args): pass
+def executeJSONRPC(*args): return '{"id": 1, "jsonrpc": "2.0", "result": {}}'
+def getLocalizedString(string_id): return ''
+def sleep(milliseconds): pass
+def getSkinDir(): return 'skin.estuary'
+def getUserAgent(): return 'Kodi/18.9'
+def getRegion(region): return ''
+def getLanguage(*args, **kwargs): return 'en'
+class Monitor(object):
+    def abortRequested(self): return False
+    def waitForAbort(self, timeout=0): return False
+class Player(object): pass
+class PlayList(object):
+    def __init__(self, playlist): pass
+''',
+    'xbmcaddon': '''
+import os
+import xml.etree.ElementTree as etree
+SETTINGS = {}
+for _node in etree.parse(os.path.join(os.environ['BENCH_ADDON_ROOT'],
+                                      'resources', 'settings.xml')).iter():
+    if _node.tag == 'setting' and _node.get('id'):
+        SETTINGS[_node.get('id')] = _node.get('default', '')
+class Addon(object):
+    def __init__(self, id=None): pass
+    def getSetting(self, key): return SETTINGS.get(key, '')
+    def setSetting(self, key, value): SETTINGS[key] = value
+    def getLocalizedString(self, string_id): return ''
+    def getAddonInfo(self, key):
+        return {'id': 'plugin.video.plexkodiconnect',
+                'name': 'PlexKodiConnect',
+                'version': '0.0.0',
+                'path': os.environ['BENCH_ADDON_ROOT'],
+                'profile': 'special://profile/addon_data/'
+                           'plugin.video.plexkodiconnect/'}.get(key, '')
+''',
+    'xbmcgui': '''
+PROPERTIES = {'plex_authenticated': 'true'}
+NOTIFICATION_INFO, NOTIFICATION_WARNING, NOTIFICATION_ERROR = \\
+    'info', 'warning', 'error'
+INPUT_ALPHANUM, INPUT_NUMERIC, INPUT_DATE, INPUT_TIME, INPUT_IPADDRESS, \\
+    INPUT_PASSWORD = range(6)
+PASSWORD_VERIFY, ALPHANUM_HIDE_INPUT = 1, 2
+ACTION_PREVIOUS_MENU, ACTION_NAV_BACK = 10, 92
+def getCurrentWindowId(): return 10000
+class Window(object):
+    def __init__(self, window_id=10000): pass
+    def getProperty(self, key): return PROPERTIES.get(key, '')
+    def setProperty(self, key, value): PROPERTIES[key] = value
+    def clearProperty(self, key): PROPERTIES.pop(key, None)
+class _Silent(object):
+    def __init__(self, *args, **kwargs): pass
+    def __getattr__(self, name): return lambda *args, **kwargs: None
+class ListItem(_Silent): pass
+class Dialog(_Silent): pass
+class DialogProgressBG(_Silent): pass
+class WindowXML(_Silent): pass
+class WindowXMLDialog(WindowXML): pass
+class ControlImage(_Silent): pass
+class ControlButton(_Silent): pass
+class ControlLabel(_Silent): pass
+''',
+    'xbmcplugin': '''
+SORT_METHOD_UNSORTED = 0
+def setResolvedUrl(*args, **kwargs): pass
+def addDirectoryItem(*args, **kwargs): return True
+def addDirectoryItems(*args, **kwargs): return True
+def endOfDirectory(*args, **kwargs): pass
+def setContent(*args, **kwargs): pass
+def addSortMethod(*args, **kwargs): pass
+''',
+    'xbmcvfs': '''
+import os
+def exists(path): return os.path.exists(path)
+def mkdirs(path):
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    return True
+def listdir(path): return [], []
+'''
+}
+
+# Runs default.py in the child interpreter, then prints the results as json
+CHILD = '''
+import sys, time, runpy, json
+start = time.time()
+sys.argv = [b'plugin://plugin.video.plexkodiconnect/', b'-1', sys.argv[1]]
+error = None
+try:
+    runpy.run_path(b'default.py', run_name=b'__main__')
+except SystemExit:
+    pass
+except BaseException as err:
+    error = '%s: %s' % (type(err).__name__, err)
+print(json.dumps({
+    'seconds': time.time() - start,
+    'modules': len([x for x in sys.modules
+                    if x.startswith('resources') and sys.modules[x]]),
+    'error': error
+}))
+'''
+
+
+def fake_kodi(directory):
+    """
+    Writes the xbmc* stubs to <directory>/stubs and sets up an empty Kodi
+    home with the Kodi DBs in <directory>/kodi. Returns the directory of the
+    stubs and the environment variables they need. Also used by the tests
+    """
+    stubs = os.path.join(directory, 'stubs')
+    os.makedirs(stubs)
+    for name, code in STUBS.iteritems():
+        with open(os.path.join(stubs, '%s.py' % name), 'wb') as f:
+            f.write(code.encode('utf-8'))
+    kodi_home = os.path.join(directory, 'kodi')
+    os.makedirs(os.path.join(kodi_home, 'profile', 'addon_data',
+                             'plugin.video.plexkodiconnect'))
+    os.makedirs(os.path.join(kodi_home, 'database'))
+    for name in KODI_DBS:
+        open(os.path.join(kodi_home, 'database', name), 'wb').close()
+    return stubs, {b'BENCH_KODI_HOME': kodi_home.encode('utf-8'),
+                   b'BENCH_ADDON_ROOT': ROOT.encode('utf-8')}
+
+
+def modes_of_default_py():
+    """
+    Returns all modes default.py knows, starting with the main menu ''
+    """
+    with open(DEFAULT_PY, 'rb') as f:
+        code = f.read().decode('utf-8')
+    modes = ['']
+    for single, several in REGEX_MODE.findall(code):
+        for mode in [single] if single else re.findall(r"'([^']+)'", several):
+            if mode not in modes:
+                modes.append(mode)
+    return modes
+
+
+def run_once(mode, env):
+    """
+    Returns (wall time, result dict of CHILD) of one invocation of default.py
+    """
+    start = time.time()
+    process = subprocess.Popen([sys.executable, b'-c', CHILD,
+                                b'?mode=%s' % mode.encode('utf-8')],
+                               cwd=ROOT,
+                               env=env,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    timer = threading.Timer(TIMEOUT, process.kill)
+    timer.start()
+    try:
+        stdout, stderr = process.communicate()
+    finally:
+        timer.cancel()
+    wall = time.time() - start
+    try:
+        result = json.loads(stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        result = {
+            'seconds': None,
+            'modules': None,
+            'error': 'timeout' if process.returncode < 0 else
+                     (stderr.strip().splitlines() or ['crashed'])[-1]
+        }
+    return wall, result
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Cold start benchmark of default.py per mode')
+    parser.add_argument('modes', nargs='*',
+                        help="modes to benchmark, '' is the main menu")
+    parser.add_argument('--runs', type=int, default=5,
+                        help='invocations per mode, the median is reported')
+    parser.add_argument('--path', action='append', default=[],
+                        help='additional directory for sys.path, e.g. for '
+                             'requests')
+    args = parser.parse_args()
+    modes = [x.decode('utf-8') for x in args.modes] or modes_of_default_py()
+
+    tmp = tempfile.mkdtemp(prefix='pkc_bench_')
+    try:
+        stubs, stub_env = fake_kodi(tmp)
+        env = dict(os.environ)
+        env.update(stub_env)
+        env[b'PYTHONPATH'] = os.pathsep.join(
+            [stubs] + args.path + [ROOT]).encode('utf-8')
+        env[b'PYTHONDONTWRITEBYTECODE'] = b'1'
+
+        print('%-18s %10s %10s %8s  %s' % ('mode', 'wall [ms]',
+                                          'main [ms]', 'modules', 'error'))
+        for mode in modes:
+            walls, mains, result = [], [], None
+            for _ in range(args.runs):
+                wall, result = run_once(mode, env)
+                walls.append(wall)
+                if result['seconds'] is not None:
+                    mains.append(result['seconds'])
+            print('%-18s %10.1f %10s %8s  %s' % (
+                mode or "''",
+                median(walls) * 1000,
+                '%.1f' % (median(mains) * 1000) if mains else '-',
+                result['modules'] if result['modules'] is not None else '-',
+                result['error'] or ''))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()